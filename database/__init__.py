@@ -5,6 +5,7 @@ This module contains utilities for database operations.
 
 # 使用簡單明確的相對導入
 from .db_utils import DatabaseUtils
+from .connection import ConnectionPool
 
 # 明確指定可被外部導入的名稱
-__all__ = ['DatabaseUtils'] 
\ No newline at end of file
+__all__ = ['DatabaseUtils', 'ConnectionPool'] 
\ No newline at end of file
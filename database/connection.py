@@ -0,0 +1,260 @@
+"""
+SQLite 連接管理
+
+提供統一的連接建立函數與執行緒安全的連接池，
+讓 DatabaseUtils 在 Flask threaded 模式與 gunicorn worker 中重複使用連接。
+"""
+import os
+import time
+import atexit
+import sqlite3
+import logging
+import threading
+
+from .profiles import apply_pragmas
+
+logger = logging.getLogger(__name__)
+
+# 全域連接計數（供基準測試與監控使用）
+_stats_lock = threading.Lock()
+_connections_opened = 0
+
+
+def connect(db_path, pragmas=None):
+    """建立新的 SQLite 連接
+
+    Args:
+        db_path: 資料庫檔案路徑
+        pragmas: 連接建立後要套用的 PRAGMA 設定
+    """
+    global _connections_opened
+    # check_same_thread=False 讓連接可以在連接池中被不同執行緒輪流使用
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    # 設定 row_factory 讓查詢結果以字典形式返回
+    conn.row_factory = sqlite3.Row
+    if pragmas:
+        try:
+            apply_pragmas(conn, pragmas)
+        except Exception:
+            conn.close()
+            raise
+    with _stats_lock:
+        _connections_opened += 1
+    return conn
+
+
+def connections_opened():
+    """返回此進程累計開啟的連接數"""
+    return _connections_opened
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """等待可用連接逾時"""
+
+
+class ConnectionPool:
+    """
+    SQLite 連接池
+
+    - 同一執行緒在巢狀呼叫中重複使用同一個連接（可重入）
+    - 閒置連接以 LIFO 方式重用，最多保留 max_size 個連接
+    - 閒置過久的連接在借出前會先做健康檢查
+    - fork 之後（gunicorn worker）自動重建，不共用父進程的連接
+    """
+
+    _registry = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, db_path, max_size=5, timeout=10.0, health_check_interval=30.0, pragmas=None):
+        """初始化連接池
+
+        Args:
+            db_path: 資料庫檔案路徑
+            max_size: 最多同時存在的連接數
+            timeout: 連接全部借出時的最長等待秒數
+            health_check_interval: 閒置超過此秒數的連接在借出前先檢查
+            pragmas: 每個新連接要套用的 PRAGMA 設定
+        """
+        if max_size < 1:
+            raise ValueError("max_size 必須大於 0")
+        self.db_path = db_path
+        self.pragmas = pragmas
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._cond = threading.Condition(threading.Lock())
+        self._reset_state()
+
+    def _reset_state(self):
+        """重設連接池內部狀態"""
+        self._pid = os.getpid()
+        self._idle = []  # [(conn, last_used)]
+        self._size = 0
+        self._closed = False
+        self._local = threading.local()
+        self.stats = {
+            "opened": 0,
+            "reused": 0,
+            "discarded": 0,
+            "waits": 0
+        }
+
+    @classmethod
+    def for_path(cls, db_path, max_size=5, **kwargs):
+        """取得（或建立）指定資料庫路徑共用的連接池
+
+        連接池已存在時沿用第一次建立時的設定；要求的 max_size 或 PRAGMA 等設定不同時記錄警告。
+        """
+        key = os.path.abspath(db_path) if db_path != ':memory:' else db_path
+        with cls._registry_lock:
+            pool = cls._registry.get(key)
+            if pool is None or pool._closed:
+                pool = cls(db_path, max_size=max_size, **kwargs)
+                cls._registry[key] = pool
+                return pool
+        requested = dict(kwargs, max_size=max_size)
+        differing = {
+            name: (getattr(pool, name), value)
+            for name, value in requested.items()
+            if getattr(pool, name) != value
+        }
+        if differing:
+            details = ", ".join(f"{name}={current!r}（要求 {value!r}）" for name, (current, value) in differing.items())
+            logger.warning(f"資料庫 {key} 已有連接池，沿用現有設定: {details}")
+        return pool
+
+    @classmethod
+    def close_all(cls):
+        """關閉所有已註冊的連接池"""
+        with cls._registry_lock:
+            pools = list(cls._registry.values())
+            cls._registry.clear()
+        for pool in pools:
+            pool.close()
+
+    def _check_fork(self):
+        """偵測 fork，子進程不可沿用父進程的連接"""
+        if self._pid != os.getpid():
+            with self._cond:
+                if self._pid != os.getpid():
+                    logger.info("偵測到進程 fork，重建連接池")
+                    self._reset_state()
+
+    def _is_healthy(self, conn):
+        """檢查連接是否仍可使用"""
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        """借出連接，同一執行緒巢狀呼叫時返回同一個連接"""
+        self._check_fork()
+
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            self._local.depth += 1
+            return held
+
+        conn = self._checkout()
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def _checkout(self):
+        """從閒置連接中取出或建立新連接"""
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("連接池已關閉")
+
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    if time.monotonic() - last_used < self.health_check_interval or self._is_healthy(conn):
+                        self.stats["reused"] += 1
+                        return conn
+                    # 連接已失效，丟棄後重試
+                    self._discard(conn)
+                    continue
+
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(f"等待資料庫連接逾時（{self.timeout} 秒）")
+                self.stats["waits"] += 1
+                self._cond.wait(remaining)
+
+        # 在鎖外建立連接，避免阻塞其他執行緒
+        try:
+            conn = connect(self.db_path, self.pragmas)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.stats["opened"] += 1
+        return conn
+
+    def release(self, conn):
+        """歸還連接"""
+        if getattr(self._local, "conn", None) is conn:
+            self._local.depth -= 1
+            if self._local.depth > 0:
+                return
+            self._local.conn = None
+
+        # 歸還前確保沒有殘留的未提交交易
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            with self._cond:
+                self._discard(conn)
+                self._cond.notify()
+            return
+
+        with self._cond:
+            if self._closed or self._pid != os.getpid():
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _discard(self, conn):
+        """關閉並移除連接（呼叫者需持有鎖）"""
+        self._size -= 1
+        self.stats["discarded"] += 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close(self):
+        """關閉連接池，釋放所有閒置連接；借出中的連接會在歸還時關閉"""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn)
+            self._cond.notify_all()
+
+    def status(self):
+        """返回連接池目前狀態"""
+        with self._cond:
+            return {
+                "db_path": self.db_path,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                **self.stats
+            }
+
+
+# 進程結束時關閉所有連接池
+atexit.register(ConnectionPool.close_all)
@@ -1,56 +1,258 @@
 import sqlite3
 import os
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
 from datetime import datetime, date, timedelta
 
+from .connection import ConnectionPool, connect
+from .profiles import resolve_profile, read_pragmas
+from . import rollups
+from .report_cache import ReportCache, cached_report
+from .pagination import encode_cursor, decode_cursor
+from .timeutil import DB_TIME_FORMAT, local_now, to_local, format_db_time
+
+logger = logging.getLogger(__name__)
+
+# 每個執行緒目前進行中的工作單元：{資料庫路徑: 連接}
+_sessions = threading.local()
+
+
+def reminder_title_key(title):
+    """提醒標題的短雜湊，通知按鈕以到期時間與此值識別提醒，不必放入完整標題"""
+    return hashlib.sha1(title.encode('utf-8')).hexdigest()[:16]
+
 class DatabaseUtils:
     """資料庫操作工具類"""
     
-    def __init__(self, db_path='database/linebot.db'):
-        """初始化資料庫連接"""
+    def __init__(self, db_path='database/linebot.db', pool_size=None, profile=None):
+        """初始化資料庫連接
+        
+        Args:
+            db_path: 資料庫檔案路徑
+            pool_size: 連接池大小，None 時讀取環境變數 DB_POOL_SIZE，0 表示不使用連接池
+            profile: PRAGMA 設定檔名稱，None 時讀取環境變數 DB_PRAGMA_PROFILE
+        """
         self.db_path = db_path
+        self.profile, self.pragmas = resolve_profile(profile)
+        
+        if pool_size is None:
+            pool_size = int(os.environ.get('DB_POOL_SIZE', '5'))
+        
+        # 同一路徑的 DatabaseUtils 實例共用同一個連接池
+        self.pool = ConnectionPool.for_path(db_path, max_size=pool_size, pragmas=self.pragmas) if pool_size > 0 else None
+        
+        # 報表結果快取，REPORT_CACHE_SIZE=0 表示不使用
+        cache_size = int(os.environ.get('REPORT_CACHE_SIZE', '256'))
+        self.report_cache = ReportCache.for_path(
+            db_path,
+            max_entries=cache_size,
+            max_bytes=int(os.environ.get('REPORT_CACHE_MAX_BYTES', str(8 * 1024 * 1024))),
+            ttl=float(os.environ.get('REPORT_CACHE_TTL', '300'))
+        ) if cache_size > 0 else None
         
     def get_connection(self):
-        """獲取資料庫連接"""
-        conn = sqlite3.connect(self.db_path)
-        # 設定 row_factory 讓查詢結果以字典形式返回
-        conn.row_factory = sqlite3.Row
-        return conn
+        """獲取資料庫連接（呼叫者負責關閉）"""
+        return connect(self.db_path, self.pragmas)
+    
+    def _session_connection(self):
+        """返回目前執行緒在此資料庫上進行中的工作單元連接"""
+        connections = getattr(_sessions, 'connections', None)
+        if not connections:
+            return None
+        return connections.get(os.path.abspath(self.db_path))
+    
+    def in_session(self):
+        """目前執行緒是否在工作單元中"""
+        return self._session_connection() is not None
+    
+    @contextmanager
+    def connection(self):
+        """借用資料庫連接，使用完畢後自動歸還連接池或關閉"""
+        session_conn = self._session_connection()
+        if session_conn is not None:
+            # 工作單元中的所有操作共用同一個連接
+            yield session_conn
+        elif self.pool is None:
+            conn = self.get_connection()
+            try:
+                yield conn
+            finally:
+                conn.close()
+        else:
+            conn = self.pool.acquire()
+            try:
+                yield conn
+            finally:
+                self.pool.release(conn)
+    
+    def close(self):
+        """關閉此資料庫路徑的連接池"""
+        if self.pool is not None:
+            self.pool.close()
+    
+    def check_settings(self):
+        """啟動自我檢查：記錄實際生效的 PRAGMA 設定，並警告與設定檔不一致的項目
+        
+        Returns:
+            dict: 實際生效的 PRAGMA 設定
+        """
+        with self.connection() as conn:
+            effective = read_pragmas(conn)
+        
+        logger.info(f"資料庫 {self.db_path} 使用設定檔 {self.profile}: " +
+                    ", ".join(f"{name}={value}" for name, value in effective.items()))
+        
+        for name, expected in self.pragmas.items():
+            actual = effective.get(name)
+            if str(actual).lower() != str(expected).lower() and not self._pragma_equivalent(name, expected, actual):
+                logger.warning(f"資料庫設定 {name} 預期為 {expected}，實際為 {actual}")
+        
+        return effective
+    
+    @staticmethod
+    def _pragma_equivalent(name, expected, actual):
+        """比較以名稱設定、但以數字回報的 PRAGMA 值"""
+        aliases = {
+            "synchronous": {"off": 0, "normal": 1, "full": 2, "extra": 3},
+            "temp_store": {"default": 0, "file": 1, "memory": 2}
+        }
+        mapping = aliases.get(name, {})
+        return mapping.get(str(expected).lower(), expected) == actual
     
     def execute_query(self, query, params=(), fetchall=True):
         """執行查詢"""
-        conn = self.get_connection()
-        try:
+        with self.connection() as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
             if fetchall:
                 result = [dict(row) for row in cursor.fetchall()]
             else:
-                result = dict(cursor.fetchone()) if cursor.fetchone() else None
+                row = cursor.fetchone()
+                result = dict(row) if row else None
             return result
-        finally:
-            conn.close()
+    
+    def iter_query(self, query, params=(), chunk_size=500, row_type='dict'):
+        """以串流方式執行查詢，每次從資料庫取出 chunk_size 筆，記憶體用量固定
+        
+        連接在迭代期間保持借用，迭代結束或生成器被關閉時歸還。
+        
+        Args:
+            query: SQL 查詢
+            params: 查詢參數
+            chunk_size: 每次 fetchmany 的筆數
+            row_type: 'dict'、'tuple' 或 'namedtuple'
+            
+        Yields:
+            每一筆查詢結果
+        """
+        if row_type not in ('dict', 'tuple', 'namedtuple'):
+            raise ValueError(f"不支援的 row_type: {row_type}")
+        
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            
+            if row_type == 'namedtuple':
+                Row = namedtuple('Row', [column[0] for column in cursor.description], rename=True)
+                convert = Row._make
+            elif row_type == 'tuple':
+                convert = tuple
+            else:
+                convert = dict
+            
+            try:
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield convert(row)
+            finally:
+                cursor.close()
     
     def execute_update(self, query, params=()):
         """執行更新操作"""
-        conn = self.get_connection()
-        try:
+        with self.connection() as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
-            conn.commit()
+            self._commit(conn)
             return cursor.lastrowid
-        finally:
-            conn.close()
     
     def execute_many(self, query, params_list):
         """執行批量操作"""
-        conn = self.get_connection()
-        try:
+        with self.connection() as conn:
             cursor = conn.cursor()
             cursor.executemany(query, params_list)
-            conn.commit()
+            self._commit(conn)
             return cursor.rowcount
-        finally:
-            conn.close()
+    
+    def _commit(self, conn):
+        """提交變更；在工作單元中則延後到工作單元結束時一次提交"""
+        if not self.in_session():
+            conn.commit()
+    
+    @contextmanager
+    def transaction(self):
+        """在同一個連接上執行的原子交易
+        
+        以 BEGIN IMMEDIATE 開始，離開時提交；發生例外時回滾。
+        若目前執行緒已在交易或工作單元中，則加入外層，由外層負責提交。
+        """
+        with self.connection() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+            
+            conn.execute("BEGIN IMMEDIATE")
+            if self.in_session():
+                yield conn
+                return
+            
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+    
+    @contextmanager
+    def session(self, immediate=False):
+        """工作單元：區塊內所有輔助方法共用一個連接，結束時只提交一次
+        
+        發生例外時回滾整個工作單元。巢狀呼叫會加入外層工作單元。
+        
+        Args:
+            immediate: 是否一開始就取得寫入鎖（BEGIN IMMEDIATE），
+                       適合確定會寫入、且需要讀寫一致的處理流程
+        
+        用法：
+            with db.session():
+                accounts = db.get_accounts(user_id)
+                db.add_transaction(...)
+        """
+        if self.in_session():
+            yield self
+            return
+        
+        key = os.path.abspath(self.db_path)
+        with self.connection() as conn:
+            connections = _sessions.__dict__.setdefault('connections', {})
+            connections[key] = conn
+            try:
+                if immediate:
+                    conn.execute("BEGIN IMMEDIATE")
+                yield self
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+            finally:
+                connections.pop(key, None)
     
     # 用戶相關方法
     def get_user(self, user_id):
@@ -70,7 +272,7 @@ class DatabaseUtils:
     
     # 記帳相關方法
     def add_transaction(self, user_id, account_id, category_id, type_name, amount, description, trans_date=None):
-        """新增交易記錄"""
+        """新增交易記錄，並在同一個交易中更新帳戶餘額"""
         if trans_date is None:
             trans_date = date.today().isoformat()
         
@@ -80,19 +282,83 @@ class DatabaseUtils:
             VALUES (?, ?, ?, ?, ?, ?, ?)
         """
         
-        transaction_id = self.execute_update(
-            query, 
-            (user_id, account_id, category_id, type_name, amount, description, trans_date)
-        )
-        
-        # 更新帳戶餘額
-        if type_name == 'income':
-            self.update_account_balance(account_id, amount)
-        else:
-            self.update_account_balance(account_id, -amount)
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                query, 
+                (user_id, account_id, category_id, type_name, amount, description, trans_date)
+            )
+            transaction_id = cursor.lastrowid
+            
+            # 更新帳戶餘額
+            self._apply_balance_change(conn, account_id, self._balance_delta(type_name, amount))
             
         return transaction_id
     
+    def update_transaction(self, transaction_id, user_id, type_name, amount, trans_date, category_id, account_id, description):
+        """更新交易記錄，還原原帳戶餘額並套用新金額（單一原子交易）
+        
+        Returns:
+            dict: 更新前的交易記錄，若交易不存在或不屬於該用戶則返回 None
+        """
+        with self.transaction() as conn:
+            original = conn.execute(
+                "SELECT * FROM transactions WHERE transaction_id = ? AND user_id = ?",
+                (transaction_id, user_id)
+            ).fetchone()
+            
+            if not original:
+                return None
+            original = dict(original)
+            
+            # 還原原交易對帳戶餘額的影響
+            if original.get('account_id') and original.get('amount') and original.get('type'):
+                self._apply_balance_change(
+                    conn, original['account_id'],
+                    -self._balance_delta(original['type'], original['amount'])
+                )
+            
+            conn.execute(
+                """
+                UPDATE transactions 
+                SET type = ?, amount = ?, date = ?, category_id = ?, account_id = ?, description = ?
+                WHERE transaction_id = ? AND user_id = ?
+                """,
+                (type_name, amount, trans_date, category_id, account_id, description, transaction_id, user_id)
+            )
+            
+            # 套用新交易對帳戶餘額的影響
+            if account_id and amount:
+                self._apply_balance_change(conn, account_id, self._balance_delta(type_name, amount))
+            
+            return original
+    
+    def delete_transaction(self, transaction_id, user_id):
+        """刪除交易記錄並還原帳戶餘額（單一原子交易）
+        
+        Returns:
+            dict: 被刪除的交易記錄，若交易不存在或不屬於該用戶則返回 None
+        """
+        with self.transaction() as conn:
+            transaction = conn.execute(
+                "SELECT * FROM transactions WHERE transaction_id = ? AND user_id = ?",
+                (transaction_id, user_id)
+            ).fetchone()
+            
+            if not transaction:
+                return None
+            transaction = dict(transaction)
+            
+            conn.execute("DELETE FROM transactions WHERE transaction_id = ?", (transaction_id,))
+            
+            # 如果是收入，則減少餘額；如果是支出，則增加餘額
+            if transaction.get('account_id') and transaction.get('amount') and transaction.get('type'):
+                self._apply_balance_change(
+                    conn, transaction['account_id'],
+                    -self._balance_delta(transaction['type'], transaction['amount'])
+                )
+            
+            return transaction
+    
     def get_transactions(self, user_id, start_date=None, end_date=None, type_name=None, category_id=None, limit=50):
         """獲取交易記錄"""
         query = """
@@ -121,11 +387,91 @@ class DatabaseUtils:
             query += " AND t.category_id = ?"
             params.append(category_id)
         
-        query += " ORDER BY t.date DESC, t.created_at DESC LIMIT ?"
+        # 以 transaction_id 作為同日排序依據，可直接沿索引順序讀取，不需額外排序
+        query += " ORDER BY t.date DESC, t.transaction_id DESC LIMIT ?"
         params.append(limit)
         
         return self.execute_query(query, tuple(params))
     
+    def get_transactions_page(self, user_id, start_date, end_date, type_name=None, category_id=None,
+                              limit=20, cursor=None):
+        """以 keyset 分頁讀取交易記錄，依日期與交易 ID 由新到舊排序
+        
+        Args:
+            user_id: 用戶ID
+            start_date: 開始日期
+            end_date: 結束日期
+            type_name: 交易類型，None 表示全部
+            category_id: 分類ID
+            limit: 每頁筆數
+            cursor: 上一頁返回的游標，None 表示第一頁
+            
+        Returns:
+            tuple: (交易記錄列表, 下一頁游標；沒有下一頁時為 None)
+            
+        Raises:
+            InvalidCursorError: 游標無效或與查詢條件不符
+        """
+        filters = {
+            "user_id": user_id, "start_date": start_date, "end_date": end_date,
+            "type": type_name, "category_id": category_id
+        }
+        
+        query = """
+            SELECT t.*, c.name as category_name, c.icon as category_icon, a.name as account_name
+            FROM transactions t
+            LEFT JOIN categories c ON t.category_id = c.category_id
+            LEFT JOIN accounts a ON t.account_id = a.account_id
+            WHERE t.user_id = ? AND t.date BETWEEN ? AND ?
+        """
+        params = [user_id, start_date, end_date]
+        
+        if type_name:
+            query += " AND t.type = ?"
+            params.append(type_name)
+        
+        if category_id:
+            query += " AND t.category_id = ?"
+            params.append(category_id)
+        
+        if cursor:
+            last_date, last_id = decode_cursor(cursor, filters)
+            query += " AND (t.date, t.transaction_id) < (?, ?)"
+            params.extend([last_date, last_id])
+        
+        # 多讀一筆判斷是否還有下一頁
+        query += " ORDER BY t.date DESC, t.transaction_id DESC LIMIT ?"
+        params.append(limit + 1)
+        
+        rows = self.execute_query(query, tuple(params))
+        if len(rows) <= limit:
+            return rows, None
+        
+        rows = rows[:limit]
+        last = rows[-1]
+        return rows, encode_cursor(last["date"], last["transaction_id"], filters)
+    
+    @cached_report('transaction_count')
+    def count_transactions(self, user_id, start_date, end_date, type_name=None, category_id=None):
+        """由日彙總表計算交易筆數，成本與天數成正比而非交易筆數"""
+        query = """
+            SELECT COALESCE(SUM(transaction_count), 0) as total
+            FROM transaction_daily_rollups
+            WHERE user_id = ? AND day BETWEEN ? AND ?
+        """
+        params = [user_id, start_date, end_date]
+        
+        if type_name:
+            query += " AND type = ?"
+            params.append(type_name)
+        
+        if category_id:
+            query += " AND category_id = ?"
+            params.append(category_id)
+        
+        result = self.execute_query(query, tuple(params), fetchall=False)
+        return result["total"] if result else 0
+    
     # 分類相關方法
     def get_categories(self, user_id, type_name=None):
         """獲取分類列表"""
@@ -201,30 +547,39 @@ class DatabaseUtils:
         Args:
             account_id: 帳戶ID
             amount_change: 金額變化（正數為增加，負數為減少）
+            
+        Returns:
+            更新後的餘額，帳戶不存在時返回 None
         """
         if not account_id:
             return
         
-        # 先獲取當前餘額
-        account = self.execute_query(
-            "SELECT balance FROM accounts WHERE account_id = ?",
-            (account_id,),
-            fetchall=False
-        )
-        
-        if not account:
-            return
-        
-        current_balance = account.get('balance', 0)
-        new_balance = current_balance + amount_change
+        with self.transaction() as conn:
+            return self._apply_balance_change(conn, account_id, amount_change)
+    
+    @staticmethod
+    def _balance_delta(type_name, amount):
+        """計算交易對帳戶餘額的影響：收入為正，支出為負"""
+        return amount if type_name == 'income' else -amount
+    
+    def _apply_balance_change(self, conn, account_id, amount_change):
+        """在既有連接上以單一 UPDATE 調整餘額，計算在 SQL 中完成以避免遺失更新"""
+        if not account_id:
+            return None
         
-        # 更新餘額
-        self.execute_update(
-            "UPDATE accounts SET balance = ? WHERE account_id = ?",
-            (new_balance, account_id)
+        cursor = conn.execute(
+            "UPDATE accounts SET balance = COALESCE(balance, 0) + ? WHERE account_id = ?",
+            (amount_change, account_id)
         )
         
-        return new_balance
+        if cursor.rowcount == 0:
+            return None
+        
+        row = conn.execute(
+            "SELECT balance FROM accounts WHERE account_id = ?",
+            (account_id,)
+        ).fetchone()
+        return row['balance']
     
     # 提醒相關方法
     def add_reminder(self, user_id, title, due_date, description=None, remind_before=30, repeat_type=None, repeat_value=None):
@@ -236,7 +591,7 @@ class DatabaseUtils:
         """
         return self.execute_update(
             query, 
-            (user_id, title, description, due_date, remind_before, repeat_type, repeat_value)
+            (user_id, title, description, format_db_time(due_date), remind_before, repeat_type, repeat_value)
         )
     
     def get_reminders(self, user_id, is_completed=False, limit=50):
@@ -259,15 +614,221 @@ class DatabaseUtils:
         return self.execute_query(query, (reminder_id,), fetchall=False)
     
     def get_upcoming_reminders(self, user_id, hours_ahead=24):
-        """獲取即將到期的提醒"""
+        """獲取用戶即將到期的提醒（到期時間以 APP_TIMEZONE 的本地時間比較）"""
         query = """
             SELECT * FROM reminders 
             WHERE user_id = ? 
               AND is_completed = 0
-              AND due_date <= datetime('now', '+' || ? || ' hours')
-            ORDER BY due_date ASC
+              AND datetime(due_date) <= ?
+            ORDER BY datetime(due_date) ASC
+        """
+        until = local_now() + timedelta(hours=hours_ahead)
+        return self.execute_query(query, (user_id, until.strftime(DB_TIME_FORMAT)))
+    
+    def get_reminder_change_cursor(self):
+        """返回最新一筆提醒變動記錄的 ID，沒有記錄時返回 0"""
+        row = self.execute_query("SELECT MAX(change_id) AS change_id FROM reminder_changes", fetchall=False)
+        return (row["change_id"] or 0) if row else 0
+    
+    def get_reminder_changes(self, after, limit=1000):
+        """返回 change_id 大於 after 的提醒變動記錄（change_id, reminder_id），依 change_id 排序，最多 limit 筆"""
+        return self.execute_query(
+            "SELECT change_id, reminder_id FROM reminder_changes WHERE change_id > ? ORDER BY change_id LIMIT ?",
+            (after, limit)
+        )
+    
+    def prune_reminder_changes(self, upto):
+        """刪除已套用的提醒變動記錄（change_id 不大於 upto）"""
+        with self.connection() as conn:
+            cursor = conn.execute("DELETE FROM reminder_changes WHERE change_id <= ?", (upto,))
+            self._commit(conn)
+            return cursor.rowcount
+    
+    def get_max_remind_before(self):
+        """未完成提醒中最大的提前分鐘數"""
+        row = self.execute_query(
+            "SELECT MAX(remind_before) AS lead FROM reminders WHERE is_completed = 0", fetchall=False
+        )
+        return max(0, int(row["lead"] or 0)) if row else 0
+    
+    def get_due_reminders_page(self, until, due_after, after=None, limit=1000, max_attempts=3, stale_before=0,
+                               due_until=None):
+        """返回所有用戶中觸發時間（due_date - remind_before）不晚於 until、到期時間不早於 due_after，
+        且這次觸發仍需發送的未完成提醒，依 (到期時間, 提醒 ID) 排序，每次最多 limit 筆
+        
+        已發送、已確認、重試次數用完，或正由其他進程發送中的觸發不會返回。
+        查詢以 idx_reminders_pending_due 讀取到期時間介於 due_after 與 due_until 之間的提醒，
+        成本只與這段時間內的提醒數有關，不隨資料表大小增加。
+        
+        Args:
+            until, due_after: 本地時間（datetime 或 'YYYY-MM-DD HH:MM:SS'）
+            after: 上一頁返回的游標，None 表示第一頁
+            max_attempts: 失敗後最多嘗試的次數
+            stale_before: 認領時間（Unix 秒數）早於此值的 sending 視為進程已中斷，可重新認領
+            due_until: 到期時間的上限，None 時為 until 加上最大的提前分鐘數
+        
+        Returns:
+            (提醒列表, 下一頁的游標)，沒有下一頁時游標為 None
+        """
+        until = to_local(until)
+        due_after = format_db_time(due_after)
+        if due_until is None:
+            due_until = until + timedelta(minutes=self.get_max_remind_before())
+        last_due, last_id = after if after else (due_after, 0)
+        
+        query = """
+            SELECT due.*, d.status AS delivery_status, COALESCE(d.attempts, 0) AS delivery_attempts,
+                   d.next_attempt_at AS delivery_next_attempt_at
+            FROM (
+                SELECT reminders.*,
+                       datetime(due_date) AS due_key,
+                       datetime(due_date, '-' || COALESCE(remind_before, 0) || ' minutes') AS fire_at
+                FROM reminders
+                WHERE is_completed = 0
+                  AND datetime(due_date) BETWEEN ? AND ?
+                  AND (datetime(due_date) > ? OR reminder_id > ?)
+            ) AS due
+            LEFT JOIN reminder_deliveries d
+              ON d.reminder_id = due.reminder_id AND d.fire_at = due.fire_at
+            WHERE due.fire_at <= ?
+              AND (d.status IS NULL
+                   OR d.status = 'scheduled'
+                   OR (d.status = 'failed' AND d.attempts < ?)
+                   OR (d.status = 'sending' AND d.claimed_at < ?))
+            ORDER BY due.due_key ASC, due.reminder_id ASC
+            LIMIT ?
+        """
+        rows = self.execute_query(query, (
+            max(last_due, due_after), format_db_time(due_until), last_due, last_id,
+            until.strftime(DB_TIME_FORMAT), max_attempts, int(stale_before), limit + 1
+        ))
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, (rows[-1]["due_key"], rows[-1]["reminder_id"])
+    
+    def get_due_reminders_by_ids(self, reminder_ids, until, due_after, max_attempts=3, stale_before=0):
+        """返回指定提醒中符合 get_due_reminders_page 條件的提醒（已完成、已刪除或不在範圍內的不返回）
+        
+        排程器以此重新讀取變動過的提醒，只更新記憶體中這些提醒的排程。
+        """
+        reminder_ids = list(reminder_ids)
+        if not reminder_ids:
+            return []
+        placeholders = ', '.join('?' * len(reminder_ids))
+        query = f"""
+            SELECT due.*, d.status AS delivery_status, COALESCE(d.attempts, 0) AS delivery_attempts,
+                   d.next_attempt_at AS delivery_next_attempt_at
+            FROM (
+                SELECT reminders.*,
+                       datetime(due_date) AS due_key,
+                       datetime(due_date, '-' || COALESCE(remind_before, 0) || ' minutes') AS fire_at
+                FROM reminders
+                WHERE reminder_id IN ({placeholders})
+                  AND is_completed = 0
+                  AND datetime(due_date) >= ?
+            ) AS due
+            LEFT JOIN reminder_deliveries d
+              ON d.reminder_id = due.reminder_id AND d.fire_at = due.fire_at
+            WHERE due.fire_at <= ?
+              AND (d.status IS NULL
+                   OR d.status = 'scheduled'
+                   OR (d.status = 'failed' AND d.attempts < ?)
+                   OR (d.status = 'sending' AND d.claimed_at < ?))
+            ORDER BY due.due_key ASC, due.reminder_id ASC
+        """
+        return self.execute_query(query, (
+            *reminder_ids, format_db_time(due_after), format_db_time(until), max_attempts, int(stale_before)
+        ))
+    
+    def iter_due_reminders(self, until, due_after, chunk_size=1000, **kwargs):
+        """逐頁讀取 get_due_reminders_page 的結果，每頁為一個短查詢，不會長時間佔用連接
+        
+        Yields:
+            每一頁的提醒列表
+        """
+        until = to_local(until)
+        if 'due_until' not in kwargs:
+            kwargs['due_until'] = until + timedelta(minutes=self.get_max_remind_before())
+        cursor = None
+        while True:
+            rows, cursor = self.get_due_reminders_page(until, due_after, after=cursor, limit=chunk_size, **kwargs)
+            if rows:
+                yield rows
+            if cursor is None:
+                return
+    
+    def schedule_reminder_deliveries(self, occurrences, now):
+        """記錄已排入排程器的觸發
+        
+        Args:
+            occurrences: [(reminder_id, fire_at, user_id)]
+            now: Unix 秒數
         """
-        return self.execute_query(query, (user_id, hours_ahead))
+        if not occurrences:
+            return 0
+        return self.execute_many(
+            """
+            INSERT OR IGNORE INTO reminder_deliveries (reminder_id, fire_at, user_id, status, updated_at)
+            VALUES (?, ?, ?, 'scheduled', ?)
+            """,
+            [(reminder_id, fire_at, user_id, int(now)) for reminder_id, fire_at, user_id in occurrences]
+        )
+    
+    def claim_reminder_delivery(self, reminder_id, fire_at, user_id, owner, now, max_attempts=3, stale_before=0):
+        """原子地認領一次觸發的發送權
+        
+        只有尚未發送（scheduled 或沒有記錄）、已到重試時間的 failed，或認領逾時的 sending 能被認領。
+        
+        Returns:
+            認領後的嘗試次數；已被其他進程認領或不需發送時返回 None
+        """
+        with self.connection() as conn:
+            row = conn.execute(
+                """
+                INSERT INTO reminder_deliveries
+                    (reminder_id, fire_at, user_id, status, attempts, claimed_by, claimed_at, updated_at)
+                VALUES (?, ?, ?, 'sending', 1, ?, ?, ?)
+                ON CONFLICT (reminder_id, fire_at) DO UPDATE SET
+                    status = 'sending',
+                    attempts = attempts + 1,
+                    claimed_by = excluded.claimed_by,
+                    claimed_at = excluded.claimed_at,
+                    updated_at = excluded.updated_at
+                WHERE status = 'scheduled'
+                   OR (status = 'failed' AND attempts < ? AND COALESCE(next_attempt_at, 0) <= excluded.claimed_at)
+                   OR (status = 'sending' AND claimed_at < ?)
+                RETURNING attempts
+                """,
+                (reminder_id, fire_at, user_id, owner, int(now), int(now), max_attempts, int(stale_before))
+            ).fetchone()
+            self._commit(conn)
+            return row[0] if row else None
+    
+    def finish_reminder_delivery(self, reminder_id, fire_at, owner, now, error=None, next_attempt_at=None):
+        """記錄認領後的發送結果：error 為 None 時標記為 sent，否則為 failed 並保存錯誤訊息
+        
+        Args:
+            next_attempt_at: 失敗時最早可重試的時間（Unix 秒數），None 表示立即可重試
+        """
+        return self.execute_update(
+            """
+            UPDATE reminder_deliveries
+            SET status = ?, last_error = COALESCE(?, last_error), sent_at = CASE WHEN ? IS NULL THEN ? ELSE sent_at END,
+                next_attempt_at = ?, updated_at = ?
+            WHERE reminder_id = ? AND fire_at = ? AND claimed_by = ? AND status = 'sending'
+            """,
+            ('failed' if error else 'sent', error, error, int(now),
+             int(next_attempt_at) if error and next_attempt_at is not None else None, int(now),
+             reminder_id, fire_at, owner)
+        )
+    
+    def get_reminder_deliveries(self, reminder_id):
+        """返回提醒每次觸發的發送狀態"""
+        return self.execute_query(
+            "SELECT * FROM reminder_deliveries WHERE reminder_id = ? ORDER BY fire_at ASC",
+            (reminder_id,)
+        )
     
     def complete_reminder(self, reminder_id, user_id):
         """完成提醒"""
@@ -278,6 +839,27 @@ class DatabaseUtils:
         """
         return self.execute_update(query, (reminder_id, user_id))
     
+    def complete_reminder_occurrence(self, user_id, title, due_date, title_key=None):
+        """以到期時間與標題（或標題雜湊 title_key）完成用戶的提醒
+        
+        提醒通知的按鈕不帶提醒 ID，多位用戶的相同提醒可以共用同一則 multicast 訊息。
+        只有唯一一個未完成的提醒符合時才標記完成，返回符合的提醒數；
+        有多個相同標題、相同時間的提醒時無法判斷是哪一個，不做任何變更。
+        """
+        with self.connection() as conn:
+            rows = conn.execute(
+                "SELECT reminder_id, title FROM reminders WHERE user_id = ? AND due_date = ? AND is_completed = 0",
+                (user_id, due_date)
+            ).fetchall()
+            matched = [
+                row[0] for row in rows
+                if row[1] == title or (title_key is not None and reminder_title_key(row[1]) == title_key)
+            ]
+            if len(matched) == 1:
+                conn.execute("UPDATE reminders SET is_completed = 1 WHERE reminder_id = ?", (matched[0],))
+                self._commit(conn)
+            return len(matched)
+    
     def update_reminder_status(self, reminder_id, is_completed):
         """更新提醒狀態"""
         query = """
@@ -295,7 +877,115 @@ class DatabaseUtils:
         """
         return self.execute_update(query, (reminder_id,))
     
+    # Webhook 事件相關方法
+    def claim_webhook_event(self, event_id, received_at):
+        """記錄 webhook 事件，返回 True 表示首次收到；已記錄過則返回 False"""
+        with self.connection() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO webhook_events (event_id, received_at) VALUES (?, ?)",
+                (event_id, int(received_at))
+            )
+            self._commit(conn)
+            return cursor.rowcount == 1
+    
+    def prune_webhook_events(self, before):
+        """刪除 before（Unix 秒數）之前收到的事件記錄，返回刪除筆數"""
+        with self.connection() as conn:
+            cursor = conn.execute("DELETE FROM webhook_events WHERE received_at < ?", (int(before),))
+            self._commit(conn)
+            return cursor.rowcount
+    
+    # 排程器租約相關方法
+    def acquire_lease(self, name, holder, now, ttl):
+        """取得或續約租約：租約不存在、由 holder 持有或已過期時成功
+        
+        Returns:
+            成功時返回租約的 term（換手時遞增），租約由其他進程持有時返回 None
+        """
+        with self.connection() as conn:
+            row = conn.execute(
+                """
+                INSERT INTO scheduler_leases (name, holder, expires_at, heartbeat_at, term)
+                VALUES (?, ?, ?, ?, 1)
+                ON CONFLICT (name) DO UPDATE SET
+                    term = CASE WHEN holder = excluded.holder THEN term ELSE term + 1 END,
+                    holder = excluded.holder,
+                    expires_at = excluded.expires_at,
+                    heartbeat_at = excluded.heartbeat_at
+                WHERE holder = excluded.holder OR expires_at <= excluded.heartbeat_at
+                RETURNING term
+                """,
+                (name, holder, now + ttl, now)
+            ).fetchone()
+            self._commit(conn)
+            return row[0] if row else None
+    
+    def release_lease(self, name, holder):
+        """釋放 holder 持有的租約，讓其他進程立即接手"""
+        with self.connection() as conn:
+            cursor = conn.execute(
+                "UPDATE scheduler_leases SET expires_at = 0 WHERE name = ? AND holder = ?",
+                (name, holder)
+            )
+            self._commit(conn)
+            return cursor.rowcount == 1
+    
+    def get_lease(self, name):
+        """返回租約目前的持有者與到期時間"""
+        return self.execute_query("SELECT * FROM scheduler_leases WHERE name = ?", (name,), fetchall=False)
+    
     # 統計報表相關方法
+    def get_report_version(self, user_id):
+        """返回用戶報表資料的版本號，交易、分類或帳戶名稱變動時由觸發器遞增
+        
+        共用預設分類的變動記在 user_id = '*' 這一筆，計入每位用戶的版本號。
+        連接在交易或工作單元中時返回 None：尚未提交的版本號可能被回滾，不能作為快取依據。
+        """
+        with self.connection() as conn:
+            if conn.in_transaction:
+                return None
+            row = conn.execute(
+                "SELECT COALESCE(SUM(version), 0) FROM report_versions WHERE user_id IN (?, '*')", (user_id,)
+            ).fetchone()
+            return row[0]
+    
+    @cached_report('transaction_report')
+    def get_transaction_report(self, user_id, type_name, start_date, end_date, category=None, account=None):
+        """獲取 LINE 查詢報表使用的交易明細（含分類與帳戶名稱）
+        
+        Args:
+            user_id: 用戶ID
+            type_name: expense 或 income
+            start_date: 開始日期（YYYY-MM-DD）
+            end_date: 結束日期（YYYY-MM-DD）
+            category: 分類名稱關鍵字
+            account: 帳戶名稱關鍵字
+            
+        Returns:
+            list: 交易記錄，category 與 account 欄位為名稱
+        """
+        query = """
+        SELECT t.*, c.name as category, a.name as account
+        FROM transactions t
+        LEFT JOIN categories c ON t.category_id = c.category_id
+        LEFT JOIN accounts a ON t.account_id = a.account_id
+        WHERE t.user_id = ? AND t.type = ? AND t.date BETWEEN ? AND ?
+        """
+        params = [user_id, type_name, start_date, end_date]
+        
+        if category:
+            query += " AND c.name LIKE ?"
+            params.append(f"%{category}%")
+        
+        if account:
+            query += " AND a.name LIKE ?"
+            params.append(f"%{account}%")
+        
+        query += " ORDER BY t.date DESC, t.transaction_id DESC"
+        
+        return self.execute_query(query, tuple(params))
+    
+    @cached_report('expense_by_category')
     def get_expense_summary_by_category(self, user_id, start_date, end_date):
         """
         獲取指定日期範圍內的支出分類摘要
@@ -313,20 +1003,21 @@ class DatabaseUtils:
             c.category_id,
             c.name as category_name,
             c.icon as category_icon,
-            SUM(t.amount) as total_amount,
-            COUNT(t.transaction_id) as transaction_count
-        FROM transactions t
-        JOIN categories c ON t.category_id = c.category_id
-        WHERE t.user_id = ? 
-          AND t.type = 'expense'
-          AND t.date BETWEEN ? AND ?
-        GROUP BY t.category_id
+            SUM(r.total_amount) as total_amount,
+            SUM(r.transaction_count) as transaction_count
+        FROM transaction_daily_rollups r
+        JOIN categories c ON r.category_id = c.category_id
+        WHERE r.user_id = ? 
+          AND r.type = 'expense'
+          AND r.day BETWEEN ? AND ?
+        GROUP BY r.category_id
         ORDER BY total_amount DESC
         """
         
         results = self.execute_query(query, (user_id, start_date, end_date), fetchall=True)
         return results
     
+    @cached_report('income_by_category')
     def get_income_summary_by_category(self, user_id, start_date, end_date):
         """
         獲取指定日期範圍內的收入分類摘要
@@ -344,20 +1035,21 @@ class DatabaseUtils:
             c.category_id,
             c.name as category_name,
             c.icon as category_icon,
-            SUM(t.amount) as total_amount,
-            COUNT(t.transaction_id) as transaction_count
-        FROM transactions t
-        JOIN categories c ON t.category_id = c.category_id
-        WHERE t.user_id = ? 
-          AND t.type = 'income'
-          AND t.date BETWEEN ? AND ?
-        GROUP BY t.category_id
+            SUM(r.total_amount) as total_amount,
+            SUM(r.transaction_count) as transaction_count
+        FROM transaction_daily_rollups r
+        JOIN categories c ON r.category_id = c.category_id
+        WHERE r.user_id = ? 
+          AND r.type = 'income'
+          AND r.day BETWEEN ? AND ?
+        GROUP BY r.category_id
         ORDER BY total_amount DESC
         """
         
         results = self.execute_query(query, (user_id, start_date, end_date), fetchall=True)
         return results
     
+    @cached_report('daily_summary')
     def get_daily_summary(self, user_id, start_date, end_date):
         """
         獲取指定日期範圍內的每日收支摘要
@@ -372,19 +1064,20 @@ class DatabaseUtils:
         """
         query = """
         SELECT 
-            date,
-            SUM(CASE WHEN type = 'income' THEN amount ELSE 0 END) as total_income,
-            SUM(CASE WHEN type = 'expense' THEN amount ELSE 0 END) as total_expense,
-            SUM(CASE WHEN type = 'income' THEN amount ELSE -amount END) as balance
-        FROM transactions
-        WHERE user_id = ? AND date BETWEEN ? AND ?
-        GROUP BY date
-        ORDER BY date
+            day as date,
+            SUM(CASE WHEN type = 'income' THEN total_amount ELSE 0 END) as total_income,
+            SUM(CASE WHEN type = 'expense' THEN total_amount ELSE 0 END) as total_expense,
+            SUM(CASE WHEN type = 'income' THEN total_amount ELSE -total_amount END) as balance
+        FROM transaction_daily_rollups
+        WHERE user_id = ? AND day BETWEEN ? AND ?
+        GROUP BY day
+        ORDER BY day
         """
         
         results = self.execute_query(query, (user_id, start_date, end_date), fetchall=True)
         return results
     
+    @cached_report('monthly_summary')
     def get_monthly_summary(self, user_id, year):
         """
         獲取指定年份的月度收支摘要
@@ -398,19 +1091,33 @@ class DatabaseUtils:
         """
         query = """
         SELECT 
-            strftime('%m', date) as month,
-            SUM(CASE WHEN type = 'income' THEN amount ELSE 0 END) as total_income,
-            SUM(CASE WHEN type = 'expense' THEN amount ELSE 0 END) as total_expense,
-            SUM(CASE WHEN type = 'income' THEN amount ELSE -amount END) as balance
-        FROM transactions
-        WHERE user_id = ? AND strftime('%Y', date) = ?
-        GROUP BY strftime('%m', date)
+            substr(month, 6, 2) as month,
+            SUM(CASE WHEN type = 'income' THEN total_amount ELSE 0 END) as total_income,
+            SUM(CASE WHEN type = 'expense' THEN total_amount ELSE 0 END) as total_expense,
+            SUM(CASE WHEN type = 'income' THEN total_amount ELSE -total_amount END) as balance
+        FROM transaction_monthly_rollups
+        WHERE user_id = ? AND month BETWEEN ? AND ?
+        GROUP BY month
         ORDER BY month
         """
         
-        results = self.execute_query(query, (user_id, str(year)), fetchall=True)
+        # 使用月份範圍而非 strftime('%Y', ...)，才能使用主鍵
+        year = int(year)
+        results = self.execute_query(
+            query, (user_id, f"{year:04d}-01", f"{year:04d}-12"), fetchall=True
+        )
         return results
     
+    def rebuild_rollups(self, user_id=None):
+        """由原始交易重新計算彙總表，返回日彙總桶數"""
+        with self.transaction() as conn:
+            return rollups.rebuild(conn, user_id)
+    
+    def check_rollups(self, user_id=None):
+        """比對彙總表與原始交易，返回不一致的桶"""
+        with self.connection() as conn:
+            return rollups.check(conn, user_id)
+    
     def sync_line_web_data(self, user_id):
         """
         同步LINE和Web端的數據
@@ -463,12 +1170,13 @@ class DatabaseUtils:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    def _get_user_line_data(self, user_id):
+    def _get_user_line_data(self, user_id, stream=False):
         """
         獲取用戶在LINE端的數據
         
         Args:
             user_id: 用戶ID
+            stream: 為 True 時，交易記錄與提醒以生成器返回，逐批讀取
             
         Returns:
             dict: 包含用戶LINE端數據的字典
@@ -491,7 +1199,10 @@ class DatabaseUtils:
         WHERE t.user_id = ? AND t.date BETWEEN ? AND ?
         ORDER BY t.date DESC, t.transaction_id DESC
         """
-        transactions = self.execute_query(transactions_query, (user_id, thirty_days_ago, today), fetchall=True)
+        if stream:
+            transactions = self.iter_query(transactions_query, (user_id, thirty_days_ago, today))
+        else:
+            transactions = self.execute_query(transactions_query, (user_id, thirty_days_ago, today), fetchall=True)
         
         # 獲取未完成的提醒
         reminders_query = """
@@ -499,7 +1210,10 @@ class DatabaseUtils:
         WHERE user_id = ? AND status = 'pending'
         ORDER BY datetime ASC
         """
-        reminders = self.execute_query(reminders_query, (user_id,), fetchall=True)
+        if stream:
+            reminders = self.iter_query(reminders_query, (user_id,))
+        else:
+            reminders = self.execute_query(reminders_query, (user_id,), fetchall=True)
         
         return {
             "accounts": accounts,
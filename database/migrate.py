@@ -0,0 +1,331 @@
+"""
+版本化資料庫遷移
+
+database/migrations 目錄下的每個檔案是一個遷移，檔名格式為 <版本號>_<名稱>.sql 或 .py：
+  - .sql：以 executescript 執行，內容必須可重複執行（IF NOT EXISTS）
+  - .py：定義 upgrade(ctx)，透過 MigrationContext 執行 SQL 或分批回填資料
+
+已套用的版本記錄在 schema_version 資料表中，每次只執行尚未套用的遷移。
+大型資料表的回填以主鍵分批進行，每批獨立提交，避免長時間鎖住資料庫。
+
+命令列用法：
+    python -m database.migrate [--db 路徑] [--dry-run] [--status] [--batch-size N]
+"""
+import os
+import re
+import sys
+import time
+import logging
+import sqlite3
+import argparse
+import importlib.util
+
+from .connection import connect
+from .profiles import resolve_profile
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+DEFAULT_BATCH_SIZE = 1000
+
+_MIGRATION_FILE = re.compile(r'^(\d+)_(\w+)\.(sql|py)$')
+
+
+class Migration:
+    """單一遷移檔"""
+
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        self.kind = os.path.splitext(path)[1][1:]
+
+    def __repr__(self):
+        return f"Migration({self.version:04d}_{self.name}.{self.kind})"
+
+
+class MigrationContext:
+    """提供給 .py 遷移使用的操作介面，dry-run 時只記錄不執行"""
+
+    def __init__(self, conn, dry_run=False, batch_size=DEFAULT_BATCH_SIZE, pause=0.0):
+        self.conn = conn
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self.pause = pause
+        self.planned = []
+
+    def table_exists(self, table):
+        """檢查資料表是否存在"""
+        row = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()
+        return row is not None
+
+    def column_exists(self, table, column):
+        """檢查欄位是否存在"""
+        return any(row[1] == column for row in self.conn.execute(f"PRAGMA table_info({table})"))
+
+    def execute(self, sql, params=()):
+        """執行單一 SQL 並立即提交"""
+        if self.dry_run:
+            self.planned.append(sql.strip())
+            return
+        self.conn.execute(sql, params)
+
+    def executescript(self, script):
+        """執行多段 SQL"""
+        if self.dry_run:
+            self.planned.append(script.strip())
+            return
+        self.conn.executescript(script)
+
+    def add_column(self, table, column, definition):
+        """新增欄位，已存在時略過"""
+        if self.column_exists(table, column):
+            return False
+        self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        return True
+
+    def backfill(self, table, assignments, where, key='rowid', batch_size=None):
+        """依主鍵分批更新資料，每批在獨立的交易中提交
+
+        Args:
+            table: 資料表名稱
+            assignments: SET 子句，例如 "content = title"
+            where: 需要回填的資料列條件，回填後必須不再成立，重複執行時才會略過
+            key: 分批依據的遞增主鍵
+            batch_size: 每批筆數，預設使用 context 的設定
+
+        Returns:
+            int: 更新（dry-run 時為預計更新）的筆數
+        """
+        batch_size = batch_size or self.batch_size
+
+        if self.dry_run:
+            if not self.table_exists(table):
+                # 資料表由同一批尚未執行的遷移建立
+                self.planned.append(f"UPDATE {table} SET {assignments} WHERE {where}")
+                return 0
+            try:
+                count = self.conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}").fetchone()[0]
+            except sqlite3.OperationalError:
+                # 條件引用的欄位尚未新增，所有資料列都需要回填
+                count = self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            self.planned.append(f"UPDATE {table} SET {assignments} WHERE {where}  -- {count} 筆，每批 {batch_size} 筆")
+            return count
+
+        updated = 0
+        last_key = None
+        while True:
+            if last_key is None:
+                keys = self.conn.execute(
+                    f"SELECT {key} FROM {table} WHERE {where} ORDER BY {key} LIMIT ?", (batch_size,)
+                ).fetchall()
+            else:
+                keys = self.conn.execute(
+                    f"SELECT {key} FROM {table} WHERE {key} > ? AND ({where}) ORDER BY {key} LIMIT ?",
+                    (last_key, batch_size)
+                ).fetchall()
+            if not keys:
+                break
+
+            first, last_key = keys[0][0], keys[-1][0]
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self.conn.execute(
+                    f"UPDATE {table} SET {assignments} WHERE {key} BETWEEN ? AND ? AND ({where})",
+                    (first, last_key)
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+            updated += cursor.rowcount
+            logger.info(f"回填 {table}: 已更新 {updated} 筆")
+            # 批次之間讓出寫入鎖給其他進程
+            if self.pause:
+                time.sleep(self.pause)
+
+        return updated
+
+
+class MigrationRunner:
+    """依版本順序執行尚未套用的遷移"""
+
+    def __init__(self, db_path, migrations_dir=MIGRATIONS_DIR, batch_size=DEFAULT_BATCH_SIZE, pause=0.0):
+        self.db_path = db_path
+        self.migrations_dir = migrations_dir
+        self.batch_size = batch_size
+        self.pause = pause
+
+    def discover(self):
+        """列出遷移目錄中的所有遷移，依版本排序"""
+        migrations = {}
+        for filename in sorted(os.listdir(self.migrations_dir)):
+            match = _MIGRATION_FILE.match(filename)
+            if not match:
+                continue
+            version = int(match.group(1))
+            if version in migrations:
+                raise ValueError(f"重複的遷移版本: {filename}")
+            migrations[version] = Migration(version, match.group(2), os.path.join(self.migrations_dir, filename))
+        return [migrations[version] for version in sorted(migrations)]
+
+    def _connect(self, dry_run=False):
+        _, pragmas = resolve_profile()
+        # dry-run 不應建立尚不存在的資料庫檔案
+        db_path = ':memory:' if dry_run and not os.path.exists(self.db_path) else self.db_path
+        conn = connect(db_path, pragmas)
+        # 由執行器自行控制交易
+        conn.isolation_level = None
+        return conn
+
+    def applied_versions(self, conn):
+        """返回已套用的版本集合"""
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+        ).fetchone()
+        if not exists:
+            return set()
+        return {row[0] for row in conn.execute("SELECT version FROM schema_version")}
+
+    def pending(self, conn=None):
+        """返回尚未套用的遷移"""
+        own = conn is None
+        conn = conn or self._connect()
+        try:
+            applied = self.applied_versions(conn)
+            return [migration for migration in self.discover() if migration.version not in applied]
+        finally:
+            if own:
+                conn.close()
+
+    def status(self):
+        """返回每個遷移的套用狀態"""
+        conn = self._connect()
+        try:
+            applied = {}
+            if self.applied_versions(conn):
+                applied = {
+                    row["version"]: row
+                    for row in conn.execute("SELECT version, applied_at, duration_ms FROM schema_version")
+                }
+            return [
+                {
+                    "version": migration.version,
+                    "name": migration.name,
+                    "applied_at": applied[migration.version]["applied_at"] if migration.version in applied else None,
+                    "duration_ms": applied[migration.version]["duration_ms"] if migration.version in applied else None
+                }
+                for migration in self.discover()
+            ]
+        finally:
+            conn.close()
+
+    def run(self, dry_run=False, target=None):
+        """執行尚未套用的遷移
+
+        Args:
+            dry_run: 只列出將執行的操作，不修改資料庫
+            target: 只執行到此版本（含）
+
+        Returns:
+            list: 每個遷移的執行結果（版本、名稱、耗時、dry-run 時的預計操作）
+        """
+        conn = self._connect(dry_run)
+        results = []
+        try:
+            if not dry_run:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version INTEGER PRIMARY KEY,
+                        name VARCHAR(100) NOT NULL,
+                        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        duration_ms INTEGER
+                    )
+                """)
+
+            for migration in self.pending(conn):
+                if target is not None and migration.version > target:
+                    break
+
+                context = MigrationContext(conn, dry_run, self.batch_size, self.pause)
+                started = time.perf_counter()
+                logger.info(f"{'[dry-run] ' if dry_run else ''}執行遷移 {migration}")
+
+                if migration.kind == 'sql':
+                    with open(migration.path, 'r', encoding='utf-8') as f:
+                        context.executescript(f.read())
+                else:
+                    self._load(migration).upgrade(context)
+
+                duration_ms = int((time.perf_counter() - started) * 1000)
+                if not dry_run:
+                    conn.execute(
+                        "INSERT OR IGNORE INTO schema_version (version, name, duration_ms) VALUES (?, ?, ?)",
+                        (migration.version, migration.name, duration_ms)
+                    )
+                logger.info(f"遷移 {migration} 完成，耗時 {duration_ms} ms")
+
+                results.append({
+                    "version": migration.version,
+                    "name": migration.name,
+                    "duration_ms": duration_ms,
+                    "planned": context.planned
+                })
+            return results
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _load(migration):
+        spec = importlib.util.spec_from_file_location(f"migration_{migration.version:04d}", migration.path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        if not hasattr(module, 'upgrade'):
+            raise ValueError(f"{migration} 缺少 upgrade(ctx) 函數")
+        return module
+
+
+def migrate(db_path, dry_run=False, **kwargs):
+    """對指定資料庫執行所有尚未套用的遷移"""
+    return MigrationRunner(db_path, **kwargs).run(dry_run=dry_run)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='執行資料庫遷移')
+    parser.add_argument('--db', default=os.getenv('DATABASE_PATH', 'database/linebot.db'), help='資料庫檔案路徑')
+    parser.add_argument('--dry-run', action='store_true', help='只列出將執行的操作')
+    parser.add_argument('--status', action='store_true', help='顯示遷移套用狀態')
+    parser.add_argument('--target', type=int, help='只執行到此版本')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='回填資料時每批筆數')
+    parser.add_argument('--pause', type=float, default=0.0, help='每批之間暫停的秒數')
+    args = parser.parse_args(argv)
+
+    runner = MigrationRunner(args.db, batch_size=args.batch_size, pause=args.pause)
+
+    if args.status:
+        for row in runner.status():
+            state = f"已套用 {row['applied_at']} ({row['duration_ms']} ms)" if row["applied_at"] else "未套用"
+            print(f"{row['version']:04d}_{row['name']}: {state}")
+        return 0
+
+    results = runner.run(dry_run=args.dry_run, target=args.target)
+    if not results:
+        print("資料庫已是最新版本")
+    for result in results:
+        print(f"{result['version']:04d}_{result['name']}: {result['duration_ms']} ms")
+        for statement in result["planned"]:
+            print(f"    {statement}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,15 @@
+"""建立基礎資料表（schema.sql）
+
+既有資料庫在導入版本化遷移前已由 init_db.py 建立資料表，此時只記錄版本。
+"""
+import os
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'schema.sql')
+
+
+def upgrade(ctx):
+    if ctx.table_exists('users'):
+        return
+
+    with open(SCHEMA_PATH, 'r', encoding='utf-8') as f:
+        ctx.executescript(f.read())
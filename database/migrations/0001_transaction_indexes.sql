@@ -0,0 +1,13 @@
+-- 交易查詢熱路徑索引
+--
+-- 列表查詢：WHERE user_id = ? [AND date 範圍] ORDER BY date DESC, transaction_id DESC
+--   由既有的 idx_transactions_user_date 處理（索引尾端隱含 rowid，即 transaction_id，排序不需暫存 B-tree）
+--
+-- 每日／月度摘要：WHERE user_id = ? AND date 範圍，GROUP BY date
+--   覆蓋索引，摘要查詢不需回表讀取資料列
+CREATE INDEX IF NOT EXISTS idx_transactions_user_date_type_amount
+    ON transactions(user_id, date, type, amount);
+
+-- 分類摘要與依類型篩選的列表：WHERE user_id = ? AND type = ? AND date 範圍，GROUP BY category_id
+CREATE INDEX IF NOT EXISTS idx_transactions_user_type_date_category
+    ON transactions(user_id, type, date, category_id, amount);
@@ -0,0 +1,75 @@
+"""補上網頁端與同步功能使用的欄位
+
+webhook.py 的提醒 API 使用 content、datetime、notify_before、status、completed_at，
+LINE 端與排程器使用 title、due_date、remind_before、is_completed。
+新增欄位後回填既有資料，並以觸發器保持兩組欄位一致。
+"""
+
+
+def upgrade(ctx):
+    ctx.add_column('reminders', 'content', 'TEXT')
+    ctx.add_column('reminders', 'datetime', 'TIMESTAMP')
+    ctx.add_column('reminders', 'notify_before', 'INTEGER')
+    ctx.add_column('reminders', 'status', "VARCHAR(20) DEFAULT 'pending'")
+    ctx.add_column('reminders', 'completed_at', 'TIMESTAMP')
+    ctx.add_column('users', 'last_sync', 'TIMESTAMP')
+
+    # 分批回填，每批獨立提交
+    ctx.backfill(
+        'reminders',
+        """content = title,
+           datetime = due_date,
+           notify_before = remind_before,
+           status = CASE WHEN is_completed THEN 'completed' ELSE 'pending' END""",
+        "content IS NULL OR datetime IS NULL",
+        key='reminder_id'
+    )
+
+    ctx.executescript("""
+        -- LINE 端新增的提醒補上網頁端欄位
+        CREATE TRIGGER IF NOT EXISTS sync_reminders_web_columns_on_insert
+        AFTER INSERT ON reminders
+        WHEN NEW.content IS NULL OR NEW.datetime IS NULL OR NEW.notify_before IS NULL
+        BEGIN
+            UPDATE reminders SET
+                content = COALESCE(NEW.content, NEW.title),
+                datetime = COALESCE(NEW.datetime, NEW.due_date),
+                notify_before = COALESCE(NEW.notify_before, NEW.remind_before),
+                status = CASE WHEN NEW.is_completed THEN 'completed' ELSE COALESCE(NEW.status, 'pending') END
+            WHERE reminder_id = NEW.reminder_id;
+        END;
+
+        -- LINE 端修改時同步到網頁端欄位
+        CREATE TRIGGER IF NOT EXISTS sync_reminders_web_columns_on_update
+        AFTER UPDATE OF title, due_date, remind_before, is_completed ON reminders
+        WHEN NEW.content IS NOT NEW.title
+          OR NEW.datetime IS NOT NEW.due_date
+          OR NEW.notify_before IS NOT NEW.remind_before
+          OR (NEW.is_completed AND NEW.status IS NOT 'completed')
+          OR (NOT NEW.is_completed AND NEW.status IS 'completed')
+        BEGIN
+            UPDATE reminders SET
+                content = NEW.title,
+                datetime = NEW.due_date,
+                notify_before = NEW.remind_before,
+                status = CASE WHEN NEW.is_completed THEN 'completed' ELSE 'pending' END,
+                completed_at = CASE WHEN NEW.is_completed THEN COALESCE(NEW.completed_at, CURRENT_TIMESTAMP) ELSE NULL END
+            WHERE reminder_id = NEW.reminder_id;
+        END;
+
+        -- 網頁端修改時同步到 LINE 端欄位
+        CREATE TRIGGER IF NOT EXISTS sync_reminders_line_columns_on_update
+        AFTER UPDATE OF content, datetime, notify_before, status ON reminders
+        WHEN NEW.title IS NOT NEW.content
+          OR NEW.due_date IS NOT NEW.datetime
+          OR NEW.remind_before IS NOT NEW.notify_before
+          OR NEW.is_completed IS NOT (COALESCE(NEW.status, 'pending') = 'completed')
+        BEGIN
+            UPDATE reminders SET
+                title = COALESCE(NEW.content, NEW.title),
+                due_date = COALESCE(NEW.datetime, NEW.due_date),
+                remind_before = COALESCE(NEW.notify_before, NEW.remind_before),
+                is_completed = (COALESCE(NEW.status, 'pending') = 'completed')
+            WHERE reminder_id = NEW.reminder_id;
+        END;
+    """)
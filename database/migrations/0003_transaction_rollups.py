@@ -0,0 +1,70 @@
+"""建立交易彙總表與維護觸發器，並由既有交易逐一用戶填入"""
+from database.rollups import ROLLUPS, rebuild
+
+
+def _add(table, bucket_column, bucket_expr, row):
+    expr = bucket_expr.replace('date', f'{row}.date')
+    return f"""
+            INSERT INTO {table} (user_id, {bucket_column}, type, category_id, total_amount, transaction_count)
+            VALUES (COALESCE({row}.user_id, ''), {expr}, {row}.type, COALESCE({row}.category_id, 0), {row}.amount, 1)
+            ON CONFLICT (user_id, {bucket_column}, type, category_id) DO UPDATE SET
+                total_amount = total_amount + excluded.total_amount,
+                transaction_count = transaction_count + 1;"""
+
+
+def _subtract(table, bucket_column, bucket_expr, row):
+    expr = bucket_expr.replace('date', f'{row}.date')
+    key = (
+        f"user_id = COALESCE({row}.user_id, '') AND {bucket_column} = {expr} "
+        f"AND type = {row}.type AND category_id = COALESCE({row}.category_id, 0)"
+    )
+    return f"""
+            UPDATE {table}
+            SET total_amount = total_amount - {row}.amount, transaction_count = transaction_count - 1
+            WHERE {key};
+            DELETE FROM {table} WHERE {key} AND transaction_count <= 0;"""
+
+
+def upgrade(ctx):
+    statements = []
+    for table, (bucket_column, _) in ROLLUPS.items():
+        statements.append(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            user_id VARCHAR(50) NOT NULL,
+            {bucket_column} VARCHAR(10) NOT NULL,
+            type VARCHAR(10) NOT NULL,
+            category_id INTEGER NOT NULL,
+            total_amount DECIMAL(14,2) NOT NULL DEFAULT 0,
+            transaction_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, {bucket_column}, type, category_id)
+        ) WITHOUT ROWID;""")
+
+    inserts = "".join(_add(table, *spec, 'NEW') for table, spec in ROLLUPS.items())
+    deletes = "".join(_subtract(table, *spec, 'OLD') for table, spec in ROLLUPS.items())
+
+    statements.append(f"""
+        CREATE TRIGGER IF NOT EXISTS rollup_transactions_insert
+        AFTER INSERT ON transactions
+        BEGIN{inserts}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS rollup_transactions_delete
+        AFTER DELETE ON transactions
+        BEGIN{deletes}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS rollup_transactions_update
+        AFTER UPDATE OF user_id, date, type, category_id, amount ON transactions
+        BEGIN{deletes}{inserts}
+        END;""")
+
+    ctx.executescript("\n".join(statements))
+
+    if ctx.dry_run:
+        ctx.planned.append("-- 逐一用戶由 transactions 重建彙總表")
+        return
+
+    # 觸發器建立後逐一用戶重建，每個用戶在獨立交易中完成，期間的新寫入也會正確計入
+    users = [row[0] for row in ctx.conn.execute("SELECT DISTINCT COALESCE(user_id, '') FROM transactions")]
+    for user_id in users:
+        rebuild(ctx.conn, user_id)
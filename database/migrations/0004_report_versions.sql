@@ -0,0 +1,64 @@
+-- 報表快取版本號
+--
+-- 每位用戶一筆版本號，交易新增、修改、刪除，分類新增、刪除、改名，以及帳戶名稱變動時遞增。
+-- 所有用戶共用的預設分類（user_id IS NULL）變動時遞增 user_id = '*' 這一筆，
+-- 讀取時用戶版本號加上這一筆，等同遞增每位用戶的版本號。
+-- 觸發器在寫入者的交易中執行，提交後所有進程都能讀到新版本號。
+CREATE TABLE IF NOT EXISTS report_versions (
+    user_id VARCHAR(50) PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS report_version_transactions_insert
+AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO report_versions (user_id, version) VALUES (COALESCE(NEW.user_id, ''), 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS report_version_transactions_delete
+AFTER DELETE ON transactions
+BEGIN
+    INSERT INTO report_versions (user_id, version) VALUES (COALESCE(OLD.user_id, ''), 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS report_version_transactions_update
+AFTER UPDATE OF user_id, account_id, category_id, type, amount, description, date ON transactions
+BEGIN
+    INSERT INTO report_versions (user_id, version) VALUES (COALESCE(OLD.user_id, ''), 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+    INSERT INTO report_versions (user_id, version) VALUES (COALESCE(NEW.user_id, ''), 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS report_version_categories_insert
+AFTER INSERT ON categories
+BEGIN
+    INSERT INTO report_versions (user_id, version) VALUES (COALESCE(NEW.user_id, '*'), 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS report_version_categories_delete
+AFTER DELETE ON categories
+BEGIN
+    INSERT INTO report_versions (user_id, version) VALUES (COALESCE(OLD.user_id, '*'), 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS report_version_categories_update
+AFTER UPDATE OF user_id, name, icon ON categories
+BEGIN
+    INSERT INTO report_versions (user_id, version) VALUES (COALESCE(OLD.user_id, '*'), 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+    INSERT INTO report_versions (user_id, version) VALUES (COALESCE(NEW.user_id, '*'), 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS report_version_accounts_update
+AFTER UPDATE OF name ON accounts
+WHEN NEW.user_id IS NOT NULL
+BEGIN
+    INSERT INTO report_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
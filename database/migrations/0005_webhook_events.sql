@@ -0,0 +1,10 @@
+-- 已處理的 webhook 事件
+--
+-- 以 LINE 的 webhookEventId 為鍵，讓重送的事件不會被處理兩次。
+-- received_at 為 Unix 秒數，超過保留期限的記錄由 EventDeduplicator 定期刪除。
+CREATE TABLE IF NOT EXISTS webhook_events (
+    event_id TEXT PRIMARY KEY,
+    received_at INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_webhook_events_received_at ON webhook_events (received_at);
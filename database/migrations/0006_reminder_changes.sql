@@ -0,0 +1,29 @@
+-- 提醒變動記錄
+--
+-- 提醒新增、刪除，或時間、提前分鐘數、完成狀態、內容變動時，由觸發器寫入一筆（change_id, reminder_id）。
+-- ReminderScheduler 定期讀取新的記錄，只重新讀取變動過的提醒並更新記憶體中的排程，
+-- window 之外的提醒查詢不到任何資料，不影響排程。已套用的記錄由排程器刪除。
+-- AUTOINCREMENT 保證 change_id 不會重複使用，記錄被刪除後仍只會遞增。
+CREATE TABLE IF NOT EXISTS reminder_changes (
+    change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    reminder_id INTEGER NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS reminder_changes_insert
+AFTER INSERT ON reminders
+BEGIN
+    INSERT INTO reminder_changes (reminder_id) VALUES (NEW.reminder_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS reminder_changes_delete
+AFTER DELETE ON reminders
+BEGIN
+    INSERT INTO reminder_changes (reminder_id) VALUES (OLD.reminder_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS reminder_changes_update
+AFTER UPDATE OF user_id, title, description, due_date, remind_before, is_completed,
+                content, datetime, notify_before, status ON reminders
+BEGIN
+    INSERT INTO reminder_changes (reminder_id) VALUES (NEW.reminder_id);
+END;
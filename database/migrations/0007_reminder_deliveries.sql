@@ -0,0 +1,51 @@
+-- 提醒發送狀態
+--
+-- 每個提醒的每一次觸發（reminder_id, fire_at）一筆，fire_at 為 due_date - remind_before。
+-- status：
+--   scheduled     已排入排程器，尚未發送
+--   sending       已被某個排程器進程認領（claimed_by），正在發送
+--   sent          已推送給用戶
+--   acknowledged  用戶已將提醒標記為完成
+--   failed        發送失敗；attempts 未達上限時排程器在 next_attempt_at（Unix 秒數）之後重試
+-- 排程器以單一 UPSERT 認領，只有 scheduled、可重試的 failed 或認領逾時的 sending 能被認領，
+-- 多個進程同時處理同一個提醒時只有一個會成功。
+CREATE TABLE IF NOT EXISTS reminder_deliveries (
+    reminder_id INTEGER NOT NULL,
+    fire_at TEXT NOT NULL,
+    user_id VARCHAR(50),
+    status VARCHAR(20) NOT NULL DEFAULT 'scheduled'
+        CHECK (status IN ('scheduled', 'sending', 'sent', 'acknowledged', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    claimed_by TEXT,
+    claimed_at INTEGER,
+    sent_at INTEGER,
+    next_attempt_at INTEGER,
+    updated_at INTEGER,
+    PRIMARY KEY (reminder_id, fire_at)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_reminder_deliveries_status ON reminder_deliveries (status, fire_at);
+
+-- 用戶完成提醒時，已發送的通知視為已確認，尚未發送的不再發送
+CREATE TRIGGER IF NOT EXISTS reminder_deliveries_acknowledge
+AFTER UPDATE OF is_completed ON reminders
+WHEN NEW.is_completed = 1 AND OLD.is_completed = 0
+BEGIN
+    UPDATE reminder_deliveries SET status = 'acknowledged', updated_at = CAST(strftime('%s', 'now') AS INTEGER)
+    WHERE reminder_id = NEW.reminder_id AND status = 'sent';
+    DELETE FROM reminder_deliveries WHERE reminder_id = NEW.reminder_id AND status = 'scheduled';
+END;
+
+-- 提醒時間改變後，舊觸發時間的排程記錄不再有效
+CREATE TRIGGER IF NOT EXISTS reminder_deliveries_reschedule
+AFTER UPDATE OF due_date, remind_before ON reminders
+BEGIN
+    DELETE FROM reminder_deliveries WHERE reminder_id = NEW.reminder_id AND status = 'scheduled';
+END;
+
+CREATE TRIGGER IF NOT EXISTS reminder_deliveries_cleanup
+AFTER DELETE ON reminders
+BEGIN
+    DELETE FROM reminder_deliveries WHERE reminder_id = OLD.reminder_id;
+END;
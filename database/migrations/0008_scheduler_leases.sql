@@ -0,0 +1,11 @@
+-- 排程器租約（領導者選舉）
+--
+-- 每個名稱一筆，holder 為目前持有租約的進程，expires_at 為到期時間（Unix 秒數）。
+-- 持有者定期續約；租約過期後其他進程才能取得，term 在每次換手時遞增。
+CREATE TABLE IF NOT EXISTS scheduler_leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    heartbeat_at REAL NOT NULL,
+    term INTEGER NOT NULL DEFAULT 1
+) WITHOUT ROWID;
@@ -0,0 +1,14 @@
+-- 排程器查詢即將觸發的提醒
+--
+-- 查詢所有用戶中 datetime(due_date) 介於兩個時間之間、尚未完成的提醒，依 (datetime(due_date), reminder_id)
+-- 分批讀取。due_date 同時存在 'YYYY-MM-DDTHH:MM:SS' 與 'YYYY-MM-DD HH:MM:SS' 兩種格式，
+-- 直接比較字串會出錯，因此以 datetime(due_date) 建立運算式索引（查詢須使用相同的運算式）。
+-- 已完成的提醒不會再觸發，只索引未完成的提醒。
+CREATE INDEX IF NOT EXISTS idx_reminders_pending_due
+    ON reminders(datetime(due_date))
+    WHERE is_completed = 0;
+
+-- 未完成提醒中最大的提前分鐘數，決定查詢範圍要往後延伸多少（MAX 只讀取索引的最後一筆）
+CREATE INDEX IF NOT EXISTS idx_reminders_pending_remind_before
+    ON reminders(remind_before)
+    WHERE is_completed = 0;
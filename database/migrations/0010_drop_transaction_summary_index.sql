@@ -0,0 +1,7 @@
+-- 移除不再使用的交易索引
+--
+-- idx_transactions_user_date_type_amount（0001）原本讓每日／月度摘要以覆蓋索引掃描交易，
+-- 摘要改由 0003 的彙總表提供後已沒有查詢使用它：列表查詢使用 idx_transactions_user_date，
+-- 分類篩選與彙總表重建使用 idx_transactions_user_type_date_category。
+-- 移除後每次新增、修改、刪除交易少維護一個索引。
+DROP INDEX IF EXISTS idx_transactions_user_date_type_amount;
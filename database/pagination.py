@@ -0,0 +1,49 @@
+"""
+Keyset 分頁游標
+
+交易列表依 (date, transaction_id) 由新到舊排序，下一頁從上一頁最後一筆之後開始讀取，
+每頁成本固定，不隨頁數增加。游標以 base64 編碼，對前端而言是不透明字串。
+"""
+import json
+import base64
+import binascii
+
+
+class InvalidCursorError(ValueError):
+    """游標格式錯誤或與查詢條件不符"""
+
+
+def encode_cursor(last_date, last_id, filters=None):
+    """將最後一筆的排序鍵編碼為游標
+
+    Args:
+        last_date: 最後一筆的交易日期
+        last_id: 最後一筆的交易 ID
+        filters: 查詢條件，游標只能用於相同條件的查詢
+    """
+    payload = {"d": last_date, "i": last_id}
+    if filters:
+        payload["f"] = _fingerprint(filters)
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, filters=None):
+    """解碼游標，返回 (date, transaction_id)"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        last_date, last_id = payload["d"], int(payload["i"])
+    except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError(f"無效的分頁游標: {token}") from e
+
+    if filters and payload.get("f") != _fingerprint(filters):
+        raise InvalidCursorError("分頁游標與查詢條件不符")
+
+    return last_date, last_id
+
+
+def _fingerprint(filters):
+    # 只需區分不同條件，不需加密強度
+    items = sorted((key, str(value)) for key, value in filters.items() if value is not None)
+    return format(binascii.crc32(json.dumps(items).encode('utf-8')), '08x')
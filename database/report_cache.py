@@ -0,0 +1,174 @@
+"""
+報表結果快取
+
+以 (用戶, 報表種類, 參數) 為鍵的行程內 LRU 快取，限制筆數與估計記憶體用量，並有存活時間。
+
+失效依據 report_versions 資料表中每位用戶的版本號：
+transactions、categories、accounts 的觸發器在寫入者的交易中遞增版本號
+（共用預設分類的變動遞增所有用戶共用的一筆），
+快取項目記錄計算時的版本號，讀取時版本不同即視為失效。
+版本號存在 SQLite 中，因此 web 與 cron 兩個進程的寫入都能讓對方的快取失效。
+"""
+import os
+import sys
+import time
+import logging
+import threading
+import functools
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def _estimate_size(value):
+    """粗略估計報表結果佔用的記憶體（位元組）"""
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_estimate_size(k) + _estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+def _copy(value):
+    """返回可讓呼叫端修改而不影響快取內容的副本"""
+    if isinstance(value, list):
+        return [dict(row) if isinstance(row, dict) else row for row in value]
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+class ReportCache:
+    """執行緒安全的 LRU/TTL 報表快取"""
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, max_entries=256, max_bytes=8 * 1024 * 1024, ttl=300.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0
+        }
+
+    @classmethod
+    def for_path(cls, db_path, **kwargs):
+        """返回指定資料庫共用的快取，同一進程內所有 DatabaseUtils 實例共用"""
+        key = os.path.abspath(db_path)
+        with cls._instances_lock:
+            cache = cls._instances.get(key)
+            if cache is None:
+                cache = cls(**kwargs)
+                cls._instances[key] = cache
+            return cache
+
+    @classmethod
+    def clear_all(cls):
+        """清空所有快取（測試使用）"""
+        with cls._instances_lock:
+            for cache in cls._instances.values():
+                cache.clear()
+            cls._instances.clear()
+
+    def get(self, key, version):
+        """取得快取結果，版本不符或過期時返回 (False, None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return False, None
+
+            value, entry_version, expires_at, size = entry
+            if entry_version != version:
+                self._remove(key)
+                self.stats["invalidations"] += 1
+                self.stats["misses"] += 1
+                return False, None
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return True, _copy(value)
+
+    def put(self, key, version, value):
+        """儲存結果，超過筆數或記憶體上限時淘汰最久未使用的項目"""
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (_copy(value), version, time.monotonic() + self.ttl, size)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats["evictions"] += 1
+
+    def invalidate_user(self, user_id):
+        """移除指定用戶的所有快取項目"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == user_id]:
+                self._remove(key)
+                self.stats["invalidations"] += 1
+
+    def clear(self):
+        """清空快取"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def status(self):
+        """返回快取目前狀態與計數器"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                **self.stats
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[3]
+
+
+def cached_report(kind):
+    """DatabaseUtils 報表方法的快取裝飾器，方法的第一個參數必須是 user_id"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, user_id, *args, **kwargs):
+            cache = self.report_cache
+            if cache is None:
+                return method(self, user_id, *args, **kwargs)
+
+            # 先讀版本再計算：計算期間若有寫入，下次讀取時版本不同即會失效
+            version = self.get_report_version(user_id)
+            if version is None:
+                return method(self, user_id, *args, **kwargs)
+
+            key = (user_id, kind, args, tuple(sorted(kwargs.items())))
+            found, value = cache.get(key, version)
+            if found:
+                return value
+
+            value = method(self, user_id, *args, **kwargs)
+            cache.put(key, version, value)
+            return value
+        return wrapper
+    return decorator
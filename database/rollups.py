@@ -0,0 +1,146 @@
+"""
+交易彙總表（rollup）
+
+transaction_daily_rollups 與 transaction_monthly_rollups 依 用戶／日或月／類型／分類
+記錄金額總和與筆數，由 transactions 上的觸發器在同一個交易內增量維護，
+報表查詢只需讀取彙總表，成本與桶數成正比，而非交易筆數。
+
+沒有分類的交易以 category_id = 0、沒有用戶的交易以 user_id = '' 記錄。
+
+命令列用法：
+    python -m database.rollups [--db 路徑] [--check | --rebuild] [--user 用戶ID]
+"""
+import os
+import sys
+import logging
+import argparse
+
+from .connection import connect
+from .profiles import resolve_profile
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 彙總表名稱與分桶方式
+ROLLUPS = {
+    "transaction_daily_rollups": ("day", "date"),
+    "transaction_monthly_rollups": ("month", "substr(date, 1, 7)")
+}
+
+# 金額為浮點數，比對時允許的誤差
+TOLERANCE = 0.005
+
+
+def _aggregate_query(table, user_id=None):
+    bucket_column, bucket_expr = ROLLUPS[table]
+    if user_id is None:
+        where = ""
+    elif user_id == '':
+        where = "WHERE COALESCE(user_id, '') = ?"
+    else:
+        where = "WHERE user_id = ?"
+    return f"""
+        SELECT COALESCE(user_id, '') AS user_id, {bucket_expr} AS {bucket_column}, type, COALESCE(category_id, 0) AS category_id,
+               SUM(amount) AS total_amount, COUNT(*) AS transaction_count
+        FROM transactions
+        {where}
+        GROUP BY COALESCE(user_id, ''), {bucket_column}, type, COALESCE(category_id, 0)
+    """
+
+
+def rebuild(conn, user_id=None):
+    """由原始交易重新計算彙總表
+
+    指定 user_id 時只重建該用戶，整個重建在單一交易中完成，期間寫入者會等待。
+
+    Returns:
+        int: 重建後的日彙總桶數
+    """
+    params = (user_id,) if user_id is not None else ()
+    where = "WHERE user_id = ?" if user_id is not None else ""
+
+    in_transaction = conn.in_transaction
+    if not in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    try:
+        for table in ROLLUPS:
+            conn.execute(f"DELETE FROM {table} {where}", params)
+            conn.execute(f"INSERT INTO {table} {_aggregate_query(table, user_id)}", params)
+        if not in_transaction:
+            conn.execute("COMMIT")
+    except Exception:
+        if not in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+
+    return conn.execute(f"SELECT COUNT(*) FROM transaction_daily_rollups {where}", params).fetchone()[0]
+
+
+def check(conn, user_id=None):
+    """比對彙總表與原始交易
+
+    Returns:
+        list: 不一致的桶，每筆包含 table、key、expected、actual
+    """
+    params = (user_id,) if user_id is not None else ()
+    where = "WHERE user_id = ?" if user_id is not None else ""
+    mismatches = []
+
+    for table, (bucket_column, _) in ROLLUPS.items():
+        expected = {
+            (row[0], row[1], row[2], row[3]): (row[4], row[5])
+            for row in conn.execute(_aggregate_query(table, user_id), params)
+        }
+        actual = {
+            (row[0], row[1], row[2], row[3]): (row[4], row[5])
+            for row in conn.execute(
+                f"""
+                SELECT user_id, {bucket_column}, type, category_id, total_amount, transaction_count
+                FROM {table} {where}
+                """,
+                params
+            )
+        }
+
+        for key in expected.keys() | actual.keys():
+            exp = expected.get(key, (0, 0))
+            act = actual.get(key, (0, 0))
+            if exp[1] != act[1] or abs((exp[0] or 0) - (act[0] or 0)) > TOLERANCE:
+                mismatches.append({"table": table, "key": key, "expected": exp, "actual": act})
+
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='檢查或重建交易彙總表')
+    parser.add_argument('--db', default=os.getenv('DATABASE_PATH', 'database/linebot.db'), help='資料庫檔案路徑')
+    parser.add_argument('--user', help='只處理指定用戶')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--check', action='store_true', help='比對彙總表與原始交易（預設）')
+    group.add_argument('--rebuild', action='store_true', help='重新計算彙總表')
+    args = parser.parse_args(argv)
+
+    _, pragmas = resolve_profile()
+    conn = connect(args.db, pragmas)
+    conn.isolation_level = None
+    try:
+        if args.rebuild:
+            buckets = rebuild(conn, args.user)
+            print(f"彙總表已重建，共 {buckets} 個日彙總桶")
+            return 0
+
+        mismatches = check(conn, args.user)
+        for mismatch in mismatches:
+            print(f"{mismatch['table']} {mismatch['key']}: 應為 {mismatch['expected']}，實際為 {mismatch['actual']}")
+        print("彙總表一致" if not mismatches else f"發現 {len(mismatches)} 個不一致的桶")
+        return 1 if mismatches else 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
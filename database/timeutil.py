@@ -0,0 +1,56 @@
+"""
+提醒時間的時區處理
+
+用戶輸入的提醒時間是台灣時間，資料庫以不帶時區的本地時間字串（DB_TIME_FORMAT）保存。
+伺服器（fly.io）的系統時區是 UTC，因此比較到期時間時不能使用 datetime.now() 或
+SQLite 的 datetime('now')，而是以 local_now() 取得 APP_TIMEZONE 的現在時間。
+"""
+import os
+from datetime import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+# 資料庫中時間字串的格式（與 SQLite datetime() 的輸出相同）
+DB_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+DEFAULT_TIMEZONE = 'Asia/Taipei'
+
+
+@lru_cache(maxsize=None)
+def _zone(name):
+    return ZoneInfo(name)
+
+
+def app_timezone():
+    """提醒時間使用的時區，可用環境變數 APP_TIMEZONE 設定"""
+    return _zone(os.environ.get('APP_TIMEZONE', DEFAULT_TIMEZONE))
+
+
+def local_now():
+    """APP_TIMEZONE 的現在時間（不帶時區）"""
+    return datetime.now(app_timezone()).replace(tzinfo=None)
+
+
+def to_local(value):
+    """把時間字串或 datetime 轉為 APP_TIMEZONE 的本地時間（不帶時區）
+
+    帶時區的時間（例如網頁端送來的 '2024-03-10T09:00:00+00:00'）換算到 APP_TIMEZONE，
+    不帶時區的時間視為已是本地時間。
+    """
+    if isinstance(value, str):
+        text = value.strip()
+        if text.endswith('Z'):
+            text = text[:-1] + '+00:00'
+        value = datetime.fromisoformat(text)
+    if value.tzinfo is not None:
+        value = value.astimezone(app_timezone()).replace(tzinfo=None)
+    return value
+
+
+def from_timestamp(timestamp):
+    """把 Unix 秒數轉為 APP_TIMEZONE 的本地時間（不帶時區）"""
+    return datetime.fromtimestamp(timestamp, app_timezone()).replace(tzinfo=None)
+
+
+def format_db_time(value):
+    """轉為資料庫保存的本地時間字串"""
+    return to_local(value).strftime(DB_TIME_FORMAT)
@@ -0,0 +1,3 @@
+# 初始化 events 包
+from .dispatcher import EventDispatcher, ReplyFallbackApi
+from .dedup import EventDeduplicator
@@ -0,0 +1,120 @@
+"""
+Webhook 事件去重
+
+LINE 在 webhook 回應過慢或失敗時會重送事件（deliveryContext.isRedelivery 為 true），
+同一個 webhookEventId 若被處理兩次，就會重複記帳並重複調整帳戶餘額。
+
+檢查分兩層：
+- 記憶體環狀緩衝：最近收到的事件 ID，集合查詢與淘汰皆為 O(1)
+- SQLite webhook_events 資料表：以主鍵 INSERT OR IGNORE 記錄事件，
+  進程重啟或多台機器之間也能辨識重送，超過保留期限的記錄定期刪除
+
+事件在交給處理函數之前就被認領，處理失敗的事件不會因重送而再處理一次
+（寧可少處理一次，也不重複記帳）。
+"""
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+def event_identity(event):
+    """返回 (webhookEventId, isRedelivery)，事件沒有 ID 時為 (None, False)"""
+    event_id = getattr(event, "webhook_event_id", None)
+    delivery_context = getattr(event, "delivery_context", None)
+    return event_id, bool(getattr(delivery_context, "is_redelivery", False))
+
+
+class EventDeduplicator:
+    """以 webhookEventId 判斷事件是否已處理過"""
+
+    def __init__(self, db, ttl=86400, capacity=10000, prune_interval=600):
+        """
+        Args:
+            db: DatabaseUtils 實例，None 時只使用記憶體
+            ttl: SQLite 中保留事件記錄的秒數
+            capacity: 記憶體中保留的最近事件數
+            prune_interval: 刪除過期記錄的間隔秒數
+        """
+        self.db = db
+        self.ttl = ttl
+        self.capacity = max(1, int(capacity))
+        self.prune_interval = prune_interval
+        self._recent = deque()
+        self._recent_ids = set()
+        self._next_prune = time.monotonic() + prune_interval
+        self._lock = threading.Lock()
+        self.stats = {
+            "accepted": 0,
+            "duplicates": 0,
+            "redeliveries": 0,
+            "memory_hits": 0,
+            "store_hits": 0,
+            "pruned": 0
+        }
+
+    def claim(self, event):
+        """認領事件，返回 True 表示應處理；重複的事件返回 False"""
+        event_id, is_redelivery = event_identity(event)
+        if not event_id:
+            return True
+
+        with self._lock:
+            if is_redelivery:
+                self.stats["redeliveries"] += 1
+            if event_id in self._recent_ids:
+                self.stats["memory_hits"] += 1
+                self.stats["duplicates"] += 1
+                return False
+            self._remember(event_id)
+
+        if self.db is not None and not self._claim_in_store(event_id):
+            with self._lock:
+                self.stats["store_hits"] += 1
+                self.stats["duplicates"] += 1
+            logger.info(f"略過已處理的 webhook 事件: {event_id}（重送: {is_redelivery}）")
+            return False
+
+        with self._lock:
+            self.stats["accepted"] += 1
+        self._maybe_prune()
+        return True
+
+    def status(self):
+        """返回去重計數"""
+        with self._lock:
+            return {"recent": len(self._recent), "capacity": self.capacity, **self.stats}
+
+    def _remember(self, event_id):
+        # 呼叫端須持有 self._lock
+        self._recent.append(event_id)
+        self._recent_ids.add(event_id)
+        if len(self._recent) > self.capacity:
+            self._recent_ids.discard(self._recent.popleft())
+
+    def _claim_in_store(self, event_id):
+        try:
+            return self.db.claim_webhook_event(event_id, time.time())
+        except Exception as e:
+            # 資料庫無法使用時仍處理事件，僅依賴記憶體去重
+            logger.error(f"記錄 webhook 事件失敗: {str(e)}")
+            return True
+
+    def _maybe_prune(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.db is None or now < self._next_prune:
+                return
+            self._next_prune = now + self.prune_interval
+
+        try:
+            removed = self.db.prune_webhook_events(time.time() - self.ttl)
+        except Exception as e:
+            logger.error(f"清除過期 webhook 事件記錄失敗: {str(e)}")
+            return
+        with self._lock:
+            self.stats["pruned"] += removed
+        if removed:
+            logger.info(f"已清除 {removed} 筆過期的 webhook 事件記錄")
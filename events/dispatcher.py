@@ -0,0 +1,339 @@
+"""
+Webhook 事件非同步派送
+
+webhook 路由只驗證簽名並把事件放入有界佇列，立即回應 200；
+實際的解析、資料庫操作與 LINE API 呼叫由背景工作執行緒處理，
+避免 LINE 或資料庫變慢時請求被卡住而觸發 LINE 重送。
+事件依來源（聊天室 + 用戶）分區：同一分區保持順序，不同分區並行處理。
+
+回覆令牌有使用期限，事件在佇列中等待過久時，
+ReplyFallbackApi 會把回覆改為推播訊息送到原本的聊天室。
+"""
+import time
+import signal
+import atexit
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# 工作執行緒目前處理中的事件（供 ReplyFallbackApi 判斷回覆令牌是否過期）
+_local = threading.local()
+
+
+def current_event():
+    """返回目前執行緒正在處理的事件項目，不在工作執行緒中時返回 None"""
+    return getattr(_local, "item", None)
+
+
+def push_target(event):
+    """返回事件來源聊天室的推播對象（群組、聊天室或用戶 ID）"""
+    source = getattr(event, "source", None)
+    for attr in ("group_id", "room_id", "user_id"):
+        target = getattr(source, attr, None)
+        if target:
+            return target
+    return None
+
+
+def partition_key(event):
+    """返回事件的分區鍵 (群組或聊天室 ID, 用戶 ID)，來源不明時返回 None"""
+    source = getattr(event, "source", None)
+    chat_id = getattr(source, "group_id", None) or getattr(source, "room_id", None)
+    user_id = getattr(source, "user_id", None)
+    if not chat_id and not user_id:
+        return None
+    return (chat_id or "", user_id or "")
+
+
+class QueuedEvent:
+    """佇列中的事件與其時間資訊"""
+
+    __slots__ = ("event", "enqueued_at", "event_time")
+
+    def __init__(self, event):
+        self.event = event
+        self.enqueued_at = time.monotonic()
+        # LINE 事件的 timestamp 為毫秒，缺少時以入列時間計算
+        timestamp = getattr(event, "timestamp", None)
+        self.event_time = timestamp / 1000.0 if timestamp else time.time()
+
+    @property
+    def reply_token(self):
+        return getattr(self.event, "reply_token", None)
+
+    def age(self):
+        """事件發生至今的秒數"""
+        return time.time() - self.event_time
+
+
+class EventDispatcher:
+    """
+    依來源分區、有界容量、固定數量工作執行緒的事件派送器
+
+    - 同一分區（同一聊天室中的同一用戶）的事件依收到順序逐一處理
+    - 不同分區由不同工作執行緒同時處理，一位用戶的慢速 AI 解析或 LINE API 呼叫
+      不會擋住同一批次中的其他用戶
+    - 工作執行緒每處理完一個事件就把分區排到就緒佇列尾端，各分區輪流取得執行緒
+    - 等待中的事件達到 queue_size 時 submit 等待 enqueue_timeout 秒，仍無空位則拒絕並計入 rejected
+    - shutdown 停止接收新事件，在期限內處理完剩餘的事件
+    """
+
+    def __init__(self, process, workers=4, queue_size=1000, enqueue_timeout=0.5, reply_ttl=50.0, name="webhook"):
+        """
+        Args:
+            process: 處理單一事件的函數
+            workers: 工作執行緒數量
+            queue_size: 等待中事件的容量
+            enqueue_timeout: 容量已滿時最多等待的秒數
+            reply_ttl: 回覆令牌視為有效的秒數，超過後改用推播
+            name: 執行緒名稱前綴
+        """
+        self.process = process
+        self.workers = max(1, int(workers))
+        self.queue_size = max(1, int(queue_size))
+        self.enqueue_timeout = enqueue_timeout
+        self.reply_ttl = reply_ttl
+        self.name = name
+        # 分區鍵 -> 等待中的事件；鍵存在時分區不是在就緒佇列中，就是正由某個執行緒處理
+        self._partitions = {}
+        self._ready = deque()
+        self._active = set()
+        self._queued = 0
+        self._threads = []
+        self._accepting = False
+        self._stopping = False
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self.stats = {
+            "submitted": 0,
+            "processed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "push_fallbacks": 0,
+            "max_depth": 0,
+            "max_partitions": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0
+        }
+
+    def start(self):
+        """啟動工作執行緒"""
+        with self._lock:
+            if self._accepting:
+                return self
+            self._accepting = True
+            self._stopping = False
+            self._threads = [
+                threading.Thread(target=self._run, name=f"{self.name}-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"事件派送器已啟動: {self.workers} 個工作執行緒，佇列容量 {self.queue_size}")
+        return self
+
+    def submit(self, event):
+        """將事件放入所屬分區，成功返回 True；已停止或容量已滿時返回 False"""
+        item = QueuedEvent(event)
+        key = partition_key(event) or item
+        with self._cond:
+            if self._accepting:
+                self._cond.wait_for(
+                    lambda: self._queued < self.queue_size or not self._accepting, self.enqueue_timeout
+                )
+            if not self._accepting or self._queued >= self.queue_size:
+                self.stats["rejected"] += 1
+                full = self._accepting
+            else:
+                pending = self._partitions.get(key)
+                if pending is None:
+                    pending = self._partitions[key] = deque()
+                    self._ready.append(key)
+                pending.append(item)
+                self._queued += 1
+                self.stats["submitted"] += 1
+                self.stats["max_depth"] = max(self.stats["max_depth"], self._queued)
+                self.stats["max_partitions"] = max(self.stats["max_partitions"], len(self._partitions))
+                self._cond.notify_all()
+                return True
+
+        if full:
+            logger.warning(f"事件佇列已滿（{self.queue_size}），拒絕事件")
+        return False
+
+    def is_stale(self, item):
+        """事件的回覆令牌是否已超過有效時間"""
+        return item.age() > self.reply_ttl
+
+    def shutdown(self, timeout=4.0):
+        """停止接收事件並等待剩餘事件處理完畢，返回未處理完的事件數"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if not self._accepting:
+                return self._unfinished()
+            self._accepting = False
+            # 喚醒等待容量的 submit，讓它們立即返回
+            self._cond.notify_all()
+
+            logger.info(f"事件派送器停止中，等待 {self._unfinished()} 個事件處理完畢...")
+            self._cond.wait_for(lambda: self._unfinished() == 0, timeout)
+            remaining = self._unfinished()
+            self._stopping = True
+            self._cond.notify_all()
+
+        if remaining:
+            logger.warning(f"事件派送器停止時仍有 {remaining} 個事件未處理")
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        return remaining
+
+    def install_signal_handlers(self, timeout=4.0, signals=(signal.SIGINT, signal.SIGTERM)):
+        """收到停止訊號時先排空佇列，再交給原本的訊號處理函數
+
+        只能在主執行緒呼叫。fly.toml 以 SIGINT 停止機器，kill_timeout 為 5 秒。
+        """
+        for signum in signals:
+            previous = signal.getsignal(signum)
+
+            def handler(received, frame, previous=previous):
+                logger.info(f"收到訊號 {received}，排空事件佇列")
+                self.shutdown(timeout)
+                if callable(previous):
+                    previous(received, frame)
+                elif previous == signal.SIG_DFL:
+                    signal.signal(received, signal.SIG_DFL)
+                    signal.raise_signal(received)
+
+            signal.signal(signum, handler)
+        atexit.register(self.shutdown, timeout)
+
+    def status(self):
+        """返回佇列深度與處理計數（背壓指標）"""
+        with self._lock:
+            stats = dict(self.stats)
+            depth = self._queued
+            in_flight = len(self._active)
+            partitions = len(self._partitions)
+        finished = stats["processed"] + stats["failed"]
+        stats["avg_wait_ms"] = round(stats.pop("total_wait_ms") / finished, 2) if finished else 0.0
+        stats["max_wait_ms"] = round(stats["max_wait_ms"], 2)
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "depth": depth,
+            "in_flight": in_flight,
+            "partitions": partitions,
+            "accepting": self._accepting,
+            **stats
+        }
+
+    def record_push_fallback(self):
+        """記錄一次以推播取代過期回覆"""
+        with self._lock:
+            self.stats["push_fallbacks"] += 1
+
+    def _unfinished(self):
+        # 呼叫端須持有 self._lock
+        return self._queued + len(self._active)
+
+    def _next_item(self):
+        """取出下一個就緒分區的第一個事件，停止時返回 (None, None)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._ready or self._stopping)
+            if not self._ready:
+                return None, None
+            key = self._ready.popleft()
+            item = self._partitions[key].popleft()
+            self._active.add(key)
+            self._queued -= 1
+            # 釋出容量給等待中的 submit
+            self._cond.notify_all()
+            return key, item
+
+    def _run(self):
+        while True:
+            key, item = self._next_item()
+            if item is None:
+                return
+
+            wait_ms = (time.monotonic() - item.enqueued_at) * 1000
+            _local.item = item
+            try:
+                self.process(item.event)
+                outcome = "processed"
+            except Exception as e:
+                logger.error(f"處理事件時發生錯誤: {str(e)}", exc_info=True)
+                outcome = "failed"
+            finally:
+                _local.item = None
+
+            with self._cond:
+                self.stats[outcome] += 1
+                self.stats["total_wait_ms"] += wait_ms
+                if wait_ms > self.stats["max_wait_ms"]:
+                    self.stats["max_wait_ms"] = wait_ms
+
+                self._active.discard(key)
+                if self._partitions[key]:
+                    self._ready.append(key)
+                else:
+                    del self._partitions[key]
+                self._cond.notify_all()
+
+
+class ReplyFallbackApi:
+    """
+    包裝 MessagingApi：處理中事件的回覆令牌已過期時，將回覆改為推播
+
+    其餘方法直接轉交原本的 API 物件。
+    """
+
+    def __init__(self, api, dispatcher, build_push_request):
+        """
+        Args:
+            api: LINE MessagingApi
+            dispatcher: 判斷令牌是否過期的 EventDispatcher
+            build_push_request: 以 (推播對象, 訊息列表) 建立推播請求的函數
+        """
+        self._api = api
+        self._dispatcher = dispatcher
+        self._build_push_request = build_push_request
+
+    def __getattr__(self, name):
+        return getattr(self._api, name)
+
+    def reply_message_with_http_info(self, reply_message_request, *args, **kwargs):
+        target = self._stale_target(reply_message_request.reply_token)
+        if target:
+            return self._api.push_message_with_http_info(
+                self._build_push_request(target, reply_message_request.messages)
+            )
+        return self._api.reply_message_with_http_info(reply_message_request, *args, **kwargs)
+
+    def reply_message(self, reply_message_request, *args, **kwargs):
+        # 部分舊程式以 reply_message(reply_token, message) 呼叫
+        if isinstance(reply_message_request, str):
+            reply_token = reply_message_request
+            messages = args[0] if args else kwargs.get("messages")
+        else:
+            reply_token = reply_message_request.reply_token
+            messages = reply_message_request.messages
+
+        target = self._stale_target(reply_token)
+        if target:
+            if not isinstance(messages, (list, tuple)):
+                messages = [messages]
+            return self._api.push_message(self._build_push_request(target, list(messages)))
+        return self._api.reply_message(reply_message_request, *args, **kwargs)
+
+    def _stale_target(self, reply_token):
+        item = current_event()
+        if item is None or item.reply_token != reply_token or not self._dispatcher.is_stale(item):
+            return None
+        target = push_target(item.event)
+        if target:
+            self._dispatcher.record_push_fallback()
+            logger.info(f"回覆令牌已過期（事件已 {item.age():.1f} 秒），改以推播發送給 {target}")
+        return target
@@ -2,6 +2,7 @@
 import json
 import logging
 import os
+from types import MappingProxyType
 from datetime import datetime, date, timedelta
 # 更新LINE Bot SDK導入
 from linebot.v3.messaging import (
@@ -23,50 +24,58 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 支出分類
+EXPENSE_CATEGORIES = tuple(MappingProxyType(category) for category in (
+    {"name": "飲食", "icon": "🍔"},
+    {"name": "交通", "icon": "🚗"},
+    {"name": "購物", "icon": "🛒"},
+    {"name": "娛樂", "icon": "🎬"},
+    {"name": "醫療", "icon": "💊"},
+    {"name": "教育", "icon": "📚"},
+    {"name": "居家", "icon": "🏠"},
+    {"name": "其他", "icon": "📦"}
+))
+
+# 收入分類
+INCOME_CATEGORIES = tuple(MappingProxyType(category) for category in (
+    {"name": "薪資", "icon": "💰"},
+    {"name": "獎金", "icon": "🎁"},
+    {"name": "投資", "icon": "📈"},
+    {"name": "退款", "icon": "💸"},
+    {"name": "其他", "icon": "💵"}
+))
+
+# 顏色
+COLORS = MappingProxyType({
+    "primary": "#4F86C6",
+    "secondary": "#7FC4FD",
+    "success": "#4CAF50",
+    "danger": "#F44336",
+    "warning": "#FF9800",
+    "info": "#2196F3",
+    "light": "#F5F5F5",
+    "dark": "#333333",
+    "expense": "#F44336",
+    "income": "#4CAF50"
+})
+
 class MessageHandler:
-    """LINE 訊息處理器，負責處理用戶的訊息並協調各種功能"""
+    """LINE 訊息處理器，負責處理用戶的訊息並協調各種功能
+    
+    處理器不保存單一訊息的狀態，webhook 在啟動時建立一個實例供所有工作執行緒共用。
+    """
     
     def __init__(self, line_bot_api=None, db=None):
         """初始化處理器"""
         self.line_bot_api = line_bot_api
         self.db = db if db else DatabaseUtils()
-        self.text_parser = TextParser()
+        self.text_parser = TextParser.shared()
         self.is_development = os.environ.get('FLASK_ENV') == 'development'
         
-        # 定義支出分類
-        self.expense_categories = [
-            {"name": "飲食", "icon": "🍔"},
-            {"name": "交通", "icon": "🚗"},
-            {"name": "購物", "icon": "🛒"},
-            {"name": "娛樂", "icon": "🎬"},
-            {"name": "醫療", "icon": "💊"},
-            {"name": "教育", "icon": "📚"},
-            {"name": "居家", "icon": "🏠"},
-            {"name": "其他", "icon": "📦"}
-        ]
-        
-        # 定義收入分類
-        self.income_categories = [
-            {"name": "薪資", "icon": "💰"},
-            {"name": "獎金", "icon": "🎁"},
-            {"name": "投資", "icon": "📈"},
-            {"name": "退款", "icon": "💸"},
-            {"name": "其他", "icon": "💵"}
-        ]
-        
-        # 定義顏色
-        self.colors = {
-            "primary": "#4F86C6",
-            "secondary": "#7FC4FD",
-            "success": "#4CAF50",
-            "danger": "#F44336",
-            "warning": "#FF9800",
-            "info": "#2196F3",
-            "light": "#F5F5F5",
-            "dark": "#333333",
-            "expense": "#F44336",
-            "income": "#4CAF50"
-        }
+        # 分類與顏色為共用的唯讀常數，不在每個實例中重建
+        self.expense_categories = EXPENSE_CATEGORIES
+        self.income_categories = INCOME_CATEGORIES
+        self.colors = COLORS
     
     def handle_message(self, event):
         """處理用戶發送的訊息"""
@@ -149,22 +158,65 @@ class MessageHandler:
         account = data.get("account")
         trans_date = data.get("date", date.today().isoformat())
         
-        # 確保用戶存在於資料庫
-        user = self.db.get_user(user_id)
-        if not user:
-            logger.warning(f"用戶 {user_id} 不存在於資料庫中")
-            # 這裡不處理用戶創建，假設 webhook.py 已經處理了
-        
-        # 如果沒有指定帳戶和分類，顯示帳戶選擇界面
-        if not account and not category:
-            # 獲取用戶的所有帳戶
-            accounts = self.db.get_accounts(user_id)
+        # 所有資料庫操作在同一個工作單元中完成，只提交一次；回覆訊息在提交後才送出
+        # 一開始就取得寫入鎖，避免查詢帳戶與分類後寫入前被其他連接搶先寫入而出現鎖升級失敗
+        with self.db.session(immediate=True):
+            # 確保用戶存在於資料庫
+            user = self.db.get_user(user_id)
+            if not user:
+                logger.warning(f"用戶 {user_id} 不存在於資料庫中")
+                # 這裡不處理用戶創建，假設 webhook.py 已經處理了
+            
+            # 如果沒有指定帳戶和分類，顯示帳戶選擇界面
+            if not account and not category:
+                # 獲取用戶的所有帳戶
+                accounts = self.db.get_accounts(user_id)
+                
+                # 如果用戶沒有帳戶，創建默認帳戶
+                if not accounts:
+                    account_id = self.db.add_account(user_id, "現金", 0, True)
+                    accounts = [{"account_id": account_id, "name": "現金", "balance": 0, "is_default": True}]
             
-            # 如果用戶沒有帳戶，創建默認帳戶
-            if not accounts:
-                account_id = self.db.add_account(user_id, "現金", 0, True)
-                accounts = [{"account_id": account_id, "name": "現金", "balance": 0, "is_default": True}]
+            # 如果已經指定了帳戶，但沒有指定分類
+            elif account and not category:
+                # 查找或創建指定的帳戶
+                account_id = self._find_or_create_account(user_id, account)
+            
+            # 如果已經指定了帳戶和分類，直接記帳
+            elif account and category:
+                # 查找或創建指定的帳戶和分類
+                account_id = self._find_or_create_account(user_id, account)
+                category_id = self._find_or_create_category(user_id, category, transaction_type)
+                
+                # 新增交易記錄
+                transaction_id = self.db.add_transaction(
+                    user_id, account_id, category_id, 
+                    transaction_type, amount, item, trans_date
+                )
             
+            # 如果只指定了分類，但沒有指定帳戶
+            else:
+                # 使用預設帳戶
+                default_account = self.db.get_default_account(user_id)
+                if default_account:
+                    account_id = default_account["account_id"]
+                    account = default_account["name"]
+                else:
+                    # 如果沒有預設帳戶，創建一個
+                    account_id = self.db.add_account(user_id, "現金", 0, True)
+                    account = "現金"
+                    logger.info(f"為用戶 {user_id} 創建預設現金帳戶")
+                
+                # 查找或創建指定的分類
+                category_id = self._find_or_create_category(user_id, category, transaction_type)
+                
+                # 新增交易記錄
+                transaction_id = self.db.add_transaction(
+                    user_id, account_id, category_id, 
+                    transaction_type, amount, item, trans_date
+                )
+        
+        if not account and not category:
             # 發送帳戶選擇界面
             account_data = {
                 "action": "select_account",
@@ -174,25 +226,8 @@ class MessageHandler:
                 "date": trans_date
             }
             self._send_account_selection(reply_token, accounts, account_data)
-            return
         
-        # 如果已經指定了帳戶，但沒有指定分類
-        if account and not category:
-            # 查找或創建指定的帳戶
-            accounts = self.db.get_accounts(user_id)
-            account_found = False
-            account_id = None
-            
-            for acc in accounts:
-                if acc["name"] == account:
-                    account_id = acc["account_id"]
-                    account_found = True
-                    break
-            
-            if not account_found:
-                account_id = self.db.add_account(user_id, account, 0, False)
-                logger.info(f"為用戶 {user_id} 創建新帳戶: {account}")
-            
+        elif account and not category:
             # 發送分類選擇界面
             if transaction_type == "expense":
                 categories = self.expense_categories
@@ -210,89 +245,32 @@ class MessageHandler:
             }
             self._send_category_selection(reply_token, categories, account_data)
         
-        # 如果已經指定了帳戶和分類，直接記帳
-        elif account and category:
-            # 查找或創建指定的帳戶
-            accounts = self.db.get_accounts(user_id)
-            account_found = False
-            account_id = None
-            
-            for acc in accounts:
-                if acc["name"] == account:
-                    account_id = acc["account_id"]
-                    account_found = True
-                    break
-            
-            if not account_found:
-                account_id = self.db.add_account(user_id, account, 0, False)
-                logger.info(f"為用戶 {user_id} 創建新帳戶: {account}")
-            
-            # 查找或創建指定的分類
-            categories = self.db.get_categories(user_id, transaction_type)
-            category_found = False
-            category_id = None
-            
-            for cat in categories:
-                if cat["name"] == category:
-                    category_id = cat["category_id"]
-                    category_found = True
-                    break
-            
-            if not category_found:
-                category_id = self.db.add_category(user_id, category, transaction_type)
-                logger.info(f"為用戶 {user_id} 創建新分類: {category} (類型: {transaction_type})")
-            
-            # 新增交易記錄
-            transaction_id = self.db.add_transaction(
-                user_id, account_id, category_id, 
-                transaction_type, amount, item, trans_date
-            )
-            
+        else:
             # 回覆確認訊息
             self._send_transaction_confirmation(
                 reply_token, transaction_type, item, amount, 
                 category, account, trans_date
             )
+    
+    def _find_or_create_account(self, user_id, account_name):
+        """查找用戶的帳戶，不存在時創建，返回帳戶ID"""
+        for acc in self.db.get_accounts(user_id):
+            if acc["name"] == account_name:
+                return acc["account_id"]
+        
+        account_id = self.db.add_account(user_id, account_name, 0, False)
+        logger.info(f"為用戶 {user_id} 創建新帳戶: {account_name}")
+        return account_id
+    
+    def _find_or_create_category(self, user_id, category_name, transaction_type):
+        """查找用戶的分類，不存在時創建，返回分類ID"""
+        for cat in self.db.get_categories(user_id, transaction_type):
+            if cat["name"] == category_name:
+                return cat["category_id"]
         
-        # 如果只指定了分類，但沒有指定帳戶
-        elif category and not account:
-            # 使用預設帳戶
-            default_account = self.db.get_default_account(user_id)
-            if default_account:
-                account_id = default_account["account_id"]
-                account = default_account["name"]
-            else:
-                # 如果沒有預設帳戶，創建一個
-                account_id = self.db.add_account(user_id, "現金", 0, True)
-                account = "現金"
-                logger.info(f"為用戶 {user_id} 創建預設現金帳戶")
-            
-            # 查找或創建指定的分類
-            categories = self.db.get_categories(user_id, transaction_type)
-            category_found = False
-            category_id = None
-            
-            for cat in categories:
-                if cat["name"] == category:
-                    category_id = cat["category_id"]
-                    category_found = True
-                    break
-            
-            if not category_found:
-                category_id = self.db.add_category(user_id, category, transaction_type)
-                logger.info(f"為用戶 {user_id} 創建新分類: {category} (類型: {transaction_type})")
-            
-            # 新增交易記錄
-            transaction_id = self.db.add_transaction(
-                user_id, account_id, category_id, 
-                transaction_type, amount, item, trans_date
-            )
-            
-            # 回覆確認訊息
-            self._send_transaction_confirmation(
-                reply_token, transaction_type, item, amount, 
-                category, account, trans_date
-            )
+        category_id = self.db.add_category(user_id, category_name, transaction_type)
+        logger.info(f"為用戶 {user_id} 創建新分類: {category_name} (類型: {transaction_type})")
+        return category_id
     
     def _handle_reminder(self, user_id, reply_token, data):
         """處理提醒操作"""
@@ -347,7 +325,7 @@ class MessageHandler:
             logger.info(f"處理查詢請求: 類型={query_type}, 時間範圍={time_range}, 時間值={time_value}, 分類={category}, 帳戶={account}")
             
             # 呼叫查詢處理方法
-            self.handle_query(reply_token, query_data)
+            self.handle_query(reply_token, query_data, user_id)
             
         except Exception as e:
             logger.error(f"處理查詢請求時出錯: {str(e)}")
@@ -365,34 +343,24 @@ class MessageHandler:
         account_id = data.get("account_id")
         trans_date = data.get("date", date.today().isoformat())
         
-        # 查找或創建分類
-        categories = self.db.get_categories(user_id, transaction_type)
-        category_found = False
-        category_id = None
-        
-        for cat in categories:
-            if cat["name"] == category_name:
-                category_id = cat["category_id"]
-                category_found = True
-                break
-        
-        if not category_found:
-            category_id = self.db.add_category(user_id, category_name, transaction_type)
-            logger.info(f"為用戶 {user_id} 創建新分類: {category_name} (類型: {transaction_type})")
-        
-        # 新增交易記錄
-        transaction_id = self.db.add_transaction(
-            user_id, account_id, category_id, 
-            transaction_type, amount, item, trans_date
-        )
-        
-        # 查找帳戶名稱
-        account = "未知帳戶"
-        accounts = self.db.get_accounts(user_id)
-        for acc in accounts:
-            if acc["account_id"] == account_id:
-                account = acc["name"]
-                break
+        # 分類查找、交易寫入與帳戶查詢在同一個工作單元中完成；先讀後寫，一開始就取得寫入鎖
+        with self.db.session(immediate=True):
+            # 查找或創建分類
+            category_id = self._find_or_create_category(user_id, category_name, transaction_type)
+            
+            # 新增交易記錄
+            transaction_id = self.db.add_transaction(
+                user_id, account_id, category_id, 
+                transaction_type, amount, item, trans_date
+            )
+            
+            # 查找帳戶名稱
+            account = "未知帳戶"
+            accounts = self.db.get_accounts(user_id)
+            for acc in accounts:
+                if acc["account_id"] == account_id:
+                    account = acc["name"]
+                    break
         
         # 使用 Flex 訊息回覆交易確認
         self._send_transaction_confirmation(
@@ -1148,6 +1116,23 @@ class MessageHandler:
         """處理完成提醒的請求"""
         reminder_id = data.get("reminder_id")
         
+        # 提醒通知的按鈕以到期時間與標題雜湊識別提醒（舊版通知帶完整標題）
+        if not reminder_id and data.get("due_date") and (data.get("title") or data.get("title_key")):
+            try:
+                matched = self.db.complete_reminder_occurrence(
+                    user_id, data.get("title"), data["due_date"], title_key=data.get("title_key")
+                )
+                if matched == 1:
+                    self._reply_text(reply_token, "✅ 提醒已標記為完成。")
+                elif matched > 1:
+                    self._reply_text(reply_token, "有多個相同的提醒，請在提醒列表中選擇要完成的提醒。")
+                else:
+                    self._reply_text(reply_token, "無法找到該提醒。")
+            except Exception as e:
+                logger.error(f"完成提醒時發生錯誤: {str(e)}")
+                self._reply_text(reply_token, "處理提醒時發生錯誤，請稍後再試。")
+            return
+        
         if not reminder_id:
             self._reply_text(reply_token, "無法找到該提醒。")
             return
@@ -1717,7 +1702,7 @@ class MessageHandler:
         # 處理查詢
         self._handle_query(user_id, reply_token, query_data)
 
-    def handle_query(self, reply_token, query_data):
+    def handle_query(self, reply_token, query_data, user_id=None):
         """處理查詢請求，回傳相應的報表或統計資訊"""
         try:
             query_type = query_data.get("query_type", "expense")
@@ -1731,12 +1716,12 @@ class MessageHandler:
             
             if query_type == "expense":
                 # 查詢支出
-                results = self._query_transactions("expense", start_date, end_date, category, account)
+                results = self._query_transactions(user_id, "expense", start_date, end_date, category, account)
                 self._send_expense_report(reply_token, results, time_range, time_value, category, account)
             
             elif query_type == "income":
                 # 查詢收入
-                results = self._query_transactions("income", start_date, end_date, category, account)
+                results = self._query_transactions(user_id, "income", start_date, end_date, category, account)
                 self._send_income_report(reply_token, results, time_range, time_value, category, account)
             
             elif query_type == "reminder":
@@ -1746,14 +1731,14 @@ class MessageHandler:
             
             elif query_type == "balance":
                 # 查詢餘額
-                expense_results = self._query_transactions("expense", start_date, end_date, category, account)
-                income_results = self._query_transactions("income", start_date, end_date, category, account)
+                expense_results = self._query_transactions(user_id, "expense", start_date, end_date, category, account)
+                income_results = self._query_transactions(user_id, "income", start_date, end_date, category, account)
                 self._send_balance_report(reply_token, expense_results, income_results, time_range, time_value, account)
             
             elif query_type == "overview":
                 # 查詢總覽
-                expense_results = self._query_transactions("expense", start_date, end_date, category, account)
-                income_results = self._query_transactions("income", start_date, end_date, category, account)
+                expense_results = self._query_transactions(user_id, "expense", start_date, end_date, category, account)
+                income_results = self._query_transactions(user_id, "income", start_date, end_date, category, account)
                 self._send_overview_report(reply_token, expense_results, income_results, time_range, time_value)
             
             else:
@@ -1873,33 +1858,15 @@ class MessageHandler:
         
         return start_date, end_date
     
-    def _query_transactions(self, transaction_type, start_date, end_date, category=None, account=None):
-        """查詢交易記錄"""
-        # 轉換日期格式
-        start_date_str = start_date.strftime("%Y-%m-%d %H:%M:%S")
-        end_date_str = end_date.strftime("%Y-%m-%d %H:%M:%S")
-        
-        # 準備查詢條件
-        conditions = [
-            f"type = '{transaction_type}'",
-            f"date BETWEEN '{start_date_str}' AND '{end_date_str}'"
-        ]
-        
-        if category:
-            conditions.append(f"category LIKE '%{category}%'")
-        
-        if account:
-            conditions.append(f"account LIKE '%{account}%'")
-        
-        # 構建 SQL 查詢
-        where_clause = " AND ".join(conditions)
-        
-        # 從資料庫查詢
-        results = self.db_utils.execute_query(
-            f"SELECT * FROM transactions WHERE {where_clause} ORDER BY date DESC"
+    def _query_transactions(self, user_id, transaction_type, start_date, end_date, category=None, account=None):
+        """查詢交易記錄（經由 DatabaseUtils 的報表快取）"""
+        # 交易日期以 YYYY-MM-DD 儲存，只比較日期部分
+        start_date_str = start_date.strftime("%Y-%m-%d")
+        end_date_str = end_date.strftime("%Y-%m-%d")
+        
+        return self.db.get_transaction_report(
+            user_id, transaction_type, start_date_str, end_date_str, category, account
         )
-        
-        return results
     
     def _query_reminders(self, start_date, end_date):
         """查詢提醒事項"""
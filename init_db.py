@@ -1,39 +1,41 @@
 import sqlite3
 import os
+import sys
 import datetime
 
+from database.migrate import migrate
+
 # 確保資料庫目錄存在
 if not os.path.exists('database'):
     os.makedirs('database')
 
 # 資料庫檔案路徑
-DB_PATH = 'database/linebot.db'
+DB_PATH = os.getenv('DATABASE_PATH', 'database/linebot.db')
 
 # 初始化資料庫
-def init_db():
+def init_db(db_path=DB_PATH, dry_run=False):
     # 檢查資料庫是否已存在
-    is_new_db = not os.path.exists(DB_PATH)
-    
-    # 連接資料庫
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    is_new_db = not os.path.exists(db_path)
     
-    # 讀取 schema.sql 檔案
-    with open('database/schema.sql', 'r') as f:
-        schema = f.read()
-    
-    # 建立資料表
-    cursor.executescript(schema)
+    # 以版本化遷移建立或升級資料表（database/migrations）
+    results = migrate(db_path, dry_run=dry_run)
+    for result in results:
+        if dry_run:
+            print(f"將套用遷移：{result['version']:04d}_{result['name']}")
+            for statement in result["planned"]:
+                print(f"    {statement}")
+        else:
+            print(f"已套用遷移：{result['version']:04d}_{result['name']}（{result['duration_ms']} ms）")
     
     # 如果是新資料庫，插入預設資料
-    if is_new_db:
-        insert_default_data(cursor)
-    
-    # 提交變更
-    conn.commit()
-    conn.close()
+    if is_new_db and not dry_run:
+        conn = sqlite3.connect(db_path)
+        insert_default_data(conn.cursor())
+        conn.commit()
+        conn.close()
     
-    print(f"資料庫初始化完成。路徑：{DB_PATH}")
+    if not dry_run:
+        print(f"資料庫初始化完成。路徑：{db_path}")
 
 # 插入預設資料
 def insert_default_data(cursor):
@@ -81,4 +83,4 @@ def insert_default_data(cursor):
 
 # 主程式
 if __name__ == "__main__":
-    init_db() 
\ No newline at end of file
+    init_db(dry_run='--dry-run' in sys.argv)
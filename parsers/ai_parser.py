@@ -1,11 +1,19 @@
 #!/usr/bin/env python
 import os
 import json
+import time
 import logging
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timedelta
 import re
 
+from .parse_cache import ParseCache, is_cacheable
+from .text_parser import TextParser
+from . import confidence
+from .resilience import CircuitBreaker, LatencyHistogram, backoff_delay
+
 # 設置日誌
 logging.basicConfig(
     level=logging.INFO if os.environ.get('LOG_LEVEL') != 'debug' else logging.DEBUG,
@@ -13,8 +21,29 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 可以重試的 HTTP 狀態碼（限流與上游暫時性錯誤）；解析請求沒有副作用，重送是安全的
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(Exception):
+    """熔斷器開啟中，未送出請求"""
+
+
+# 解析請求依序經過的層級：快取、規則解析（TextParser）、快速匹配、AI 端點、AI 失敗時的備用規則
+TIERS = ("cache", "rules", "quick", "ai", "fallback")
+
+
 class AIParser:
-    """AI 語意分析解析器，用於分析用戶輸入的自然語言並轉換為結構化資料"""
+    """AI 語意分析解析器，用於分析用戶輸入的自然語言並轉換為結構化資料
+    
+    規則解析的信心分數達到門檻時直接採用，只有信心不足的輸入才呼叫 AI 端點。
+    同一進程中的所有實例共用一個保持連線的 HTTP session、熔斷器與延遲統計。
+    """
+    
+    _session = None
+    _breaker = None
+    _latency = None
+    _http_lock = threading.Lock()
     
     def __init__(self):
         """初始化 AI 解析器"""
@@ -23,6 +52,55 @@ class AIParser:
         self.prompt_template = self._load_prompt_template()
         self.is_development = os.environ.get('FLASK_ENV') == 'development'
         
+        # (連線逾時, 讀取逾時)，避免上游無回應時永久卡住 webhook 執行緒
+        self.timeout = (
+            float(os.environ.get('AI_CONNECT_TIMEOUT', '3.05')),
+            float(os.environ.get('AI_READ_TIMEOUT', '10'))
+        )
+        self.max_retries = int(os.environ.get('AI_MAX_RETRIES', '2'))
+        self._init_http()
+        
+        # 規則解析的信心門檻與各層級處理的請求數
+        self.text_parser = TextParser.shared()
+        self.thresholds = confidence.load_thresholds()
+        self._tier_lock = threading.Lock()
+        self.tier_counts = dict.fromkeys(TIERS, 0)
+        
+        # 相同的句子不重複呼叫 API；PARSE_CACHE_SIZE=0 表示不快取
+        cache_size = int(os.environ.get('PARSE_CACHE_SIZE', '1024'))
+        self.cache = ParseCache(cache_size) if cache_size > 0 else None
+        
+    @classmethod
+    def _init_http(cls):
+        """建立進程共用的 HTTP session、熔斷器與延遲統計"""
+        if cls._session is not None:
+            return
+        with cls._http_lock:
+            if cls._session is not None:
+                return
+            pool_size = int(os.environ.get('AI_POOL_SIZE', '10'))
+            session = requests.Session()
+            # 重試由 _post 自行處理（帶抖動的退避並計入熔斷器），連接池不重試
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            cls._breaker = CircuitBreaker(
+                failure_threshold=int(os.environ.get('AI_BREAKER_FAILURES', '5')),
+                reset_timeout=float(os.environ.get('AI_BREAKER_RESET', '30'))
+            )
+            cls._latency = LatencyHistogram()
+            cls._session = session
+    
+    @classmethod
+    def http_status(cls):
+        """返回熔斷器狀態與各結果的延遲分佈"""
+        if cls._session is None:
+            return None
+        return {
+            "breaker": cls._breaker.status(),
+            "latency": cls._latency.snapshot()
+        }
+    
     def _load_prompt_template(self):
         """載入提示詞模板"""
         try:
@@ -35,26 +113,90 @@ class AIParser:
     
     def parse_text(self, user_input):
         """解析用戶輸入文本，返回結構化資料"""
+        key, result = self.parse_local(user_input)
+        if result is not None:
+            return result
+        return self.parse_remote(key)
+    
+    def parse_local(self, user_input):
+        """不經網路的解析步驟（空輸入、快取、信心足夠的規則解析）
+        
+        Returns:
+            (快取鍵, 結果)；結果為 None 時需以 parse_remote(快取鍵) 呼叫 API
+        """
         # 檢查輸入是否為空
         if not user_input or not user_input.strip():
-            return self._create_default_response("請輸入有效的文字。")
+            return None, self._create_default_response("請輸入有效的文字。")
         
-        # 根據關鍵字嘗試快速匹配
-        result = self._try_quick_match(user_input)
-        if result:
-            return result
+        # 鍵包含解析當天的日期，結果中的今天/昨天在換日後會重新解析
+        key = (user_input, datetime.now().date())
+        if self.cache is not None:
+            found, result = self.cache.get(key)
+            if found:
+                self._count("cache")
+                return key, result
         
-        # 使用 Cursor API 進行分析
+        # 依序嘗試規則解析，第一個信心達到門檻的結果勝出
+        for tier, result, score in self.rule_candidates(user_input):
+            if score >= self.thresholds.get(result["type"], 1.0):
+                self._count(tier)
+                self._remember(key, result)
+                return key, result
+        return key, None
+    
+    def rule_candidates(self, user_input):
+        """依嘗試順序逐一產生各規則解析器的 (層級, 結果, 信心分數)
+        
+        每一層在呼叫端要求下一個結果時才執行，前一層已被採用時不再執行後面的解析器。
+        """
+        for tier, parse in (("rules", self.text_parser.parse_text), ("quick", self._try_quick_match)):
+            result = parse(user_input)
+            if result:
+                yield tier, result, confidence.score(result, user_input)
+    
+    def parse_remote(self, key):
+        """以 Cursor API 解析 parse_local 無法處理的輸入"""
+        user_input = key[0]
         try:
-            return self._call_cursor_api(user_input)
+            result = self._call_cursor_api(user_input)
+            self._count("ai")
+            self._remember(key, result)
+            return result
+        except CircuitOpenError:
+            # AI 端點異常期間不再等待逾時，直接使用規則解析
+            logger.warning("Cursor API 熔斷中，使用簡單規則進行回應")
+            self._count("fallback")
+            return self._fallback_parsing(user_input)
         except Exception as e:
             logger.error(f"Cursor API 調用失敗: {str(e)}")
+            self._count("fallback")
             # 在開發環境中使用簡單規則進行回應
             if self.is_development:
                 logger.info("在開發環境中使用簡單規則進行回應")
                 return self._fallback_parsing(user_input)
             return self._create_default_response("抱歉，我無法理解您的輸入。請嘗試使用更清晰的表達方式。")
     
+    def _count(self, tier):
+        with self._tier_lock:
+            self.tier_counts[tier] += 1
+    
+    def tier_status(self):
+        """返回各層級處理的請求數與佔比"""
+        with self._tier_lock:
+            counts = dict(self.tier_counts)
+        total = sum(counts.values())
+        return {
+            "total": total,
+            "counts": counts,
+            "share": {tier: round(count / total, 4) if total else 0.0 for tier, count in counts.items()},
+            "thresholds": dict(self.thresholds)
+        }
+    
+    def _remember(self, key, result):
+        """快取成功的解析結果（API 失敗時的備用回應不快取）"""
+        if self.cache is not None and is_cacheable(result):
+            self.cache.put(key, result)
+    
     def _try_quick_match(self, user_input):
         """嘗試使用簡單規則匹配常見輸入模式"""
         # 移除首尾空白
@@ -93,7 +235,7 @@ class AIParser:
             'max_tokens': 500    # 限制回應長度
         }
         
-        response = requests.post(self.api_url, headers=headers, json=payload)
+        response = self._post(headers, payload)
         
         if response.status_code != 200:
             raise Exception(f"API 請求失敗: {response.status_code}, {response.text}")
@@ -116,6 +258,52 @@ class AIParser:
             logger.error(f"解析 API 回應失敗: {str(e)}")
             raise
     
+    def _post(self, headers, payload):
+        """送出 API 請求：連線錯誤、逾時與暫時性 HTTP 錯誤以帶抖動的退避重試
+        
+        重試用盡後計為一次失敗；連續失敗達門檻時熔斷器開啟，之後的請求直接拋出 CircuitOpenError。
+        """
+        if not self._breaker.allow():
+            raise CircuitOpenError("Cursor API 熔斷中")
+        
+        error = None
+        try:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    time.sleep(backoff_delay(attempt - 1))
+                
+                started = time.perf_counter()
+                try:
+                    response = self._session.post(self.api_url, headers=headers, json=payload, timeout=self.timeout)
+                except requests.Timeout as e:
+                    outcome, error = "timeout", e
+                except requests.ConnectionError as e:
+                    outcome, error = "connection_error", e
+                except requests.RequestException as e:
+                    # 回應中斷（ChunkedEncodingError）、標頭錯誤、重新導向過多等
+                    outcome, error = "request_error", e
+                else:
+                    status = response.status_code
+                    outcome = "ok" if status == 200 else f"http_{status // 100}xx"
+                    self._latency.observe(outcome, time.perf_counter() - started)
+                    if status not in RETRYABLE_STATUS:
+                        # 端點有正常回應（包含 4xx 等非暫時性錯誤），交由呼叫端處理
+                        self._breaker.record_success()
+                        return response
+                    error = Exception(f"API 請求失敗: {status}, {response.text[:200]}")
+                    logger.warning(f"Cursor API 第 {attempt + 1} 次請求失敗: HTTP {status}")
+                    continue
+                
+                self._latency.observe(outcome, time.perf_counter() - started)
+                logger.warning(f"Cursor API 第 {attempt + 1} 次請求失敗: {outcome} {str(error)}")
+        except Exception:
+            # 熔斷器放行的每個請求都必須記錄成功或失敗，否則半開狀態的試探請求不會結束，熔斷器永遠不再放行
+            self._breaker.record_failure()
+            raise
+        
+        self._breaker.record_failure()
+        raise error
+    
     def _fallback_parsing(self, user_input):
         """當 API 調用失敗時使用的簡單規則解析"""
         text = user_input.strip()
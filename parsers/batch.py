@@ -0,0 +1,111 @@
+"""
+批次解析命令列工具
+
+重新解析大量聊天紀錄（例如修改關鍵詞表後回填分類），輸出每則訊息的結構化結果。
+
+輸入格式：
+- text：每行一則訊息
+- jsonl：每行一個 JSON 物件，"text" 為訊息內容，可選的 "timestamp"
+  （ISO 8601 字串，或 LINE 的毫秒時間戳）作為相對日期的基準，其餘欄位原樣輸出
+
+輸出為 JSONL，每行包含輸入欄位與 "result"。
+
+命令列用法：
+    python -m parsers.batch 輸入檔 [-o 輸出檔] [--format text|jsonl] [--processes N] [--now 2024-05-01]
+    cat history.jsonl | python -m parsers.batch - --format jsonl > parsed.jsonl
+"""
+import sys
+import json
+import time
+import logging
+import argparse
+import itertools
+from datetime import datetime
+
+from .text_parser import TextParser
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def parse_timestamp(value):
+    """將 ISO 8601 字串或毫秒時間戳轉為 datetime，無法解析時返回 None"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        # LINE 事件的 timestamp 為毫秒
+        return datetime.fromtimestamp(value / 1000.0 if value > 1e11 else value)
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def read_records(lines, input_format):
+    """逐行讀取輸入，產生 (輸出用的記錄, 文字, 基準時間)"""
+    for line_number, line in enumerate(lines, 1):
+        line = line.rstrip('\n')
+        if not line.strip():
+            continue
+        if input_format == 'jsonl':
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning(f"第 {line_number} 行不是有效的 JSON，已略過: {e}")
+                continue
+            text = record.get("text")
+            if not isinstance(text, str):
+                logger.warning(f"第 {line_number} 行缺少 text 欄位，已略過")
+                continue
+            yield record, text, parse_timestamp(record.get("timestamp"))
+        else:
+            yield {"text": line}, line, None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='批次解析聊天紀錄，輸出 JSONL')
+    parser.add_argument('input', help='輸入檔路徑，- 表示標準輸入')
+    parser.add_argument('-o', '--output', default='-', help='輸出檔路徑，- 表示標準輸出')
+    parser.add_argument('--format', choices=['text', 'jsonl'], help='輸入格式，預設依副檔名判斷')
+    parser.add_argument('--processes', type=int, default=1, help='解析使用的進程數')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='每個進程一次處理的筆數')
+    parser.add_argument('--now', help='沒有 timestamp 的訊息使用的基準時間（ISO 8601）')
+    args = parser.parse_args(argv)
+
+    input_format = args.format or ('jsonl' if args.input.endswith('.jsonl') else 'text')
+    now = parse_timestamp(args.now)
+
+    source = sys.stdin if args.input == '-' else open(args.input, 'r', encoding='utf-8')
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    started = time.perf_counter()
+    count = 0
+    try:
+        # 輸入、解析與輸出逐筆串流：tee 只保留已送去解析、尚未寫出的記錄
+        records, pending = itertools.tee(read_records(source, input_format))
+        results = TextParser.shared().parse_stream(
+            ((text, moment) for _, text, moment in records),
+            now=now,
+            processes=args.processes,
+            chunk_size=args.chunk_size
+        )
+        for (record, _, _), result in zip(pending, results):
+            out.write(json.dumps({**record, "result": result}, ensure_ascii=False) + '\n')
+            count += 1
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - started
+
+    rate = count / elapsed if elapsed > 0 else 0
+    logger.info(f"已解析 {count} 則訊息，耗時 {elapsed:.2f} 秒（{rate:.0f} 則/秒）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
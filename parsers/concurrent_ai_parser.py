@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+"""
+並行的 AI 解析器
+
+多則訊息同時抵達時，AIParser.parse_text 會讓每個執行緒各自阻塞在網路上，
+相同的句子也會各自呼叫一次 API。ConcurrentAIParser 在 AIParser 之上加入：
+
+- 並行上限：同時進行的 API 呼叫最多 max_concurrency 個，其餘排隊等待
+- 請求合併：相同的句子在前一次呼叫完成前再次出現時，共用同一個上游呼叫的結果
+
+API 呼叫仍是 AIParser 的阻塞請求（共用連接池、重試與熔斷器），在有上限的執行緒池中進行。
+webhook 的工作執行緒可直接呼叫 parse_text() 等待結果，或以 submit() 取得
+concurrent.futures.Future；協程中可 await parse_text_async()，等待期間不阻塞事件迴圈。
+"""
+import os
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .ai_parser import AIParser
+from .parse_cache import copy_result
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO if os.environ.get('LOG_LEVEL') != 'debug' else logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class ConcurrentAIParser:
+    """限制並行數並合併相同請求的 AI 解析器"""
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, parser=None, max_concurrency=None):
+        """
+        Args:
+            parser: 實際呼叫 API 的 AIParser，預設建立新的實例
+            max_concurrency: 同時進行的 API 呼叫上限，None 時讀取 AI_MAX_CONCURRENCY
+        """
+        self.parser = parser or AIParser()
+        if max_concurrency is None:
+            max_concurrency = int(os.environ.get('AI_MAX_CONCURRENCY', '4'))
+        self.max_concurrency = max_concurrency
+        # API 呼叫使用共用 session 的阻塞請求，在有上限的執行緒池中進行
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='ai-parser')
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._running = 0
+        self.stats = {
+            "requests": 0,
+            "local": 0,
+            "upstream": 0,
+            "coalesced": 0,
+            "max_running": 0
+        }
+
+    @classmethod
+    def shared(cls):
+        """返回進程共用的實例"""
+        if cls._shared is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = cls()
+        return cls._shared
+
+    def parse_text(self, user_input, timeout=None):
+        """解析用戶輸入文本並等待結果，返回結構化資料"""
+        return self.submit(user_input).result(timeout)
+
+    async def parse_text_async(self, user_input):
+        """在協程中等待解析結果"""
+        return await asyncio.wrap_future(self.submit(user_input))
+
+    def submit(self, user_input):
+        """開始解析並返回 Future；快取與規則解析可處理的輸入會立即完成"""
+        key, result = self.parser.parse_local(user_input)
+        with self._lock:
+            self.stats["requests"] += 1
+            if result is not None:
+                self.stats["local"] += 1
+
+        future = Future()
+        if result is not None:
+            future.set_result(result)
+            return future
+
+        def deliver(upstream):
+            # 每個等待者各自取得一份副本，避免共用同一個可變結果
+            error = upstream.exception()
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(copy_result(upstream.result()))
+
+        self._upstream(key).add_done_callback(deliver)
+        return future
+
+    def _upstream(self, key):
+        """返回 key 的上游呼叫；已有相同的呼叫進行中時直接共用"""
+        with self._lock:
+            upstream = self._inflight.get(key)
+            if upstream is not None:
+                self.stats["coalesced"] += 1
+                return upstream
+            upstream = self._executor.submit(self._call, key)
+            self._inflight[key] = upstream
+            self.stats["upstream"] += 1
+
+        def forget(done):
+            with self._lock:
+                if self._inflight.get(key) is done:
+                    del self._inflight[key]
+
+        upstream.add_done_callback(forget)
+        return upstream
+
+    def _call(self, key):
+        with self._lock:
+            self._running += 1
+            self.stats["max_running"] = max(self.stats["max_running"], self._running)
+        try:
+            return self.parser.parse_remote(key)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def status(self):
+        """返回請求統計與目前進行中的上游呼叫數"""
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "inflight": len(self._inflight),
+                "running": self._running,
+                "tiers": self.parser.tier_status(),
+                **self.stats
+            }
+
+    def close(self, wait=True):
+        """停止執行緒池"""
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""
+規則解析結果的信心分數
+
+AIParser 先以規則解析（TextParser、快速匹配），只有信心不足的輸入才送到 AI 端點。
+score() 依解析結果與原文的一致程度給出 0 到 1 的分數，例如：
+- 記帳金額有明確的 +/- 或「元、塊」標記，且不是日期中的數字（「4月1日」的 4）
+- 記帳結果的原文帶有查詢字眼（「查詢今天支出」）時多半是誤判
+- 查詢有明確的查詢類型與時間範圍
+- 無法理解的一般對話一律為 0
+
+門檻依結果類型設定，可用環境變數調整：
+    AI_CONFIDENCE_THRESHOLD=0.7             所有類型
+    AI_CONFIDENCE_THRESHOLD_ACCOUNTING=0.8  個別類型（大寫的結果類型名稱）
+"""
+import os
+import re
+
+from .text_parser import KEYWORD_MATCHER, QUERY_DATE_RE
+
+DEFAULT_THRESHOLDS = {
+    "accounting": 0.7,
+    "query": 0.7,
+    "account_command": 0.7,
+    "reminder": 0.8
+}
+
+NUMBER_TOKEN_RE = re.compile(r'(\d+(?:\.\d+)?)\s*([年月日號點/:：]?)')
+MARKED_AMOUNT_RE = re.compile(r'[+-]\s*(\d+(?:\.\d+)?)|(\d+(?:\.\d+)?)\s*(?:元|塊)')
+QUERY_WORDS_RE = re.compile(r'查詢|查看|查一下|統計|顯示|列出|多少|報表|餘額')
+REMINDER_TIME_RE = re.compile(r'\d{1,2}[:：]\d{1,2}|\d{1,2}點')
+ITEM_DATE_RE = re.compile(r'\d{1,2}\s*[/月-]\s*\d{1,2}')
+# 規則解析器未辨識出分類時填入的預設值
+PLACEHOLDER_CATEGORIES = frozenset({"一般", "其他"})
+
+
+def load_thresholds():
+    """讀取各結果類型的信心門檻"""
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    common = os.environ.get('AI_CONFIDENCE_THRESHOLD')
+    for result_type in thresholds:
+        value = os.environ.get(f'AI_CONFIDENCE_THRESHOLD_{result_type.upper()}', common)
+        if value:
+            thresholds[result_type] = float(value)
+    return thresholds
+
+
+def score(result, text):
+    """返回規則解析結果的信心分數（0 到 1）"""
+    if not isinstance(result, dict):
+        return 0.0
+    result_type = result.get("type")
+    data = result.get("data") or {}
+
+    if result_type == "accounting":
+        value = _score_accounting(data, text)
+    elif result_type == "query":
+        value = _score_query(text)
+    elif result_type == "account_command":
+        value = 1.0 if data.get("account_name") else 0.0
+    elif result_type == "reminder":
+        value = 0.5
+        if REMINDER_TIME_RE.search(text):
+            value += 0.3
+        if data.get("title") or data.get("content"):
+            value += 0.2
+    else:
+        value = 0.0
+    return round(min(1.0, max(0.0, value)), 2)
+
+
+def _same_number(value, token):
+    try:
+        return float(token) == float(value)
+    except (TypeError, ValueError):
+        return False
+
+
+def _score_accounting(data, text):
+    amount = data.get("amount") or 0
+    if amount <= 0:
+        return 0.1
+
+    value = 0.6
+    # 金額有明確的正負號或貨幣單位
+    if any(_same_number(amount, match.group(1) or match.group(2)) for match in MARKED_AMOUNT_RE.finditer(text)):
+        value += 0.2
+    if data.get("category") and data["category"] not in PLACEHOLDER_CATEGORIES:
+        value += 0.2
+    # 日期留在項目名稱中，表示日期沒有被解析出來
+    if ITEM_DATE_RE.search(data.get("item") or ""):
+        value -= 0.3
+    # 金額取自日期或時間中的數字
+    if any(suffix and _same_number(amount, number) for number, suffix in NUMBER_TOKEN_RE.findall(text)):
+        value -= 0.5
+    # 帶有查詢字眼的「記帳」多半是查詢
+    if QUERY_WORDS_RE.search(text):
+        value -= 0.5
+    return value
+
+
+def _score_query(text):
+    hits = KEYWORD_MATCHER.scan(text)
+    value = 0.6
+    if hits.first("query_type"):
+        value += 0.2
+    if hits.first("query_time") or QUERY_DATE_RE.search(text):
+        value += 0.2
+    return value
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""
+多關鍵詞比對器（Aho-Corasick 自動機）
+
+TextParser 需要知道一段文字命中了哪些意圖、分類與帳戶關鍵詞。
+原本每組關鍵詞都以 any(keyword in text ...) 各掃描一次，
+這裡把所有關鍵詞編譯成一個自動機，走過文字一次即可得到全部命中結果。
+
+關鍵詞以「群組 -> 標籤 -> 關鍵詞」組織：
+- first(group) 返回該群組中依宣告順序第一個命中的標籤，
+  與原本「依序檢查每個分類，第一個有關鍵詞出現的分類勝出」的語意相同
+- any(group) 返回該群組是否有任何關鍵詞出現
+"""
+from collections import deque
+
+
+class KeywordHits:
+    """一次掃描的命中結果"""
+
+    __slots__ = ("_matcher", "_hits")
+
+    def __init__(self, matcher, hits):
+        self._matcher = matcher
+        self._hits = hits
+
+    def any(self, group):
+        """群組中是否有任何關鍵詞出現"""
+        return any(tag in self._hits for tag, _ in self._matcher.groups[group])
+
+    def first(self, group):
+        """返回群組中依宣告順序第一個命中的標籤，沒有命中時返回 None"""
+        for tag, label in self._matcher.groups[group]:
+            if tag in self._hits:
+                return label
+        return None
+
+    def labels(self, group):
+        """返回群組中所有命中的標籤（依宣告順序）"""
+        return [label for tag, label in self._matcher.groups[group] if tag in self._hits]
+
+
+class KeywordMatcher:
+    """將多組關鍵詞編譯為單一 Aho-Corasick 自動機"""
+
+    def __init__(self, groups):
+        """
+        Args:
+            groups: {群組名稱: {標籤: 關鍵詞列表}}；
+                    群組也可以直接是關鍵詞列表，此時整個群組只有一個標籤 True
+        """
+        # 群組名稱 -> [(標籤代號, 標籤)]，保持宣告順序
+        self.groups = {}
+        keyword_tags = {}
+        next_tag = 0
+        for group, labels in groups.items():
+            if not hasattr(labels, "items"):
+                labels = {True: labels}
+            entries = []
+            for label, keywords in labels.items():
+                for keyword in keywords:
+                    if keyword:
+                        keyword_tags.setdefault(keyword, set()).add(next_tag)
+                entries.append((next_tag, label))
+                next_tag += 1
+            self.groups[group] = tuple(entries)
+
+        self._goto, self._fail, self._output = self._build(keyword_tags)
+
+    @staticmethod
+    def _build(keyword_tags):
+        goto = [{}]
+        output = [set()]
+        for keyword, tags in keyword_tags.items():
+            node = 0
+            for char in keyword:
+                nxt = goto[node].get(char)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][char] = nxt
+                    goto.append({})
+                    output.append(set())
+                node = nxt
+            output[node] |= tags
+
+        # 以廣度優先計算失敗連結，並把失敗節點的輸出併入，掃描時不需再沿失敗鏈收集
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                output[child] |= output[fail[child]]
+
+        return goto, fail, [frozenset(tags) if tags else None for tags in output]
+
+    def scan(self, text):
+        """走過文字一次，返回所有命中的關鍵詞標籤"""
+        goto, fail, output = self._goto, self._fail, self._output
+        hits = set()
+        node = 0
+        for char in text:
+            while True:
+                nxt = goto[node].get(char)
+                if nxt is not None:
+                    node = nxt
+                    break
+                if not node:
+                    break
+                node = fail[node]
+            if output[node]:
+                hits |= output[node]
+        return KeywordHits(self, hits)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+解析結果快取
+
+用戶經常重複送出相同的短句（「早餐 -60」「午餐 -120」「查詢本月支出」），
+以輸入文字為鍵快取解析結果，AIParser 更可因此省去重複的 API 呼叫。
+解析結果會受空白影響（例如首尾空白、全形空白），鍵使用原始文字而不做正規化，
+啟用快取與否的解析結果完全相同。
+
+解析結果中的日期（今天、昨天、本週…）相對於解析當天，
+因此鍵包含解析基準日：換日後自動重新解析，快取結果不會過期失準。
+提醒的時間與目前時刻（時、分）有關，不放入快取。
+"""
+import threading
+from collections import OrderedDict
+
+# 結果與當下時刻相關、不可快取的類型
+UNCACHEABLE_TYPES = frozenset({"reminder"})
+
+
+def is_cacheable(result):
+    """解析結果是否可以快取"""
+    return isinstance(result, dict) and result.get("type") not in UNCACHEABLE_TYPES
+
+
+def copy_result(value):
+    """複製解析結果，呼叫端修改返回值不影響快取內容"""
+    if isinstance(value, dict):
+        return {key: copy_result(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [copy_result(item) for item in value]
+    return value
+
+
+class ParseCache:
+    """執行緒安全、限制筆數的 LRU 解析結果快取"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0
+        }
+
+    def get(self, key):
+        """返回 (是否命中, 結果副本)"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.stats["misses"] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+        return True, copy_result(value)
+
+    def put(self, key, value):
+        """儲存結果，超過筆數上限時淘汰最久未使用的項目"""
+        value = copy_result(value)
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        """清空快取"""
+        with self._lock:
+            self._entries.clear()
+
+    def status(self):
+        """返回快取筆數與命中率"""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+                **self.stats
+            }
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+呼叫外部 API 的容錯工具
+
+- CircuitBreaker：連續失敗達門檻後短暫停止呼叫（快速失敗），冷卻後放行一個試探請求
+- LatencyHistogram：依結果（成功、逾時、HTTP 錯誤…）分別統計延遲分佈
+- backoff_delay：帶隨機抖動的指數退避，避免多個執行緒同時重試
+"""
+import time
+import random
+import threading
+from bisect import bisect_left
+
+# 延遲分佈的桶上限（毫秒），最後一個桶收集超過上限的請求
+DEFAULT_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def backoff_delay(attempt, base=0.2, cap=2.0, rng=random):
+    """第 attempt 次重試前等待的秒數（full jitter：0 到指數上限之間隨機）"""
+    return rng.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """熔斷器
+
+    closed：正常放行；連續失敗 failure_threshold 次後轉為 open
+    open：直接拒絕，經過 reset_timeout 秒後轉為 half_open
+    half_open：只放行一個試探請求，成功則回到 closed，失敗則重新 open
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.stats = {
+            "opened": 0,
+            "short_circuited": 0
+        }
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probing = False
+        return self._state
+
+    def allow(self):
+        """是否放行這次請求"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.stats["short_circuited"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.stats["opened"] += 1
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self._probing = False
+
+    def status(self):
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._failures,
+                **self.stats
+            }
+
+
+class LatencyHistogram:
+    """依結果分類的延遲分佈"""
+
+    def __init__(self, buckets_ms=DEFAULT_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self._lock = threading.Lock()
+        self._outcomes = {}
+
+    def observe(self, outcome, seconds):
+        """記錄一次請求的結果與耗時"""
+        elapsed_ms = seconds * 1000.0
+        index = bisect_left(self.buckets_ms, elapsed_ms)
+        with self._lock:
+            entry = self._outcomes.get(outcome)
+            if entry is None:
+                entry = self._outcomes[outcome] = {
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "buckets": [0] * (len(self.buckets_ms) + 1)
+                }
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["buckets"][index] += 1
+
+    def snapshot(self):
+        """返回各結果的次數、平均與最大延遲，以及各桶（le_毫秒）的計數"""
+        labels = [f"le_{bound}" for bound in self.buckets_ms] + ["inf"]
+        with self._lock:
+            return {
+                outcome: {
+                    "count": entry["count"],
+                    "avg_ms": round(entry["total_ms"] / entry["count"], 1),
+                    "max_ms": round(entry["max_ms"], 1),
+                    "buckets": dict(zip(labels, entry["buckets"]))
+                }
+                for outcome, entry in self._outcomes.items()
+            }
@@ -2,8 +2,17 @@
 import re
 import logging
 import os
+import itertools
+import threading
+import contextvars
+import multiprocessing
+from contextlib import contextmanager
+from types import MappingProxyType
 from datetime import datetime, timedelta
 
+from .keyword_matcher import KeywordMatcher
+from .parse_cache import ParseCache, is_cacheable
+
 # 設置日誌
 logging.basicConfig(
     level=logging.INFO if os.environ.get('LOG_LEVEL') != 'debug' else logging.DEBUG,
@@ -11,78 +20,341 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 相對日期（今天、昨天、本週…）的基準時間，None 表示使用目前時間
+_reference_time = contextvars.ContextVar('reference_time', default=None)
+
+
+def _now():
+    """返回解析相對日期用的「現在」"""
+    moment = _reference_time.get()
+    return moment if moment is not None else datetime.now()
+
+
+@contextmanager
+def reference_time(moment):
+    """在區塊內以 moment 作為相對日期的基準，用於重新解析歷史訊息"""
+    token = _reference_time.set(moment)
+    try:
+        yield
+    finally:
+        _reference_time.reset(token)
+
+
+# 支出和收入關鍵詞
+EXPENSE_KEYWORDS = (
+    "支出", "花費", "消費", "付款", "付", "買", "購買", 
+    "嗯", "花了", "支付", "花", "用了", "出", "花掉"
+)
+INCOME_KEYWORDS = (
+    "收入", "賺", "收", "得到", "獲得", "贏得", "收款", 
+    "進", "入帳", "收到", "發薪水", "薪資", "薪水"
+)
+ACCOUNTING_KEYWORDS = EXPENSE_KEYWORDS + INCOME_KEYWORDS
+
+# 常見的消費類別和關鍵詞映射
+EXPENSE_CATEGORIES_MAPPING = MappingProxyType({
+    "飲食": ("飯", "餐", "食", "吃", "喝", "飲料", "水", "早餐", "午餐", "晚餐", "宵夜", "點心", "零食", "咖啡"),
+    "交通": ("車", "票", "機票", "高鐵", "捷運", "公車", "計程車", "油費", "加油", "停車", "過路費", "uber", "ubike"),
+    "購物": ("買", "購", "衣", "服", "鞋", "包", "電子", "3C", "家電", "傢俱", "裝飾", "日用品"),
+    "娛樂": ("電影", "遊戲", "旅遊", "旅行", "玩", "唱歌", "KTV", "party", "趴踢", "爬山", "運動", "健身", "展覽"),
+    "醫療": ("醫", "藥", "看病", "掛號", "門診", "住院", "手術", "保健", "牙醫", "眼科", "檢查"),
+    "教育": ("學", "書", "課", "班", "教材", "補習", "講義", "文具", "考試", "證照"),
+    "居家": ("房租", "水費", "電費", "瓦斯費", "網路費", "管理費", "裝修", "清潔", "家具", "家電", "電話費"),
+    "其他": ()
+})
+
+# 常見的收入類別和關鍵詞映射
+INCOME_CATEGORIES_MAPPING = MappingProxyType({
+    "薪資": ("薪水", "薪資", "工資", "工作", "月薪", "週薪", "年薪", "加班費", "兼職"),
+    "獎金": ("獎金", "分紅", "年終", "獎勵", "禮金", "紅包", "抽獎"),
+    "投資": ("股", "投資", "基金", "股利", "利息", "租金", "理財", "定存", "股票", "債券", "配息"),
+    "退款": ("退款", "退費", "賠償", "保險理賠", "報銷", "補貼", "退稅"),
+    "其他": ()
+})
+
+# 常見的帳戶類型和關鍵詞
+ACCOUNT_MAPPING = MappingProxyType({
+    "現金": ("現金", "錢包", "口袋", "cash"),
+    "信用卡": ("信用卡", "卡", "visa", "master", "jcb", "刷卡"),
+    "銀行": ("銀行", "帳戶", "轉帳", "ATM", "金融卡", "存款"),
+    "電子支付": ("電子支付", "行動支付", "Line Pay", "街口", "悠遊付", "Apple Pay", "Google Pay", "支付寶", "微信支付", "Pi拍錢包")
+})
+
+# parse_text 判斷意圖用的關鍵詞
+ACCOUNTING_TRIGGERS = ("收入", "支出", "記帳", "記個帳", "記錄一筆", "消費", "花了", "賺了")
+REMINDER_TRIGGERS = ("提醒", "備忘", "備註")
+QUERY_TRIGGERS = ("查詢", "報表", "統計", "顯示", "列出", "多少", "花費", "花了多少", "賺了多少", "查看", "查一下")
+
+# 記帳時識別常見的消費場景
+COMMON_EXPENSE_ITEMS = MappingProxyType({
+    "食品": ("超市", "大賣場", "菜市場", "買菜", "蔬菜", "水果", "肉類", "食品"),
+    "餐飲": ("早餐", "午餐", "晚餐", "夜宵", "飯", "餐", "吃飯", "餐廳", "小吃", "飲料", "咖啡", "奶茶"),
+    "交通": ("計程車", "出租車", "公車", "地鐵", "高鐵", "火車", "機票", "油費", "加油", "停車費", "交通"),
+    "購物": ("衣服", "鞋子", "包包", "電子產品", "家電", "購物", "買", "商場", "百貨", "網購"),
+    "娛樂": ("電影", "遊戲", "演唱會", "KTV", "唱歌", "酒吧", "娛樂"),
+    "醫療": ("醫院", "診所", "醫生", "藥", "看病", "醫療"),
+    "住宿": ("房租", "水電", "瓦斯", "電費", "水費", "網路費", "住宿"),
+    "通訊": ("手機費", "電話費", "網路費", "通訊"),
+    "學習": ("書", "課程", "學費", "補習", "學習"),
+    "寵物": ("寵物", "狗", "貓", "寵物用品", "寵物食品")
+})
+
+# 記帳日期的相對日（依序檢查）
+RELATIVE_DAYS = MappingProxyType({0: ("今天",), 1: ("昨天",), 2: ("前天",)})
+
+# 查詢操作的關鍵詞
+QUERY_KEYWORDS = ("查詢", "查看", "顯示", "統計", "報表", "多少", "花費", "花了", "記錄", "支出", "收入", "一共", "共計", "總共")
+QUERY_TYPES = MappingProxyType({
+    "income": ("收入", "賺", "賺了", "獲得", "收到"),
+    "reminder": ("提醒", "待辦", "代辦", "行程", "活動"),
+    "balance": ("餘額", "結餘", "剩餘", "帳戶"),
+    "overview": ("總覽", "概況", "彙總", "匯總", "所有")
+})
+QUERY_TIME_RANGES = MappingProxyType({
+    ("day", "current"): ("今天", "本日", "當日"),
+    ("day", "previous"): ("昨天", "昨日", "前一天"),
+    ("week", "current"): ("本週", "這週", "本周", "這周", "當週"),
+    ("week", "previous"): ("上週", "上个週", "前一週", "上周", "前一周"),
+    ("month", "current"): ("本月", "這個月", "當月", "這月"),
+    ("month", "previous"): ("上個月", "上月", "前一月", "前月"),
+    ("year", "current"): ("今年", "本年", "這一年"),
+    ("year", "previous"): ("去年", "上一年", "前一年")
+})
+QUERY_CATEGORIES = MappingProxyType({
+    "飲食": ("飲食", "餐廳", "餐飲", "吃飯", "早餐", "午餐", "晚餐", "宵夜", "食物", "小吃"),
+    "交通": ("交通", "車費", "油費", "停車費", "計程車", "高鐵", "火車", "捷運", "公車", "機票"),
+    "購物": ("購物", "服飾", "衣服", "鞋子", "包包", "電子產品", "家電", "日用品"),
+    "娛樂": ("娛樂", "電影", "遊戲", "音樂", "演唱會", "旅遊", "旅行", "度假"),
+    "醫療": ("醫療", "醫院", "診所", "藥品", "牙醫", "看病", "健保"),
+    "教育": ("教育", "學費", "書籍", "文具", "課程", "補習", "學習"),
+    "居家": ("居家", "房租", "水電", "網路費", "家具", "家居", "租金", "管理費"),
+    "其他": ("其他", "雜項", "雜費", "未分類")
+})
+QUERY_ACCOUNTS = MappingProxyType({
+    "現金": ("現金", "零用金", "錢包"),
+    "銀行卡": ("銀行卡", "金融卡", "提款卡", "儲蓄卡"),
+    "信用卡": ("信用卡", "卡費", "刷卡"),
+    "行動支付": ("行動支付", "電子支付", "支付寶", "微信支付", "Apple Pay", "Google Pay", "街口支付", "Line Pay")
+})
+
+# 所有關鍵詞編譯成一個自動機，每則訊息只需掃描一次
+KEYWORD_MATCHER = KeywordMatcher({
+    "accounting": ACCOUNTING_KEYWORDS,
+    "accounting_trigger": ACCOUNTING_TRIGGERS,
+    "reminder_trigger": REMINDER_TRIGGERS,
+    "query_trigger": QUERY_TRIGGERS,
+    "income": INCOME_KEYWORDS,
+    "expense_category": EXPENSE_CATEGORIES_MAPPING,
+    "income_category": INCOME_CATEGORIES_MAPPING,
+    "account": ACCOUNT_MAPPING,
+    "common_item": COMMON_EXPENSE_ITEMS,
+    "relative_day": RELATIVE_DAYS,
+    "query": QUERY_KEYWORDS,
+    "query_type": QUERY_TYPES,
+    "query_time": QUERY_TIME_RANGES,
+    "query_category": QUERY_CATEGORIES,
+    "query_account": QUERY_ACCOUNTS
+})
+# 比對擷取出的帳戶文字時不分大小寫
+ACCOUNT_MATCHER_LOWER = KeywordMatcher({
+    "account": {name: tuple(keyword.lower() for keyword in keywords) for name, keywords in ACCOUNT_MAPPING.items()}
+})
+
+# 預先編譯的正規表示式
+AMOUNT_RE = re.compile(r'[+-]?\d+\.?\d*')
+SIGNED_AMOUNT_RE = re.compile(r'[+-]\d+')
+NUMBER_RE = re.compile(r'(\d+\.?\d*)')
+ACCOUNT_COMMAND_PREFIX_RE = re.compile(r'^(新增帳戶|添加帳戶|加入帳戶)\s*')
+
+# 金額表述方式，依序嘗試；第二欄表示交易類型的判斷方式
+AMOUNT_PATTERNS = (
+    # 標準格式：+/-數字
+    (re.compile(r'([+-])?\s*(\d+\.?\d*)'), "signed"),
+    # "花了/消費了/支付了/付了 數字元/塊/圓/RMB/NT/NT$"
+    (re.compile(r'(?:花了|消費了|支付了|付了|用了)\s*(\d+\.?\d*)\s*(?:元|塊|圓|RMB|NT|NT\$)?'), None),
+    # "數字元/塊/圓/RMB/NT/NT$"
+    (re.compile(r'(\d+\.?\d*)\s*(?:元|塊|圓|RMB|NT|NT\$)'), None),
+    # "賺了/收入/得到了 數字元/塊/圓/RMB/NT/NT$"
+    (re.compile(r'(?:賺了|收入|得到了|獲得了)\s*(\d+\.?\d*)\s*(?:元|塊|圓|RMB|NT|NT\$)?'), "income"),
+    # "買了XX(數字)元/塊"
+    (re.compile(r'買了.*?(\d+\.?\d*)\s*(?:元|塊|圓|RMB|NT|NT\$)?'), None),
+    # "XX花費(數字)元/塊"
+    (re.compile(r'.*?花費\s*(\d+\.?\d*)\s*(?:元|塊|圓|RMB|NT|NT\$)?'), None),
+    # "使用XX支付(數字)元/塊"
+    (re.compile(r'使用.*?支付\s*(\d+\.?\d*)\s*(?:元|塊|圓|RMB|NT|NT\$)?'), None),
+    # "薪資/工資(數字)元/塊"
+    (re.compile(r'(?:薪資|工資|薪水)\s*(\d+\.?\d*)\s*(?:元|塊|圓|RMB|NT|NT\$)?'), "income")
+)
+
+# 從記帳文字中移除金額與標記，剩下的是項目名稱
+ITEM_CLEANUP_PATTERNS = (
+    re.compile(r'[+-]?\s*\d+\.?\d*\s*(?:元|塊|圓|RMB|NT|NT\$)?'),
+    re.compile(r'(?:花了|消費了|支付了|付了|用了|賺了|收入|得到了|獲得了|花費)\s*\d+\.?\d*\s*(?:元|塊|圓|RMB|NT|NT\$)?'),
+    re.compile(r'\[.*?\]'),           # 移除分類標記 [分類]
+    re.compile(r'<.*?>'),             # 移除帳戶標記 <帳戶>
+    re.compile(r'@.*?(?:\s|$)')       # 移除日期標記 @日期
+)
+WHITESPACE_RE = re.compile(r'\s+')
+CATEGORY_TAG_RE = re.compile(r'\[(.*?)\]')
+ACCOUNT_TAG_RE = re.compile(r'<(.*?)>')
+DATE_TAG_RE = re.compile(r'@(.*?)(?:\s|$)')
+
+# 帳戶表述方式
+ACCOUNT_PATTERNS = (
+    # 直接提及帳戶："使用/用XX帳戶/卡/支付"
+    re.compile(r'(?:使用|用|透過|經由|從)\s*([\w\s]+?)(?:帳戶|卡|支付)'),
+    # 提及支付方式："用XX付款/支付"
+    re.compile(r'(?:用|透過|使用)\s*([\w\s]+?)(?:付款|支付|付|刷|買)')
+)
+
+# 日期表述方式，依序嘗試
+DATE_PATTERNS = (
+    (re.compile(r'(\d{1,2})(?:月|\/|-)(\d{1,2})(?:日|號)?'), "month_day"),  # 4月1日, 4/1, 4-1
+    (re.compile(r'(\d{4})(?:年)(\d{1,2})(?:月|\/|-)(\d{1,2})(?:日|號)?'), "year_month_day"),  # 2023年4月1日, 2023/4/1
+    (re.compile(r'(今天|昨天|前天)'), "relative"),  # 今天, 昨天, 前天
+    (re.compile(r'(?:上個?|這個?|下個?)?(星期|週|周)([一二三四五六日天])'), "weekday")  # 上週一, 這週二, 下週三
+)
+
+QUERY_DATE_RE = re.compile(r'(\d{4})[/\-年]?(\d{1,2})[/\-月]?(\d{1,2})?[日號]?')
+
 class TextParser:
-    """自然語言解析器，用於分析用戶輸入並轉換為結構化資料"""
+    """自然語言解析器，用於分析用戶輸入並轉換為結構化資料
+    
+    解析器沒有可變狀態，關鍵詞表為模組層級的唯讀常數，可在多個執行緒間共用；
+    請透過 TextParser.shared() 取得進程共用的實例。
+    """
     
-    def __init__(self):
-        """初始化解析器"""
+    _shared = None
+    _shared_lock = threading.Lock()
+    
+    def __init__(self, cache_size=None):
+        """初始化解析器
+        
+        Args:
+            cache_size: 解析結果快取的筆數上限，None 時讀取 PARSE_CACHE_SIZE，0 表示不快取
+        """
         self.is_development = os.environ.get('FLASK_ENV') == 'development'
         
-        # 定義可能的支出和收入關鍵詞
-        self.expense_keywords = [
-            "支出", "花費", "消費", "付款", "付", "買", "購買", 
-            "嗯", "花了", "支付", "花", "用了", "出", "花掉"
-        ]
-        self.income_keywords = [
-            "收入", "賺", "收", "得到", "獲得", "贏得", "收款", 
-            "進", "入帳", "收到", "發薪水", "薪資", "薪水"
-        ]
+        if cache_size is None:
+            cache_size = int(os.environ.get('PARSE_CACHE_SIZE', '1024'))
+        self.cache = ParseCache(cache_size) if cache_size > 0 else None
         
-        # 定義常見的消費類別和關鍵詞映射
-        self.expense_categories_mapping = {
-            "飲食": ["飯", "餐", "食", "吃", "喝", "飲料", "水", "早餐", "午餐", "晚餐", "宵夜", "點心", "零食", "咖啡"],
-            "交通": ["車", "票", "機票", "高鐵", "捷運", "公車", "計程車", "油費", "加油", "停車", "過路費", "uber", "ubike"],
-            "購物": ["買", "購", "衣", "服", "鞋", "包", "電子", "3C", "家電", "傢俱", "裝飾", "日用品"],
-            "娛樂": ["電影", "遊戲", "旅遊", "旅行", "玩", "唱歌", "KTV", "party", "趴踢", "爬山", "運動", "健身", "展覽"],
-            "醫療": ["醫", "藥", "看病", "掛號", "門診", "住院", "手術", "保健", "牙醫", "眼科", "檢查"],
-            "教育": ["學", "書", "課", "班", "教材", "補習", "講義", "文具", "考試", "證照"],
-            "居家": ["房租", "水費", "電費", "瓦斯費", "網路費", "管理費", "裝修", "清潔", "家具", "家電", "電話費"],
-            "其他": []
-        }
+        # 關鍵詞表為共用的唯讀常數，不在每個實例中重建
+        self.expense_keywords = EXPENSE_KEYWORDS
+        self.income_keywords = INCOME_KEYWORDS
+        self.accounting_keywords = ACCOUNTING_KEYWORDS
+        self.expense_categories_mapping = EXPENSE_CATEGORIES_MAPPING
+        self.income_categories_mapping = INCOME_CATEGORIES_MAPPING
+        self.account_mapping = ACCOUNT_MAPPING
+    
+    @classmethod
+    def shared(cls):
+        """返回進程共用的解析器實例"""
+        if cls._shared is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = cls()
+        return cls._shared
+    
+    def warm_up(self):
+        """解析幾則代表性訊息，讓各解析路徑在第一則真實訊息之前完成初始化"""
+        for text in ("午餐 -120", "薪水 +30000 <銀行>", "查詢本月支出", "新增帳戶 現金 1000"):
+            self.parse_text(text)
+        return self
+    
+    def parse_iter(self, items, now=None):
+        """逐筆解析，適合串流處理大量歷史訊息
         
-        # 定義常見的收入類別和關鍵詞映射
-        self.income_categories_mapping = {
-            "薪資": ["薪水", "薪資", "工資", "工作", "月薪", "週薪", "年薪", "加班費", "兼職"],
-            "獎金": ["獎金", "分紅", "年終", "獎勵", "禮金", "紅包", "抽獎"],
-            "投資": ["股", "投資", "基金", "股利", "利息", "租金", "理財", "定存", "股票", "債券", "配息"],
-            "退款": ["退款", "退費", "賠償", "保險理賠", "報銷", "補貼", "退稅"],
-            "其他": []
-        }
+        Args:
+            items: 文字，或 (文字, 訊息時間) 的序列；訊息時間作為相對日期的基準
+            now: 沒有個別訊息時間時使用的基準時間，None 表示目前時間
+        """
+        for item in items:
+            if isinstance(item, str):
+                text, moment = item, now
+            else:
+                text, moment = item
+                moment = moment or now
+            
+            if moment is None:
+                yield self.parse_text(text)
+            else:
+                with reference_time(moment):
+                    yield self.parse_text(text)
+    
+    def parse_stream(self, items, now=None, processes=None, chunk_size=1000):
+        """批次解析，依輸入順序逐筆產生結果，不把整個輸入或結果讀入記憶體
         
-        # 定義常見的帳戶類型和關鍵詞
-        self.account_mapping = {
-            "現金": ["現金", "錢包", "口袋", "cash"],
-            "信用卡": ["信用卡", "卡", "visa", "master", "jcb", "刷卡"],
-            "銀行": ["銀行", "帳戶", "轉帳", "ATM", "金融卡", "存款"],
-            "電子支付": ["電子支付", "行動支付", "Line Pay", "街口", "悠遊付", "Apple Pay", "Google Pay", "支付寶", "微信支付", "Pi拍錢包"]
-        }
+        Args:
+            items: 同 parse_iter，可為任意長度的迭代器
+            now: 同 parse_iter
+            processes: 進程數；大於 1 時以進程池的 imap 分散解析
+            chunk_size: 每個進程一次處理的筆數
+        """
+        if not processes or processes <= 1:
+            yield from self.parse_iter(items, now)
+            return
         
+        # imap 會盡快讀完整個輸入，因此每次只交給進程池有限的一段，記憶體用量與輸入大小無關
+        items = iter(items)
+        window = chunk_size * processes * 2
+        with multiprocessing.Pool(processes) as pool:
+            while True:
+                batch = [(item, now) for item in itertools.islice(items, window)]
+                if not batch:
+                    return
+                yield from pool.imap(_parse_item, batch, chunksize=chunk_size)
+    
+    def parse_many(self, items, now=None, processes=None, chunk_size=1000):
+        """批次解析並返回結果列表，順序與輸入相同（參數同 parse_stream）"""
+        items = list(items)
+        if len(items) <= chunk_size:
+            processes = None
+        return list(self.parse_stream(items, now, processes, chunk_size))
+    
     def parse_text(self, user_input):
         """解析用戶輸入文本，返回結構化資料"""
         # 檢查輸入是否為空
         if not user_input or not user_input.strip():
             return self._create_default_response("請輸入有效的文字。")
         
-        # 嘗試匹配常見的輸入模式
-        text = user_input.strip()
+        if self.cache is None:
+            return self._parse_uncached(user_input)
+        
+        # 鍵包含相對日期的基準日，換日（或以 reference_time 重新解析歷史訊息）時不會取到舊日期
+        key = (user_input, _now().date())
+        found, result = self.cache.get(key)
+        if found:
+            return result
         
+        result = self._parse_uncached(user_input)
+        if is_cacheable(result):
+            self.cache.put(key, result)
+        return result
+    
+    def _parse_uncached(self, text):
+        """不經快取解析文字"""
+        # 嘗試匹配常見的輸入模式
         # 檢查是否為新增帳戶操作
         if text.startswith("新增帳戶") or text.startswith("添加帳戶") or text.startswith("加入帳戶"):
             return self._parse_account_command(text)
         
+        # 一次掃描取得所有意圖、分類與帳戶關鍵詞的命中結果
+        hits = KEYWORD_MATCHER.scan(text)
+        
         # 檢查是否為記帳操作 (增加更多記帳相關的關鍵詞匹配)
-        if (re.search(r'[+-]?\d+\.?\d*', text) and any(keyword in text for keyword in self.expense_keywords + self.income_keywords)) or \
-           re.search(r'[+-]\d+', text) or \
-           any(keyword in text for keyword in ["收入", "支出", "記帳", "記個帳", "記錄一筆", "消費", "花了", "賺了"]):
-            return self._parse_accounting(text)
+        if (hits.any("accounting") and AMOUNT_RE.search(text)) or \
+           SIGNED_AMOUNT_RE.search(text) or \
+           hits.any("accounting_trigger"):
+            return self._parse_accounting(text, hits)
         
         # 檢查是否為提醒操作
-        if text.startswith('#') or re.search(r'提醒我|提醒|備忘|備註', text):
+        if text.startswith('#') or hits.any("reminder_trigger"):
             return self._parse_reminder(text)
         
         # 檢查是否為查詢操作
-        if any(keyword in text for keyword in ["查詢", "報表", "統計", "顯示", "列出", "多少", "花費", "花了多少", "賺了多少", "查看", "查一下"]):
-            return self._parse_query(text)
+        if hits.any("query_trigger"):
+            return self._parse_query(text, hits)
         
         # 無法快速匹配，返回一般對話
         return self._create_default_response(f"我無法理解您的輸入「{text}」。請嘗試使用記帳、提醒或查詢的格式。")
@@ -92,7 +364,7 @@ class TextParser:
         try:
             # 提取帳戶名稱
             # 移除命令前綴
-            clean_text = re.sub(r'^(新增帳戶|添加帳戶|加入帳戶)\s*', '', text)
+            clean_text = ACCOUNT_COMMAND_PREFIX_RE.sub('', text)
             
             # 如果沒有提供帳戶名稱
             if not clean_text.strip():
@@ -112,43 +384,31 @@ class TextParser:
             logger.error(f"解析帳戶命令失敗: {str(e)}")
             return self._create_default_response("解析帳戶命令失敗，請確保格式正確，例如：「新增帳戶 現金」")
     
-    def _parse_accounting(self, text):
-        """解析記帳操作"""
+    def _parse_accounting(self, text, hits=None):
+        """解析記帳操作
+        
+        Args:
+            text: 用戶輸入
+            hits: parse_text 已掃描的關鍵詞命中結果，未提供時重新掃描
+        """
         try:
+            if hits is None:
+                hits = KEYWORD_MATCHER.scan(text)
+            
             # 確定交易類型 (收入或支出)
             transaction_type = "expense"  # 預設為支出
-            if any(keyword in text for keyword in self.income_keywords):
+            if hits.any("income"):
                 transaction_type = "income"
             
-            # 提取金額
-            # 處理常見的金額表述方式
-            amount_patterns = [
-                # 標準格式：+/-數字
-                r'([+-])?\s*(\d+\.?\d*)',
-                # "花了/消費了/支付了/付了 數字元/塊/圓/RMB/NT/NT$"
-                r'(?:花了|消費了|支付了|付了|用了)\s*(\d+\.?\d*)\s*(?:元|塊|圓|RMB|NT|NT\$)?',
-                # "數字元/塊/圓/RMB/NT/NT$"
-                r'(\d+\.?\d*)\s*(?:元|塊|圓|RMB|NT|NT\$)',
-                # "賺了/收入/得到了 數字元/塊/圓/RMB/NT/NT$"
-                r'(?:賺了|收入|得到了|獲得了)\s*(\d+\.?\d*)\s*(?:元|塊|圓|RMB|NT|NT\$)?',
-                # "買了XX(數字)元/塊"
-                r'買了.*?(\d+\.?\d*)\s*(?:元|塊|圓|RMB|NT|NT\$)?',
-                # "XX花費(數字)元/塊"
-                r'.*?花費\s*(\d+\.?\d*)\s*(?:元|塊|圓|RMB|NT|NT\$)?',
-                # "使用XX支付(數字)元/塊"
-                r'使用.*?支付\s*(\d+\.?\d*)\s*(?:元|塊|圓|RMB|NT|NT\$)?',
-                # "薪資/工資(數字)元/塊"
-                r'(?:薪資|工資|薪水)\s*(\d+\.?\d*)\s*(?:元|塊|圓|RMB|NT|NT\$)?'
-            ]
-            
+            # 提取金額（依序嘗試 AMOUNT_PATTERNS 中的表述方式）
             amount = 0
             amount_found = False
             
-            for pattern in amount_patterns:
-                amount_match = re.search(pattern, text)
+            for pattern, kind in AMOUNT_PATTERNS:
+                amount_match = pattern.search(text)
                 if amount_match:
                     # 對於第一種模式，檢查是否有+/-符號
-                    if pattern == r'([+-])?\s*(\d+\.?\d*)':
+                    if kind == "signed":
                         sign = amount_match.group(1) if amount_match.group(1) else ""
                         amount = float(amount_match.group(2))
                         
@@ -157,8 +417,8 @@ class TextParser:
                             transaction_type = "income"
                         elif sign == '-':
                             transaction_type = "expense"
-                    # 對於「賺了/收入」模式，設為收入
-                    elif pattern.startswith(r'(?:賺了|收入|得到了|獲得了)') or pattern.startswith(r'(?:薪資|工資|薪水)'):
+                    # 對於「賺了/收入」與「薪資」模式，設為收入
+                    elif kind == "income":
                         amount = float(amount_match.group(1))
                         transaction_type = "income"
                     # 對於其他模式，提取數字部分
@@ -170,7 +430,7 @@ class TextParser:
             
             # 如果沒有找到金額，嘗試找出任何數字
             if not amount_found:
-                number_match = re.search(r'(\d+\.?\d*)', text)
+                number_match = NUMBER_RE.search(text)
                 if number_match:
                     amount = float(number_match.group(1))
                 else:
@@ -178,35 +438,15 @@ class TextParser:
             
             # 提取項目名稱
             # 移除金額和特殊格式標記
-            clean_text = re.sub(r'[+-]?\s*\d+\.?\d*\s*(?:元|塊|圓|RMB|NT|NT\$)?', '', text)
-            clean_text = re.sub(r'(?:花了|消費了|支付了|付了|用了|賺了|收入|得到了|獲得了|花費)\s*\d+\.?\d*\s*(?:元|塊|圓|RMB|NT|NT\$)?', '', clean_text)
-            clean_text = re.sub(r'\[.*?\]', '', clean_text)  # 移除分類標記 [分類]
-            clean_text = re.sub(r'<.*?>', '', clean_text)    # 移除帳戶標記 <帳戶>
-            clean_text = re.sub(r'@.*?(?:\s|$)', '', clean_text)  # 移除日期標記 @日期
-            
-            # 識別常見的消費場景
-            common_expense_items = {
-                "食品": ["超市", "大賣場", "菜市場", "買菜", "蔬菜", "水果", "肉類", "食品"],
-                "餐飲": ["早餐", "午餐", "晚餐", "夜宵", "飯", "餐", "吃飯", "餐廳", "小吃", "飲料", "咖啡", "奶茶"],
-                "交通": ["計程車", "出租車", "公車", "地鐵", "高鐵", "火車", "機票", "油費", "加油", "停車費", "交通"],
-                "購物": ["衣服", "鞋子", "包包", "電子產品", "家電", "購物", "買", "商場", "百貨", "網購"],
-                "娛樂": ["電影", "遊戲", "演唱會", "KTV", "唱歌", "酒吧", "娛樂"],
-                "醫療": ["醫院", "診所", "醫生", "藥", "看病", "醫療"],
-                "住宿": ["房租", "水電", "瓦斯", "電費", "水費", "網路費", "住宿"],
-                "通訊": ["手機費", "電話費", "網路費", "通訊"],
-                "學習": ["書", "課程", "學費", "補習", "學習"],
-                "寵物": ["寵物", "狗", "貓", "寵物用品", "寵物食品"]
-            }
+            clean_text = text
+            for pattern in ITEM_CLEANUP_PATTERNS:
+                clean_text = pattern.sub('', clean_text)
             
-            # 嘗試從文本中識別項目類型
-            item_type = None
-            for category, keywords in common_expense_items.items():
-                if any(keyword in clean_text for keyword in keywords):
-                    item_type = category
-                    break
+            # 嘗試從文本中識別項目類型（常見的消費場景）
+            item_type = KEYWORD_MATCHER.scan(clean_text).first("common_item")
             
             # 移除額外的空格並取得項目名稱
-            item = re.sub(r'\s+', ' ', clean_text).strip()
+            item = WHITESPACE_RE.sub(' ', clean_text).strip()
             
             # 如果項目為空，但找到了類型，則使用類型作為項目
             if not item and item_type:
@@ -221,7 +461,7 @@ class TextParser:
             
             # 提取分類（如果有指定）
             category = None
-            category_match = re.search(r'\[(.*?)\]', text)
+            category_match = CATEGORY_TAG_RE.search(text)
             if category_match:
                 category = category_match.group(1)
             else:
@@ -231,39 +471,23 @@ class TextParser:
                 # 否則，嘗試從項目中推斷分類
                 else:
                     if transaction_type == "expense":
-                        for cat, keywords in self.expense_categories_mapping.items():
-                            if any(keyword in text for keyword in keywords):
-                                category = cat
-                                break
+                        category = hits.first("expense_category")
                     else:  # income
-                        for cat, keywords in self.income_categories_mapping.items():
-                            if any(keyword in text for keyword in keywords):
-                                category = cat
-                                break
+                        category = hits.first("income_category")
             
             # 提取帳戶（如果有）
             account = None
-            account_match = re.search(r'<(.*?)>', text)
+            account_match = ACCOUNT_TAG_RE.search(text)
             if account_match:
                 account = account_match.group(1)
             else:
                 # 更全面的帳戶提取邏輯
-                account_patterns = [
-                    # 直接提及帳戶："使用/用XX帳戶/卡/支付"
-                    r'(?:使用|用|透過|經由|從)\s*([\w\s]+?)(?:帳戶|卡|支付)',
-                    # 提及支付方式："用XX付款/支付"
-                    r'(?:用|透過|使用)\s*([\w\s]+?)(?:付款|支付|付|刷|買)'
-                ]
-                
-                for pattern in account_patterns:
-                    acc_match = re.search(pattern, text)
+                for pattern in ACCOUNT_PATTERNS:
+                    acc_match = pattern.search(text)
                     if acc_match:
                         potential_account = acc_match.group(1).strip()
-                        # 檢查是否與已知帳戶類型匹配
-                        for acc_type, keywords in self.account_mapping.items():
-                            if any(keyword.lower() in potential_account.lower() for keyword in keywords):
-                                account = acc_type
-                                break
+                        # 檢查是否與已知帳戶類型匹配（不分大小寫）
+                        account = ACCOUNT_MATCHER_LOWER.scan(potential_account.lower()).first("account")
                         # 如果沒有匹配到已知類型，直接使用提取的文本
                         if not account:
                             account = potential_account
@@ -271,21 +495,18 @@ class TextParser:
                 
                 # 如果上述模式未匹配，嘗試從文本中尋找已知的帳戶關鍵詞
                 if not account:
-                    for acc, keywords in self.account_mapping.items():
-                        if any(keyword in text for keyword in keywords):
-                            account = acc
-                            break
+                    account = hits.first("account")
             
             # 提取日期（如果有）
-            date_match = re.search(r'@(.*?)(?:\s|$)', text)
+            date_match = DATE_TAG_RE.search(text)
             if date_match:
                 date_text = date_match.group(1)
                 if date_text == "今天":
-                    date = datetime.now().strftime('%Y-%m-%d')
+                    date = _now().strftime('%Y-%m-%d')
                 elif date_text == "昨天":
-                    date = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+                    date = (_now() - timedelta(days=1)).strftime('%Y-%m-%d')
                 elif date_text == "前天":
-                    date = (datetime.now() - timedelta(days=2)).strftime('%Y-%m-%d')
+                    date = (_now() - timedelta(days=2)).strftime('%Y-%m-%d')
                 else:
                     # 嘗試解析其他日期格式
                     try:
@@ -293,7 +514,7 @@ class TextParser:
                             parts = date_text.split('/')
                             if len(parts) == 2:
                                 month, day = parts
-                                year = datetime.now().year
+                                year = _now().year
                             else:
                                 year, month, day = parts
                             date = f"{year}-{month.zfill(2)}-{day.zfill(2)}"
@@ -301,52 +522,42 @@ class TextParser:
                             parts = date_text.split('-')
                             if len(parts) == 2:
                                 month, day = parts
-                                year = datetime.now().year
+                                year = _now().year
                             else:
                                 year, month, day = parts
                             date = f"{year}-{month.zfill(2)}-{day.zfill(2)}"
                         else:
-                            date = datetime.now().strftime('%Y-%m-%d')
+                            date = _now().strftime('%Y-%m-%d')
                     except:
-                        date = datetime.now().strftime('%Y-%m-%d')
+                        date = _now().strftime('%Y-%m-%d')
             else:
-                # 嘗試從文本中識別日期提示
-                if "今天" in text:
-                    date = datetime.now().strftime('%Y-%m-%d')
-                elif "昨天" in text:
-                    date = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-                elif "前天" in text:
-                    date = (datetime.now() - timedelta(days=2)).strftime('%Y-%m-%d')
+                # 嘗試從文本中識別日期提示（今天、昨天、前天）
+                days_ago = hits.first("relative_day")
+                if days_ago is not None:
+                    date = (_now() - timedelta(days=days_ago)).strftime('%Y-%m-%d')
                 else:
                     # 尋找形如"4月1日"或"4/1"或"昨天"的日期表達
-                    date_patterns = [
-                        r'(\d{1,2})(?:月|\/|-)(\d{1,2})(?:日|號)?',  # 4月1日, 4/1, 4-1
-                        r'(\d{4})(?:年)(\d{1,2})(?:月|\/|-)(\d{1,2})(?:日|號)?',  # 2023年4月1日, 2023/4/1
-                        r'(今天|昨天|前天)',  # 今天, 昨天, 前天
-                        r'(?:上個?|這個?|下個?)?(星期|週|周)([一二三四五六日天])'  # 上週一, 這週二, 下週三
-                    ]
-
-                    for pattern in date_patterns:
-                        date_match = re.search(pattern, text)
+                    for pattern, kind in DATE_PATTERNS:
+                        date_match = pattern.search(text)
                         if date_match:
-                            if pattern == r'(\d{1,2})(?:月|\/|-)(\d{1,2})(?:日|號)?':
+                            if kind == "month_day":
                                 month, day = date_match.groups()
-                                year = datetime.now().year
+                                year = _now().year
                                 date = f"{year}-{month.zfill(2)}-{day.zfill(2)}"
-                            elif pattern == r'(\d{4})(?:年)(\d{1,2})(?:月|\/|-)(\d{1,2})(?:日|號)?':
+                            elif kind == "year_month_day":
                                 year, month, day = date_match.groups()
                                 date = f"{year}-{month.zfill(2)}-{day.zfill(2)}"
-                            elif pattern == r'(今天|昨天|前天)':
+                            elif kind == "relative":
                                 day_text = date_match.group(1)
                                 days_offset = {"今天": 0, "昨天": 1, "前天": 2}.get(day_text, 0)
-                                date = (datetime.now() - timedelta(days=days_offset)).strftime('%Y-%m-%d')
-                            elif pattern == r'(?:上個?|這個?|下個?)?(星期|週|周)([一二三四五六日天])':
+                                date = (_now() - timedelta(days=days_offset)).strftime('%Y-%m-%d')
+                            elif kind == "weekday":
                                 week_prefix, weekday_text = date_match.groups() if date_match.groups()[0] else ("這", date_match.groups()[1])
                                 weekday_mapping = {"一": 0, "二": 1, "三": 2, "四": 3, "五": 4, "六": 5, "日": 6, "天": 6}
                                 target_weekday = weekday_mapping.get(weekday_text, 0)
                                 
                                 # 獲取當前日期的星期幾 (0-6, 0表示星期一)
-                                current_weekday = datetime.now().weekday()
+                                current_weekday = _now().weekday()
                                 
                                 # 計算目標日期與當前日期的差距
                                 delta_days = 0
@@ -365,10 +576,10 @@ class TextParser:
                                 elif delta_days > 7:
                                     delta_days -= 7
                                 
-                                date = (datetime.now() + timedelta(days=delta_days)).strftime('%Y-%m-%d')
+                                date = (_now() + timedelta(days=delta_days)).strftime('%Y-%m-%d')
                             break
                     else:
-                        date = datetime.now().strftime('%Y-%m-%d')
+                        date = _now().strftime('%Y-%m-%d')
             
             # 處理金額為負值的特殊情況
             if transaction_type == "expense":
@@ -464,7 +675,7 @@ class TextParser:
     
     def _parse_reminder_time(self, time_part, full_text):
         """解析提醒時間"""
-        now = datetime.now()
+        now = _now()
         reminder_time = now
         
         # 如果沒有具體時間，默認設置為明天早上9點
@@ -558,34 +769,30 @@ class TextParser:
         
         return reminder_time.strftime('%Y-%m-%d %H:%M:%S')
     
-    def _parse_query(self, text):
-        """解析查詢操作"""
+    def _parse_query(self, text, hits=None):
+        """解析查詢操作
+        
+        Args:
+            text: 用戶輸入
+            hits: parse_text 已掃描的關鍵詞命中結果，未提供時重新掃描
+        """
         try:
-            # 檢查是否是查詢指令
-            query_keywords = ["查詢", "查看", "顯示", "統計", "報表", "多少", "花費", "花了", "記錄", "支出", "收入", "一共", "共計", "總共"]
-            is_query = any(keyword in text for keyword in query_keywords)
+            if hits is None:
+                hits = KEYWORD_MATCHER.scan(text)
             
-            if not is_query:
+            # 檢查是否是查詢指令
+            if not hits.any("query"):
                 return None
             
-            # 查詢類型
-            query_type = "expense"  # 預設查詢支出
-            if any(keyword in text for keyword in ["收入", "賺", "賺了", "獲得", "收到"]):
-                query_type = "income"
-            elif any(keyword in text for keyword in ["提醒", "待辦", "代辦", "行程", "活動"]):
-                query_type = "reminder"
-            elif any(keyword in text for keyword in ["餘額", "結餘", "剩餘", "帳戶"]):
-                query_type = "balance"
-            elif any(keyword in text for keyword in ["總覽", "概況", "彙總", "匯總", "所有"]):
-                query_type = "overview"
+            # 查詢類型（依 QUERY_TYPES 的順序，第一個命中的類型勝出）
+            query_type = hits.first("query_type") or "expense"  # 預設查詢支出
             
             # 時間範圍
             time_range = "month"  # 預設查詢本月
             time_value = "current"
             
             # 特定日期模式
-            specific_date_pattern = r'(\d{4})[/\-年]?(\d{1,2})[/\-月]?(\d{1,2})?[日號]?'
-            specific_date_match = re.search(specific_date_pattern, text)
+            specific_date_match = QUERY_DATE_RE.search(text)
             
             if specific_date_match:
                 year = int(specific_date_match.group(1))
@@ -600,62 +807,13 @@ class TextParser:
                     time_value = f"{year}-{month:02d}"
             else:
                 # 相對日期描述
-                if any(keyword in text for keyword in ["今天", "本日", "當日"]):
-                    time_range = "day"
-                    time_value = "current"
-                elif any(keyword in text for keyword in ["昨天", "昨日", "前一天"]):
-                    time_range = "day"
-                    time_value = "previous"
-                elif any(keyword in text for keyword in ["本週", "這週", "本周", "這周", "當週"]):
-                    time_range = "week"
-                    time_value = "current"
-                elif any(keyword in text for keyword in ["上週", "上个週", "前一週", "上周", "前一周"]):
-                    time_range = "week"
-                    time_value = "previous"
-                elif any(keyword in text for keyword in ["本月", "這個月", "當月", "這月"]):
-                    time_range = "month"
-                    time_value = "current"
-                elif any(keyword in text for keyword in ["上個月", "上月", "前一月", "前月"]):
-                    time_range = "month"
-                    time_value = "previous"
-                elif any(keyword in text for keyword in ["今年", "本年", "這一年"]):
-                    time_range = "year"
-                    time_value = "current"
-                elif any(keyword in text for keyword in ["去年", "上一年", "前一年"]):
-                    time_range = "year"
-                    time_value = "previous"
-            
-            # 提取可能的分類
-            category = None
-            categories = {
-                "飲食": ["飲食", "餐廳", "餐飲", "吃飯", "早餐", "午餐", "晚餐", "宵夜", "食物", "小吃"],
-                "交通": ["交通", "車費", "油費", "停車費", "計程車", "高鐵", "火車", "捷運", "公車", "機票"],
-                "購物": ["購物", "服飾", "衣服", "鞋子", "包包", "電子產品", "家電", "日用品"],
-                "娛樂": ["娛樂", "電影", "遊戲", "音樂", "演唱會", "旅遊", "旅行", "度假"],
-                "醫療": ["醫療", "醫院", "診所", "藥品", "牙醫", "看病", "健保"],
-                "教育": ["教育", "學費", "書籍", "文具", "課程", "補習", "學習"],
-                "居家": ["居家", "房租", "水電", "網路費", "家具", "家居", "租金", "管理費"],
-                "其他": ["其他", "雜項", "雜費", "未分類"]
-            }
-            
-            for cat, keywords in categories.items():
-                if any(keyword in text for keyword in keywords):
-                    category = cat
-                    break
+                relative_range = hits.first("query_time")
+                if relative_range:
+                    time_range, time_value = relative_range
             
-            # 提取可能的帳戶
-            account = None
-            accounts = {
-                "現金": ["現金", "零用金", "錢包"],
-                "銀行卡": ["銀行卡", "金融卡", "提款卡", "儲蓄卡"],
-                "信用卡": ["信用卡", "卡費", "刷卡"],
-                "行動支付": ["行動支付", "電子支付", "支付寶", "微信支付", "Apple Pay", "Google Pay", "街口支付", "Line Pay"]
-            }
-            
-            for acc, keywords in accounts.items():
-                if any(keyword in text for keyword in keywords):
-                    account = acc
-                    break
+            # 提取可能的分類與帳戶
+            category = hits.first("query_category")
+            account = hits.first("query_account")
             
             # 返回結構化數據
             return {
@@ -680,4 +838,10 @@ class TextParser:
                 "message": message,
                 "keywords": []
             }
-        } 
\ No newline at end of file
+        } 
+
+
+def _parse_item(args):
+    """進程池中解析一則訊息（每個進程使用自己的共用解析器）"""
+    item, now = args
+    return next(TextParser.shared().parse_iter([item], now))
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+"""
+大量推送 LINE 訊息
+
+熱門的共同提醒（例如「繳費日」）會在同一分鐘推送給上千位用戶。BulkPusher 把內容相同的
+訊息（同一時間、同一標題的提醒卡片與相同的提醒列表）合併成 multicast 請求（每次最多 500 位收件者），
+只有一位收件者時使用 push。
+每個請求最多 5 則訊息，超過時分成多個請求。
+
+請求由執行緒池並行送出，並以權杖桶限制每秒的請求數；429、5xx 與連線錯誤以指數退避重試，
+每個請求的所有嘗試使用同一個 X-Line-Retry-Key，LINE 端已接受的請求不會因重試而重複推送。
+"""
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from linebot.v3.messaging import PushMessageRequest, MulticastRequest
+
+from parsers.resilience import backoff_delay
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO if os.environ.get('LOG_LEVEL') != 'debug' else logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# LINE Messaging API 的限制
+MULTICAST_MAX_RECIPIENTS = 500
+MAX_MESSAGES_PER_REQUEST = 5
+
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+# 相同 X-Line-Retry-Key 的請求已被接受
+ALREADY_ACCEPTED_STATUS = 409
+
+
+def payload_key(messages):
+    """訊息內容的比較鍵，內容相同的訊息可以合併成一個 multicast 請求"""
+    return tuple(message.to_json() for message in messages)
+
+
+def is_retryable(error):
+    """暫時性錯誤（限流、伺服器錯誤、連線中斷）才重試"""
+    status = getattr(error, 'status', None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return isinstance(error, OSError) or type(error).__module__.startswith('urllib3')
+
+
+class RateLimiter:
+    """權杖桶：平均每秒 rate 個請求，最多累積 burst 個"""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, self.rate))
+        self._tokens = self.burst
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取得一個權杖，必要時等待，返回等待的秒數"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # 先扣除再等待：同時呼叫的執行緒依序排在後面
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+
+class BulkPusher:
+    """合併相同內容、限流並行送出的 LINE 推送"""
+
+    def __init__(self, line_bot_api, rate=None, workers=None, max_retries=None):
+        """
+        Args:
+            line_bot_api: LINE MessagingApi
+            rate: 每秒最多送出的請求數，None 時讀取 LINE_PUSH_RATE（0 表示不限制）
+            workers: 並行送出的執行緒數，None 時讀取 LINE_PUSH_WORKERS
+            max_retries: 暫時性錯誤的重試次數，None 時讀取 LINE_PUSH_RETRIES
+        """
+        self.line_bot_api = line_bot_api
+        rate = rate if rate is not None else float(os.environ.get('LINE_PUSH_RATE', '100'))
+        self.limiter = RateLimiter(rate)
+        self.workers = max(1, workers if workers is not None else int(os.environ.get('LINE_PUSH_WORKERS', '4')))
+        self.max_retries = max_retries if max_retries is not None else int(os.environ.get('LINE_PUSH_RETRIES', '3'))
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "recipients": 0,
+            "requests": 0,
+            "push_requests": 0,
+            "multicast_requests": 0,
+            "retries": 0,
+            "failed_requests": 0,
+            "throttled_ms": 0.0
+        }
+
+    def _pool(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='line-push')
+            return self._executor
+
+    def plan(self, deliveries):
+        """把 [(收件者, 訊息列表)] 合併成請求 [(收件者列表, 訊息列表)]"""
+        groups = {}
+        for recipient, messages in deliveries:
+            key = payload_key(messages)
+            if key not in groups:
+                groups[key] = (list(messages), [])
+            groups[key][1].append(recipient)
+
+        requests = []
+        for messages, recipients in groups.values():
+            for start in range(0, len(recipients), MULTICAST_MAX_RECIPIENTS):
+                chunk = recipients[start:start + MULTICAST_MAX_RECIPIENTS]
+                for offset in range(0, len(messages), MAX_MESSAGES_PER_REQUEST):
+                    requests.append((chunk, messages[offset:offset + MAX_MESSAGES_PER_REQUEST]))
+        return requests
+
+    def send(self, deliveries):
+        """送出所有訊息，返回 {收件者: 錯誤訊息}（只包含失敗的收件者）"""
+        requests = self.plan(deliveries)
+        if not requests:
+            return {}
+
+        pool = self._pool()
+        futures = [(recipients, pool.submit(self._send_request, recipients, messages))
+                   for recipients, messages in requests]
+
+        errors = {}
+        for recipients, future in futures:
+            error = future.result()
+            if error is not None:
+                for recipient in recipients:
+                    errors.setdefault(recipient, error)
+
+        with self._stats_lock:
+            self.stats["recipients"] += len(deliveries)
+        return errors
+
+    def _send_request(self, recipients, messages):
+        """送出一個請求，暫時性錯誤時重試，成功返回 None，失敗返回錯誤訊息"""
+        retry_key = str(uuid.uuid4())
+        attempt = 0
+        while True:
+            waited = self.limiter.acquire()
+            try:
+                self._call(recipients, messages, retry_key)
+                error = None
+            except Exception as e:
+                error = e
+            if error is not None and getattr(error, 'status', None) == ALREADY_ACCEPTED_STATUS:
+                # 先前的嘗試已被接受（例如回應逾時），不算失敗
+                error = None
+
+            with self._stats_lock:
+                self.stats["requests"] += 1
+                self.stats["multicast_requests" if len(recipients) > 1 else "push_requests"] += 1
+                self.stats["throttled_ms"] += waited * 1000
+                if error is not None and attempt < self.max_retries and is_retryable(error):
+                    self.stats["retries"] += 1
+                elif error is not None:
+                    self.stats["failed_requests"] += 1
+
+            if error is None:
+                return None
+            if attempt >= self.max_retries or not is_retryable(error):
+                message = str(error)[:500]
+                logger.error(f"推送給 {len(recipients)} 位收件者失敗: {message}")
+                return message
+            attempt += 1
+            time.sleep(backoff_delay(attempt))
+
+    def _call(self, recipients, messages, retry_key):
+        if len(recipients) == 1:
+            return self.line_bot_api.push_message_with_http_info(
+                PushMessageRequest(to=recipients[0], messages=messages),
+                x_line_retry_key=retry_key
+            )
+        return self.line_bot_api.multicast_with_http_info(
+            MulticastRequest(to=recipients, messages=messages),
+            x_line_retry_key=retry_key
+        )
+
+    def status(self):
+        """返回推送統計"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["throttled_ms"] = round(stats["throttled_ms"], 1)
+        return {"rate": self.limiter.rate, "workers": self.workers, **stats}
+
+    def close(self):
+        """關閉執行緒池"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
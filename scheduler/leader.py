@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""
+以 SQLite 租約選出唯一的排程器
+
+webhook 的每個 worker 與獨立的排程器進程都會啟動 ReminderScheduler。
+所有進程共用 scheduler_leases 中的一筆租約：持有者每 renew_interval 秒續約一次，
+其餘進程待命並以相同間隔嘗試取得；持有者停止續約（進程中斷）超過 ttl 秒後，
+待命的進程即可接手。
+"""
+import os
+import time
+import uuid
+import socket
+import logging
+import threading
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO if os.environ.get('LOG_LEVEL') != 'debug' else logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def make_holder_id():
+    """返回這個實例的唯一識別：主機名稱、進程 ID 與隨機後綴（同一進程中的多個實例也不會相同）"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaderLease:
+    """租約式的領導者選舉"""
+
+    def __init__(self, db, name='reminder_scheduler', holder=None, ttl=None, renew_interval=None):
+        """
+        Args:
+            db: DatabaseUtils 實例
+            name: 租約名稱，同名的實例互相競爭
+            holder: 持有者識別，預設由 make_holder_id() 產生
+            ttl: 租約有效秒數，None 時讀取 SCHEDULER_LEASE_TTL
+            renew_interval: 續約與待命時嘗試取得的間隔，None 時讀取 SCHEDULER_LEASE_RENEW（預設 ttl 的三分之一）
+        """
+        self.db = db
+        self.name = name
+        self.holder = holder or make_holder_id()
+        self.ttl = ttl if ttl is not None else float(os.environ.get('SCHEDULER_LEASE_TTL', '15'))
+        if renew_interval is None:
+            renew_interval = float(os.environ.get('SCHEDULER_LEASE_RENEW', str(self.ttl / 3)))
+        self.renew_interval = renew_interval
+        self.term = None
+        # 上一次嘗試是否取得租約；本地到期時間已過但尚未被接手時，續約仍算同一任期
+        self._holding = False
+        self._expires_at = 0.0
+        self._next_attempt = 0.0
+        self._lock = threading.Lock()
+        self.stats = {
+            "acquired": 0,
+            "renewed": 0,
+            "lost": 0,
+            "errors": 0
+        }
+
+    def is_leader(self, now=None):
+        """目前是否持有未過期的租約（以本地記錄的到期時間判斷，不查詢資料庫）"""
+        now = now if now is not None else time.time()
+        return now < self._expires_at
+
+    def maintain(self, now=None):
+        """到了續約時間就續約，待命時嘗試取得租約，返回目前是否為領導者"""
+        now = now if now is not None else time.time()
+        with self._lock:
+            if now < self._next_attempt:
+                return self.is_leader(now)
+
+            try:
+                term = self.db.acquire_lease(self.name, self.holder, now, self.ttl)
+            except Exception as e:
+                # 資料庫暫時無法寫入：保留尚未過期的租約，稍後再試
+                self.stats["errors"] += 1
+                logger.warning(f"續約 {self.name} 租約失敗: {str(e)}")
+                self._next_attempt = now + min(1.0, self.renew_interval)
+                return self.is_leader(now)
+
+            self._next_attempt = now + self.renew_interval
+            if term is not None:
+                if not self._holding or term != self.term:
+                    self.stats["acquired"] += 1
+                    logger.info(f"取得 {self.name} 租約（term {term}），由 {self.holder} 負責排程")
+                else:
+                    self.stats["renewed"] += 1
+                self.term = term
+                self._holding = True
+                self._expires_at = now + self.ttl
+            elif self._holding:
+                self.stats["lost"] += 1
+                self._holding = False
+                self._expires_at = 0.0
+                logger.warning(f"{self.holder} 已失去 {self.name} 租約，轉為待命")
+            return self.is_leader(now)
+
+    def seconds_until_next_attempt(self, now=None):
+        """距離下一次續約或嘗試取得的秒數"""
+        now = now if now is not None else time.time()
+        return max(0.0, self._next_attempt - now)
+
+    def release(self):
+        """釋放租約（正常停止時呼叫），讓待命的進程立即接手"""
+        with self._lock:
+            if not self._holding:
+                return
+            self._holding = False
+            self._expires_at = 0.0
+            try:
+                self.db.release_lease(self.name, self.holder)
+                logger.info(f"已釋放 {self.name} 租約")
+            except Exception as e:
+                logger.warning(f"釋放 {self.name} 租約失敗: {str(e)}")
+
+    def status(self):
+        """返回租約狀態"""
+        now = time.time()
+        return {
+            "holder": self.holder,
+            "is_leader": self.is_leader(now),
+            "term": self.term,
+            "expires_in": round(max(0.0, self._expires_at - now), 1),
+            **self.stats
+        }
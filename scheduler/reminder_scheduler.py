@@ -1,17 +1,22 @@
 #!/usr/bin/env python
 import os
+import json
+import heapq
 import logging
+import itertools
 import time
 from datetime import datetime, timedelta
 import threading
-import schedule
 
 # 更新LINE Bot SDK導入
 from linebot.v3.messaging import (
     ApiClient, MessagingApi, Configuration,
-    TextMessage, FlexMessage, PushMessageRequest
+    TextMessage, FlexMessage, FlexContainer
 )
-from database.db_utils import DatabaseUtils
+from database.db_utils import DatabaseUtils, reminder_title_key
+from database.timeutil import local_now, from_timestamp
+from scheduler.leader import LeaderLease
+from scheduler.delivery import BulkPusher, MAX_MESSAGES_PER_REQUEST
 
 # 設置日誌
 logging.basicConfig(
@@ -21,10 +26,36 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class ReminderScheduler:
-    """提醒排程器，負責檢查並發送即將到期的提醒"""
+    """提醒排程器，在每個提醒的觸發時間（due_date - remind_before）發送通知
     
-    def __init__(self, line_bot_api=None, db=None):
-        """初始化排程器"""
+    即將觸發的提醒依觸發時間放在記憶體中的最小堆積，排程執行緒睡到下一個觸發時間為止。
+    提醒時間是 APP_TIMEZONE（預設台灣時間）的本地時間，與伺服器的系統時區無關。
+    提醒的任何變動都會在 reminder_changes 寫入一筆記錄；執行緒每隔 poll_interval 秒（預設與續約間隔相同）
+    讀取新的記錄（主鍵範圍查詢），只重新讀取變動過的提醒並更新堆積，閒置時幾乎不查詢資料庫。
+    同一進程中的提醒變動以 wake() 通知，立即讀取變動記錄，不必等待下一次檢查。
+    只有載入範圍用完、剛取得租約或變動太多時才重新載入未來 window 內的所有提醒。
+    
+    每次觸發的發送狀態保存在 reminder_deliveries：發送前先原子地認領，
+    已發送的觸發不會重複推送，進程重啟或多個進程同時運行時也一樣。
+    
+    多個進程（例如 webhook 的每個 worker）都啟動排程器時，只有持有 scheduler_leases 租約的
+    領導者載入與發送提醒，其餘進程只定期嘗試取得租約；領導者中斷後由其中一個接手。
+    
+    同一次檢查中到期的提醒交由 BulkPusher 一起送出：內容相同的通知（同一時間、同一標題的
+    共同提醒）合併成 multicast 請求，並在限流下並行發送。
+    """
+    
+    def __init__(self, line_bot_api=None, db=None, window=None, poll_interval=None, catchup=None, lease=None,
+                 pusher=None):
+        """初始化排程器
+        
+        Args:
+            window: 每次載入的時間範圍（秒），None 時讀取 REMINDER_WINDOW_SECONDS
+            poll_interval: 檢查提醒變動的間隔（秒），None 時讀取 REMINDER_VERSION_POLL，未設定時與續約間隔相同
+            catchup: 補發到期時間在多久以內、但尚未發送的提醒（秒），None 時讀取 REMINDER_CATCHUP_SECONDS
+            lease: 決定由哪個進程發送的 LeaderLease，None 時以同一個資料庫建立
+            pusher: 送出通知的 BulkPusher，None 時以 line_bot_api 建立
+        """
         if line_bot_api is None:
             # 創建API客戶端
             configuration = Configuration(
@@ -36,8 +67,47 @@ class ReminderScheduler:
             self.line_bot_api = line_bot_api
             
         self.db = db or DatabaseUtils()
+        self.pusher = pusher or BulkPusher(self.line_bot_api)
         self.is_running = False
         self.scheduler_thread = None
+        self.was_leader = False
+        
+        self.window = timedelta(seconds=window if window is not None else
+                                float(os.environ.get('REMINDER_WINDOW_SECONDS', '21600')))
+        self.catchup = timedelta(seconds=catchup if catchup is not None else
+                                 float(os.environ.get('REMINDER_CATCHUP_SECONDS', '60')))
+        
+        # 發送失敗時最多嘗試的次數、兩次嘗試間的基本間隔，以及認領後多久未完成視為進程已中斷
+        self.max_attempts = int(os.environ.get('REMINDER_MAX_ATTEMPTS', '3'))
+        self.retry_delay = float(os.environ.get('REMINDER_RETRY_SECONDS', '30'))
+        self.claim_timeout = float(os.environ.get('REMINDER_CLAIM_TIMEOUT', '60'))
+        # 載入時每次查詢讀取的提醒數；一次檢查中的變動記錄超過此數時改為重新載入
+        self.fetch_chunk = int(os.environ.get('REMINDER_FETCH_CHUNK', '1000'))
+        self.lease = lease or LeaderLease(self.db)
+        self.owner = self.lease.holder
+        self.poll_interval = poll_interval if poll_interval is not None else \
+            float(os.environ.get('REMINDER_VERSION_POLL', str(self.lease.renew_interval)))
+        
+        # (發送時間, 提醒 ID, 序號, 提醒資料) 的最小堆積
+        self._heap = []
+        self._sequence = itertools.count()
+        self._change_cursor = None
+        self._loaded_until = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        # 下一次讀取變動記錄的時間（time.monotonic()）；wake() 時立即讀取
+        self._next_poll = 0.0
+        self._poll_requested = False
+        self.stats = {
+            "loads": 0,
+            "change_checks": 0,
+            "changed_reminders": 0,
+            "fired": 0,
+            "sent": 0,
+            "failed": 0,
+            "claimed_elsewhere": 0,
+            "max_lateness_ms": 0.0
+        }
         
         # 定義顏色
         self.colors = {
@@ -57,12 +127,11 @@ class ReminderScheduler:
         
         logger.info("正在啟動提醒排程器...")
         self.is_running = True
-        
-        # 設置排程任務
-        schedule.every(5).minutes.do(self.check_reminders)
+        self._wakeup.clear()
         
         # 創建並啟動排程線程
-        self.scheduler_thread = threading.Thread(target=self._run_scheduler)
+        self.was_leader = False
+        self.scheduler_thread = threading.Thread(target=self._run_scheduler, name='reminder-scheduler')
         self.scheduler_thread.daemon = True
         self.scheduler_thread.start()
         
@@ -75,64 +144,248 @@ class ReminderScheduler:
         
         logger.info("正在停止提醒排程器...")
         self.is_running = False
+        self._wakeup.set()
         if self.scheduler_thread:
             self.scheduler_thread.join(timeout=10)
+        self.lease.release()
+        self.pusher.close()
         
         logger.info("提醒排程器已停止")
     
+    def wake(self):
+        """提醒有變動時立即讀取變動記錄，不等待下一次變動檢查"""
+        self._poll_requested = True
+        self._wakeup.set()
+    
     def _run_scheduler(self):
-        """運行排程器線程"""
+        """運行排程器線程：持有租約時處理到期的提醒，睡到下一個觸發時間、變動檢查或續約時間"""
         while self.is_running:
-            schedule.run_pending()
-            time.sleep(1)
+            leader = self.lease.maintain()
+            if leader != self.was_leader:
+                self._on_leadership_change(leader)
+            try:
+                if leader:
+                    poll = self._poll_requested or time.monotonic() >= self._next_poll
+                    if poll:
+                        self._poll_requested = False
+                        self._next_poll = time.monotonic() + self.poll_interval
+                    self.check_reminders(poll=poll)
+            except Exception as e:
+                logger.error(f"排程器執行時發生錯誤: {str(e)}")
+            self._wakeup.wait(self._seconds_until_next(local_now(), leader))
+            self._wakeup.clear()
+    
+    def _on_leadership_change(self, leader):
+        """成為領導者時從資料庫重新載入；失去租約時丟棄記憶體中的排程，交由新的領導者發送"""
+        self.was_leader = leader
+        with self._lock:
+            self._heap = []
+            self._change_cursor = None
+            self._loaded_until = None
+        if leader:
+            logger.info("取得排程租約，開始發送提醒")
+        else:
+            logger.info("未持有排程租約，暫停發送提醒")
+    
+    def _seconds_until_next(self, now, leader=True):
+        """距離下一個觸發時間、變動檢查、載入範圍結束或續約時間的秒數"""
+        wait = self.lease.seconds_until_next_attempt()
+        if not leader:
+            return wait
+        until_poll = max(0.0, self._next_poll - time.monotonic())
+        deadlines = [now + timedelta(seconds=min(until_poll, wait))]
+        with self._lock:
+            if self._heap:
+                deadlines.append(self._heap[0][0])
+            if self._loaded_until is not None:
+                deadlines.append(self._loaded_until)
+        return max(0.0, (min(deadlines) - now).total_seconds())
     
-    def check_reminders(self):
-        """檢查即將到期的提醒並發送通知"""
-        logger.info("正在檢查即將到期的提醒...")
+    def check_reminders(self, now=None, poll=True):
+        """發送觸發時間已到的提醒，返回成功發送的提醒數
         
-        try:
-            # 獲取未來1小時內即將到期的提醒
-            upcoming_reminders = self.db.get_upcoming_reminders(hours_ahead=1)
+        Args:
+            poll: 是否讀取變動記錄；排程執行緒只在變動檢查時間到了或被 wake() 時讀取
+        """
+        now = now or local_now()
+        with self._lock:
+            self._refresh(now, poll)
             
-            # 按用戶ID分組提醒
-            reminders_by_user = {}
-            for reminder in upcoming_reminders:
-                user_id = reminder["user_id"]
-                if user_id not in reminders_by_user:
-                    reminders_by_user[user_id] = []
-                reminders_by_user[user_id].append(reminder)
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                send_at, _, _, reminder = heapq.heappop(self._heap)
+                due.append(reminder)
+                lateness_ms = (now - send_at).total_seconds() * 1000
+                self.stats["max_lateness_ms"] = max(self.stats["max_lateness_ms"], round(lateness_ms, 1))
+            self.stats["fired"] += len(due)
+        
+        if not due:
+            return 0
+        
+        # 先認領再發送：已由其他進程發送或正在發送的觸發略過
+        timestamp = time.time()
+        reminders_by_user = {}
+        for reminder in due:
+            attempts = self.db.claim_reminder_delivery(
+                reminder["reminder_id"], reminder["fire_at"], reminder["user_id"], self.owner, timestamp,
+                max_attempts=self.max_attempts, stale_before=timestamp - self.claim_timeout
+            )
+            if attempts is None:
+                self.stats["claimed_elsewhere"] += 1
+                continue
+            reminder["delivery_attempts"] = attempts
+            reminders_by_user.setdefault(reminder["user_id"], []).append(reminder)
+        
+        sent = self._deliver(reminders_by_user) if reminders_by_user else 0
+        if sent:
+            logger.info(f"成功處理 {sent} 個提醒")
+        return sent
+    
+    def _deliver(self, reminders_by_user):
+        """一起發送所有用戶的提醒並記錄結果，返回成功發送的提醒數；失敗且還能重試的提醒稍後再次排入"""
+        now = local_now()
+        errors = self.pusher.send([
+            (user_id, self._build_messages(reminders, now))
+            for user_id, reminders in reminders_by_user.items()
+        ])
+        
+        timestamp = time.time()
+        sent = 0
+        retries = []
+        for user_id, reminders in reminders_by_user.items():
+            error = errors.get(user_id)
+            for reminder in reminders:
+                # 重試時間保存在資料庫，重新載入或由其他進程接手時仍遵守退避間隔
+                self.db.finish_reminder_delivery(
+                    reminder["reminder_id"], reminder["fire_at"], self.owner, timestamp, error=error,
+                    next_attempt_at=timestamp + self.retry_delay * reminder["delivery_attempts"]
+                )
             
-            # 為每個用戶發送提醒
-            for user_id, reminders in reminders_by_user.items():
-                self._send_reminders_to_user(user_id, reminders)
-                
-            if upcoming_reminders:
-                logger.info(f"成功處理 {len(upcoming_reminders)} 個提醒")
-            else:
-                logger.info("沒有找到即將到期的提醒")
-                
-        except Exception as e:
-            logger.error(f"檢查提醒時發生錯誤: {str(e)}")
+            if error is None:
+                sent += len(reminders)
+                logger.info(f"向用戶 {user_id} 發送 {len(reminders)} 個提醒")
+                # 如果是重複提醒，自動創建下一次提醒
+                for reminder in reminders:
+                    self._handle_repeating_reminder(reminder)
+                continue
+            
+            logger.error(f"向用戶 {user_id} 發送提醒時發生錯誤: {error}")
+            self.stats["failed"] += len(reminders)
+            retries.extend(reminder for reminder in reminders if reminder["delivery_attempts"] < self.max_attempts)
+        
+        self.stats["sent"] += sent
+        with self._lock:
+            for reminder in retries:
+                retry_at = from_timestamp(timestamp + self.retry_delay * reminder["delivery_attempts"])
+                heapq.heappush(self._heap, (retry_at, reminder["reminder_id"], next(self._sequence), reminder))
+        return sent
     
-    def _send_reminders_to_user(self, user_id, reminders):
-        """向用戶發送提醒通知"""
-        try:
-            if len(reminders) == 1:
-                # 單個提醒，發送詳細訊息
-                reminder = reminders[0]
-                self._send_single_reminder(user_id, reminder)
-            else:
-                # 多個提醒，發送列表
-                self._send_reminder_list(user_id, reminders)
-                
-        except Exception as e:
-            logger.error(f"向用戶 {user_id} 發送提醒時發生錯誤: {str(e)}")
+    def _refresh(self, now, poll=True):
+        """套用提醒變動記錄；載入範圍用完、尚未載入或變動太多時，重新載入即將觸發、尚未發送的提醒"""
+        if self._change_cursor is not None and self._loaded_until is not None and now < self._loaded_until:
+            if not poll:
+                return
+            changes = self.db.get_reminder_changes(self._change_cursor, limit=self.fetch_chunk + 1)
+            self.stats["change_checks"] += 1
+            if not changes:
+                return
+            if len(changes) <= self.fetch_chunk:
+                self._apply_changes(now, changes)
+                return
+        self._reload(now)
+    
+    def _due_query_args(self):
+        """載入提醒時的發送狀態條件"""
+        return dict(max_attempts=self.max_attempts, stale_before=time.time() - self.claim_timeout)
+    
+    def _add_to_heap(self, heap, rows):
+        """把查詢到的提醒放入堆積，並記錄新排入的觸發；發送失敗的觸發排在重試時間"""
+        heap.extend(
+            (self._send_at(row), row["reminder_id"], next(self._sequence), row)
+            for row in rows
+        )
+        self.db.schedule_reminder_deliveries(
+            [(row["reminder_id"], row["fire_at"], row["user_id"]) for row in rows if row["delivery_status"] is None],
+            time.time()
+        )
+    
+    @staticmethod
+    def _send_at(row):
+        fire_at = datetime.fromisoformat(row["fire_at"])
+        if row["delivery_status"] == 'failed' and row["delivery_next_attempt_at"] is not None:
+            return max(fire_at, from_timestamp(row["delivery_next_attempt_at"]))
+        return fire_at
+    
+    def _apply_changes(self, now, changes):
+        """只重新讀取變動過的提醒：先從堆積移除舊的排程，仍在載入範圍內的再放回去"""
+        changed = {change["reminder_id"] for change in changes}
+        heap = [entry for entry in self._heap if entry[1] not in changed]
+        rows = self.db.get_due_reminders_by_ids(
+            changed, self._loaded_until, now - self.catchup, **self._due_query_args()
+        )
+        self._add_to_heap(heap, rows)
+        heapq.heapify(heap)
+        
+        self._heap = heap
+        self._change_cursor = changes[-1]["change_id"]
+        self.db.prune_reminder_changes(self._change_cursor)
+        self.stats["changed_reminders"] += len(changed)
+    
+    def _reload(self, now):
+        """重新載入未來 window 內的提醒"""
+        # 先讀變動游標再載入：載入期間的變動會在下一次檢查時再套用一次
+        cursor = self.db.get_reminder_change_cursor()
+        until = now + self.window
+        heap = []
+        chunks = self.db.iter_due_reminders(
+            until, now - self.catchup, chunk_size=self.fetch_chunk, **self._due_query_args()
+        )
+        for rows in chunks:
+            self._add_to_heap(heap, rows)
+        heapq.heapify(heap)
+        
+        self._heap = heap
+        self._change_cursor = cursor
+        self._loaded_until = until
+        self.db.prune_reminder_changes(cursor)
+        self.stats["loads"] += 1
+    
+    def status(self):
+        """返回排程器狀態"""
+        with self._lock:
+            return {
+                "running": self.is_running,
+                "pending": len(self._heap),
+                "next_fire_at": self._heap[0][0].isoformat() if self._heap else None,
+                "change_cursor": self._change_cursor,
+                "lease": self.lease.status(),
+                "push": self.pusher.status(),
+                **self.stats
+            }
+    
+    def _build_messages(self, reminders, now):
+        """一位用戶的提醒通知：每個提醒一則卡片，一次請求放不下時改為一則列表"""
+        if len(reminders) <= MAX_MESSAGES_PER_REQUEST:
+            occurrences = [(reminder["title"], reminder["due_date"]) for reminder in reminders]
+            return [
+                self._reminder_card(reminder, now, shared=occurrences.count(occurrence) == 1)
+                for reminder, occurrence in zip(reminders, occurrences)
+            ]
+        return [self._reminder_list_message(reminders)]
     
-    def _send_single_reminder(self, user_id, reminder):
-        """發送單個提醒通知"""
+    def _reminder_card(self, reminder, now, shared=True):
+        """單個提醒的通知卡片
+        
+        按鈕以到期時間與標題雜湊識別提醒（postback 資料有 300 字元的上限，不能放入完整的標題），
+        同一時間、同一標題的共同提醒對所有用戶產生相同的訊息，可以合併成一個 multicast 請求。
+        同一用戶這次有多個相同標題、相同時間的提醒時（shared=False），按鈕改帶各自的提醒 ID。
+        """
         title = reminder["title"]
+        if shared:
+            target = {"due_date": reminder["due_date"], "title_key": reminder_title_key(title)}
+        else:
+            target = {"reminder_id": reminder["reminder_id"]}
         due_datetime = datetime.fromisoformat(reminder["due_date"])
-        now = datetime.now()
         delta = due_datetime - now
         minutes_left = int(delta.total_seconds() / 60)
         
@@ -198,7 +451,7 @@ class ReminderScheduler:
                         "action": {
                             "type": "postback",
                             "label": "完成",
-                            "data": f'{{"action":"complete_reminder","reminder_id":"{reminder["reminder_id"]}"}}'
+                            "data": json.dumps({"action": "complete_reminder", **target})
                         },
                         "style": "primary",
                         "color": self.colors["success"]
@@ -208,7 +461,7 @@ class ReminderScheduler:
                         "action": {
                             "type": "postback",
                             "label": "延後",
-                            "data": f'{{"action":"snooze_reminder","reminder_id":"{reminder["reminder_id"]}"}}'
+                            "data": json.dumps({"action": "snooze_reminder", **target})
                         },
                         "style": "primary",
                         "color": self.colors["info"],
@@ -218,23 +471,11 @@ class ReminderScheduler:
             }
         }
         
-        # 多個提醒情況下發送Flex訊息
-        flex_message = FlexMessage(alt_text="提醒通知", contents=bubble)
-        
-        # 使用新版SDK的方式發送推送訊息
-        self.line_bot_api.push_message_with_http_info(
-            PushMessageRequest(
-                to=user_id,
-                messages=[flex_message]
-            )
-        )
-        logger.info(f"向用戶 {user_id} 發送提醒：{title}")
-        
-        # 如果是重複提醒，自動創建下一次提醒
-        self._handle_repeating_reminder(reminder)
+        # contents 須為 FlexContainer，直接傳入 dict 時卡片內容會被丟棄
+        return FlexMessage(alt_text="提醒通知", contents=FlexContainer.from_dict(bubble))
     
-    def _send_reminder_list(self, user_id, reminders):
-        """發送提醒列表"""
+    def _reminder_list_message(self, reminders):
+        """多個提醒的列表訊息"""
         # 創建提醒列表訊息
         reminders_text = "您有以下提醒：\n\n"
         for i, reminder in enumerate(reminders, 1):
@@ -243,15 +484,7 @@ class ReminderScheduler:
             reminders_text += f"{i}. {title} - {due_datetime.strftime('%H:%M')}\n"
         
         reminders_text += "\n請點擊提醒查看詳情並設置完成。"
-        
-        # 使用新版SDK的方式發送推送訊息
-        self.line_bot_api.push_message_with_http_info(
-            PushMessageRequest(
-                to=user_id,
-                messages=[TextMessage(text=reminders_text)]
-            )
-        )
-        logger.info(f"向用戶 {user_id} 發送 {len(reminders)} 個提醒")
+        return TextMessage(text=reminders_text)
     
     def _handle_repeating_reminder(self, reminder):
         """處理重複提醒，創建下一次提醒"""
@@ -317,6 +550,7 @@ if __name__ == "__main__":
         exit(1)
     
     scheduler = ReminderScheduler()
+    scheduler.db.check_settings()
     scheduler.start()
     
     try:
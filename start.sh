@@ -16,6 +16,10 @@ ls -la
 # 將目錄添加到 PYTHONPATH
 export PYTHONPATH=$PYTHONPATH:/app
 
+# 套用尚未執行的資料庫遷移（資料庫位於掛載的 volume，需在啟動時執行）
+echo "執行資料庫遷移..."
+python /app/init_db.py
+
 # 執行主應用程序
 echo "啟動應用程序..."
 python /app/app.py
@@ -2096,20 +2096,17 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 });
 
+// 交易列表的 keyset 分頁狀態
+let transactionsNextCursor = null;
+let transactionsLoading = false;
+let transactionsObserver = null;
+
 /**
- * 載入交易記錄數據
+ * 構建交易記錄 API URL
+ * @param {string|null} cursor - 下一頁游標，第一頁為 null
+ * @returns {string} API URL
  */
-function loadTransactionsData() {
-    const transactionsBody = document.getElementById('transactions-body');
-    if (!transactionsBody) {
-        console.error('找不到交易記錄表格');
-        return;
-    }
-    
-    // 顯示載入中
-    transactionsBody.innerHTML = '<tr><td colspan="7" class="loading-text">載入中...</td></tr>';
-    
-    // 獲取篩選條件
+function buildTransactionsUrl(cursor) {
     const typeFilter = document.getElementById('transaction-type');
     const dateRangeFilter = document.getElementById('date-range');
     const startDateInput = document.getElementById('start-date');
@@ -2120,56 +2117,76 @@ function loadTransactionsData() {
     let startDate = startDateInput ? startDateInput.value : '';
     let endDate = endDateInput ? endDateInput.value : '';
     
-    // 構建API請求URL
     let apiUrl = `/api/transactions?type=${type}&date_range=${dateRange}`;
     
     if (dateRange === 'custom' && startDate && endDate) {
         apiUrl += `&start_date=${startDate}&end_date=${endDate}`;
     }
     
+    if (cursor) {
+        apiUrl += `&cursor=${encodeURIComponent(cursor)}`;
+    } else {
+        // 總筆數只在第一頁請求一次
+        apiUrl += '&include_total=1';
+    }
+    
+    return apiUrl;
+}
+
+/**
+ * 載入交易記錄數據（重新從第一頁開始）
+ */
+function loadTransactionsData() {
+    const transactionsBody = document.getElementById('transactions-body');
+    if (!transactionsBody) {
+        console.error('找不到交易記錄表格');
+        return;
+    }
+    
+    // 顯示載入中
+    transactionsBody.innerHTML = '<tr><td colspan="7" class="loading-text">載入中...</td></tr>';
+    transactionsNextCursor = null;
+    transactionsLoading = true;
+    
     // 獲取交易記錄數據
-    fetch(apiUrl)
+    fetch(buildTransactionsUrl(null))
         .then(response => response.json())
         .then(data => {
             if (!data.transactions || data.transactions.length === 0) {
                 transactionsBody.innerHTML = '<tr><td colspan="7" class="empty-text">沒有符合條件的交易記錄</td></tr>';
+                updatePagination(data.pagination);
                 return;
             }
             
-            // 渲染交易記錄
-            let html = '';
-            data.transactions.forEach(transaction => {
-                const date = transaction.date_formatted || transaction.date;
-                const type = transaction.type === 'expense' ? '支出' : '收入';
-                const category = transaction.category_name || '未分類';
-                const item = transaction.description || '';
-                const amount = formatCurrency(transaction.amount);
-                const account = transaction.account_name || '默認帳戶';
-                
-                html += `
-                <tr>
-                    <td>${date}</td>
-                    <td>${type}</td>
-                    <td>${category}</td>
-                    <td>${item}</td>
-                    <td>${amount}</td>
-                    <td>${account}</td>
-                    <td>
-                        <button onclick="showEditTransactionModal(${transaction.transaction_id})" class="edit-btn">編輯</button>
-                        <button onclick="deleteTransaction(${transaction.transaction_id})" class="delete-btn">刪除</button>
-                    </td>
-                </tr>
-                `;
-            });
-            
-            transactionsBody.innerHTML = html;
-            
-            // 更新分頁
-            updatePagination(data.pagination);
+            transactionsBody.innerHTML = '';
+            renderTransactions(data);
         })
         .catch(error => {
             console.error('載入交易記錄失敗:', error);
             transactionsBody.innerHTML = '<tr><td colspan="7" class="error-text">載入失敗: ' + error.message + '</td></tr>';
+        })
+        .finally(() => {
+            transactionsLoading = false;
+        });
+}
+
+/**
+ * 以游標載入下一頁並附加到列表後方（無限捲動）
+ */
+function loadMoreTransactions() {
+    if (transactionsLoading || !transactionsNextCursor) return;
+    
+    transactionsLoading = true;
+    fetch(buildTransactionsUrl(transactionsNextCursor))
+        .then(response => response.json())
+        .then(data => {
+            renderTransactions(data);
+        })
+        .catch(error => {
+            console.error('載入交易記錄失敗:', error);
+        })
+        .finally(() => {
+            transactionsLoading = false;
         });
 }
 
@@ -2180,78 +2197,48 @@ function loadTransactionsData() {
 function updatePagination(pagination) {
     if (!pagination) return;
     
-    const prevPageBtn = document.getElementById('prev-page');
-    const nextPageBtn = document.getElementById('next-page');
+    transactionsNextCursor = pagination.next_cursor || null;
+    
+    const loadMoreBtn = document.getElementById('load-more');
     const pageInfo = document.getElementById('page-info');
+    const transactionsBody = document.getElementById('transactions-body');
     
-    if (prevPageBtn && pageInfo && nextPageBtn) {
-        pageInfo.textContent = `第 ${pagination.current_page} 頁 / 共 ${pagination.total_pages} 頁`;
-        
-        prevPageBtn.disabled = !pagination.has_prev;
-        nextPageBtn.disabled = !pagination.has_next;
-        
-        prevPageBtn.onclick = pagination.has_prev ? () => {
-            // 切換到上一頁
-            const startDateInput = document.getElementById('start-date');
-            const endDateInput = document.getElementById('end-date');
-            
-            let apiUrl = `/api/transactions?page=${pagination.current_page - 1}`;
-            
-            if (startDateInput && startDateInput.value && endDateInput && endDateInput.value) {
-                apiUrl += `&start_date=${startDateInput.value}&end_date=${endDateInput.value}`;
-            }
-            
-            fetch(apiUrl)
-                .then(response => response.json())
-                .then(data => {
-                    // 重新渲染交易記錄
-                    renderTransactions(data);
-                })
-                .catch(error => {
-                    console.error('載入交易記錄失敗:', error);
-                });
-        } : null;
+    if (pageInfo) {
+        const loaded = transactionsBody ? transactionsBody.querySelectorAll('tr[data-transaction-id]').length : 0;
+        if (pagination.total_records !== undefined) {
+            pageInfo.dataset.total = pagination.total_records;
+        }
+        const total = pageInfo.dataset.total;
+        pageInfo.textContent = total !== undefined ? `已載入 ${loaded} / ${total} 筆` : `已載入 ${loaded} 筆`;
+    }
+    
+    if (loadMoreBtn) {
+        loadMoreBtn.hidden = !pagination.has_next;
+        loadMoreBtn.onclick = loadMoreTransactions;
         
-        nextPageBtn.onclick = pagination.has_next ? () => {
-            // 切換到下一頁
-            const startDateInput = document.getElementById('start-date');
-            const endDateInput = document.getElementById('end-date');
-            
-            let apiUrl = `/api/transactions?page=${pagination.current_page + 1}`;
-            
-            if (startDateInput && startDateInput.value && endDateInput && endDateInput.value) {
-                apiUrl += `&start_date=${startDateInput.value}&end_date=${endDateInput.value}`;
-            }
-            
-            fetch(apiUrl)
-                .then(response => response.json())
-                .then(data => {
-                    // 重新渲染交易記錄
-                    renderTransactions(data);
-                })
-                .catch(error => {
-                    console.error('載入交易記錄失敗:', error);
-                });
-        } : null;
+        // 載入更多按鈕進入畫面時自動載入下一頁
+        if (!transactionsObserver && 'IntersectionObserver' in window) {
+            transactionsObserver = new IntersectionObserver(entries => {
+                if (entries.some(entry => entry.isIntersecting)) {
+                    loadMoreTransactions();
+                }
+            }, { rootMargin: '200px' });
+            transactionsObserver.observe(loadMoreBtn);
+        }
     }
 }
 
 /**
- * 渲染交易記錄列表
+ * 渲染交易記錄列表（附加到現有列表後方）
  * @param {Object} data - 包含交易記錄和分頁信息的數據
  */
 function renderTransactions(data) {
     const transactionsBody = document.getElementById('transactions-body');
     if (!transactionsBody) return;
     
-    if (!data.transactions || data.transactions.length === 0) {
-        transactionsBody.innerHTML = '<tr><td colspan="7" class="empty-text">沒有符合條件的交易記錄</td></tr>';
-        return;
-    }
-    
     // 渲染交易記錄
     let html = '';
-    data.transactions.forEach(transaction => {
+    (data.transactions || []).forEach(transaction => {
         const date = transaction.date_formatted || transaction.date;
         const type = transaction.type === 'expense' ? '支出' : '收入';
         const category = transaction.category_name || '未分類';
@@ -2260,7 +2247,7 @@ function renderTransactions(data) {
         const account = transaction.account_name || '默認帳戶';
         
         html += `
-        <tr>
+        <tr data-transaction-id="${transaction.transaction_id}">
             <td>${date}</td>
             <td>${type}</td>
             <td>${category}</td>
@@ -2275,7 +2262,7 @@ function renderTransactions(data) {
         `;
     });
     
-    transactionsBody.innerHTML = html;
+    transactionsBody.insertAdjacentHTML('beforeend', html);
     
     // 更新分頁
     updatePagination(data.pagination);
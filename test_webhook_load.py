@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+"""
+負載測試腳本：以多事件批次測試 webhook 的事件處理吞吐量
+
+沿用 test_webhook_with_signature.py 的簽名方式，每個請求包含多位用戶在同一群組中的多個事件，
+模擬忙碌群組一次送來的 webhook。
+
+兩種模式：
+1. 本機模式（預設）：不需啟動服務，以 Flask test client 將簽名批次送到 /api/webhook，
+   經過與線上相同的簽名驗證、事件解析、去重與 EventDispatcher，在不同工作執行緒數量下處理相同的批次。
+   事件處理函數以固定延遲模擬 AI 解析與 LINE API 呼叫，其中一位用戶特別慢，
+   報告每種工作執行緒數量的吞吐量，並檢查同一用戶的事件是否保持順序。
+   以開發模式載入 webhook（不連接 LINE 平台），去重記錄寫入臨時資料庫
+2. HTTP 模式（--url）：對執行中的服務發送簽名批次，報告請求吞吐量，
+   並從 /health 的 webhook_queue 計數等待事件處理完畢，報告處理吞吐量
+   （工作執行緒數量由服務端的 WEBHOOK_WORKERS 決定）
+
+使用方法：
+- python test_webhook_load.py --workers 1,2,4,8 --batches 50 --users 8 --events-per-user 3
+- python test_webhook_load.py --url http://localhost:5000/api/webhook --batches 200
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from dotenv import load_dotenv
+
+from test_webhook_with_signature import generate_signature
+from events.dispatcher import EventDispatcher
+
+# 載入環境變數
+load_dotenv()
+
+SAMPLE_MESSAGES = ["早餐 -120", "午餐 -150 [飲食]", "#明天早上9點 開會", "查詢本月支出", "薪水 +30000"]
+
+
+def build_batch(batch_index, users, events_per_user, group_id="load_test_group"):
+    """建立一個多事件 webhook 請求主體，同一用戶的事件依 timestamp 遞增排列"""
+    events = []
+    base_timestamp = int(time.time() * 1000)
+    for seq in range(events_per_user):
+        for user in range(users):
+            event_index = len(events)
+            events.append({
+                "type": "message",
+                "message": {
+                    "type": "text",
+                    "id": f"{batch_index:06d}{event_index:04d}",
+                    "text": SAMPLE_MESSAGES[(user + seq) % len(SAMPLE_MESSAGES)],
+                    "quoteToken": f"load_quote_token_{batch_index}_{event_index}"
+                },
+                "webhookEventId": f"LOADTEST{batch_index:06d}{event_index:04d}",
+                "deliveryContext": {"isRedelivery": False},
+                "timestamp": base_timestamp + seq,
+                "source": {
+                    "type": "group",
+                    "groupId": group_id,
+                    "userId": f"load_user_{user}"
+                },
+                "replyToken": f"load_reply_token_{batch_index}_{event_index}",
+                "mode": "active"
+            })
+    return {"destination": "xxxxxxxxxx", "events": events}
+
+
+def load_webhook_app(channel_secret, directory):
+    """以開發模式載入 webhook 模組（不連接 LINE 平台），停止載入時啟動的排程器與事件派送器
+
+    webhook 模組使用相對路徑 database/linebot.db，載入時切換到 directory 並在其中建立資料庫，
+    負載測試不會寫入開發中的資料庫。
+    """
+    from tests.db_helpers import create_test_database
+
+    os.environ['FLASK_ENV'] = 'development'
+    os.environ['LINE_CHANNEL_SECRET'] = channel_secret
+    os.environ['WEBHOOK_DISPATCH'] = 'async'
+    os.makedirs(os.path.join(directory, 'database'), exist_ok=True)
+    create_test_database(os.path.join(directory, 'database'), 'linebot.db')
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        import webhook as webhook_module
+        webhook_module.reminder_scheduler.stop()
+        webhook_module.event_dispatcher.shutdown(timeout=1)
+    finally:
+        os.chdir(cwd)
+
+    # 每個請求都會記錄請求主體，負載測試中只顯示警告
+    for name in ('webhook', 'events.dedup', 'events.dispatcher'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    return webhook_module
+
+
+def run_local(worker_counts, batches, users, events_per_user, latency, slow_latency, channel_secret):
+    """在本機以不同工作執行緒數量，經由 /api/webhook 處理相同的簽名批次，返回每種數量的結果"""
+    from database.db_utils import DatabaseUtils
+    from events.dedup import EventDeduplicator
+    from tests.db_helpers import create_test_database
+
+    tmpdir = tempfile.TemporaryDirectory()
+    webhook_module = load_webhook_app(channel_secret, tmpdir.name)
+    client = webhook_module.app.test_client()
+    bodies = [json.dumps(build_batch(i, users, events_per_user)) for i in range(batches)]
+    signatures = [generate_signature(channel_secret, body) for body in bodies]
+    total_events = batches * users * events_per_user
+    results = []
+
+    for workers in worker_counts:
+        order_errors = []
+        last_seq = {}
+        lock = threading.Lock()
+
+        def process(event):
+            # 第一位用戶模擬慢速 AI 解析
+            time.sleep(slow_latency if event.source.user_id == "load_user_0" else latency)
+            with lock:
+                key = (event.source.group_id, event.source.user_id, event.reply_token.split("_")[3])
+                if last_seq.get(key, -1) > event.timestamp:
+                    order_errors.append(event.reply_token)
+                last_seq[key] = event.timestamp
+
+        # 每種工作執行緒數量使用新的派送器與去重資料庫，相同的事件 ID 不會被視為重送
+        dispatcher = EventDispatcher(process, workers=workers, queue_size=total_events).start()
+        db = DatabaseUtils(create_test_database(tmpdir.name, f"dedup_{workers}.db"))
+        webhook_module.event_dispatcher = dispatcher
+        webhook_module.event_deduplicator = EventDeduplicator(db)
+
+        started = time.perf_counter()
+        failed_requests = 0
+        for body, signature in zip(bodies, signatures):
+            response = client.post("/api/webhook", data=body, content_type="application/json",
+                                   headers={"X-Line-Signature": signature})
+            if response.status_code != 200:
+                failed_requests += 1
+        request_seconds = time.perf_counter() - started
+        remaining = dispatcher.shutdown(timeout=600)
+        elapsed = time.perf_counter() - started
+
+        status = dispatcher.status()
+        results.append({
+            "workers": workers,
+            "events": status["processed"],
+            "failed_requests": failed_requests,
+            "request_seconds": round(request_seconds, 3),
+            "seconds": round(elapsed, 3),
+            "events_per_second": round(status["processed"] / elapsed, 1),
+            "avg_wait_ms": status["avg_wait_ms"],
+            "max_wait_ms": status["max_wait_ms"],
+            "order_errors": len(order_errors),
+            "unfinished": remaining
+        })
+    tmpdir.cleanup()
+    return results
+
+
+def run_http(url, batches, users, events_per_user, concurrency, channel_secret):
+    """對執行中的服務發送簽名批次，返回請求與處理吞吐量"""
+    health_url = url.rsplit("/api/", 1)[0] + "/health"
+
+    def processed_count():
+        try:
+            queue_status = requests.get(health_url, timeout=5).json().get("webhook_queue") or {}
+            return queue_status.get("processed", 0) + queue_status.get("failed", 0)
+        except Exception:
+            return None
+
+    def post(batch_index):
+        body = json.dumps(build_batch(batch_index, users, events_per_user))
+        headers = {
+            "Content-Type": "application/json",
+            "X-Line-Signature": generate_signature(channel_secret, body)
+        }
+        response = requests.post(url, headers=headers, data=body, timeout=30)
+        return response.status_code
+
+    before = processed_count()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        statuses = list(executor.map(post, range(batches)))
+    request_seconds = time.perf_counter() - started
+
+    total_events = batches * users * events_per_user
+    result = {
+        "requests": batches,
+        "failed_requests": sum(1 for status in statuses if status != 200),
+        "request_seconds": round(request_seconds, 3),
+        "requests_per_second": round(batches / request_seconds, 1)
+    }
+
+    # 服務立即回應 200，等待背景處理完所有事件
+    if before is not None:
+        while processed_count() - before < total_events and time.perf_counter() - started < 600:
+            time.sleep(0.2)
+        elapsed = time.perf_counter() - started
+        result["events"] = processed_count() - before
+        result["events_per_second"] = round(result["events"] / elapsed, 1)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="webhook 多事件批次負載測試")
+    parser.add_argument("--url", help="webhook URL，未指定時以 Flask test client 在本機測試")
+    parser.add_argument("--workers", default="1,2,4,8", help="本機模式的工作執行緒數量，以逗號分隔")
+    parser.add_argument("--batches", type=int, default=50, help="webhook 請求數量")
+    parser.add_argument("--users", type=int, default=8, help="每個請求中的用戶數")
+    parser.add_argument("--events-per-user", type=int, default=3, help="每位用戶在一個請求中的事件數")
+    parser.add_argument("--latency", type=float, default=0.005, help="本機模式每個事件的處理秒數")
+    parser.add_argument("--slow-latency", type=float, default=0.05, help="本機模式慢速用戶每個事件的處理秒數")
+    parser.add_argument("--concurrency", type=int, default=4, help="HTTP 模式同時發送的請求數")
+    args = parser.parse_args()
+
+    channel_secret = os.environ.get("LINE_CHANNEL_SECRET", "test_secret")
+
+    if args.url:
+        print(f"發送 {args.batches} 個批次到 {args.url}")
+        print(json.dumps(run_http(args.url, args.batches, args.users, args.events_per_user,
+                                  args.concurrency, channel_secret), ensure_ascii=False, indent=2))
+    else:
+        worker_counts = [int(value) for value in args.workers.split(",")]
+        print(f"{args.batches} 個批次，每批 {args.users} 位用戶 x {args.events_per_user} 個事件")
+        print(f"{'workers':>8} {'events':>8} {'requests s':>11} {'seconds':>9} {'events/s':>10} "
+              f"{'avg wait ms':>12} {'order errors':>13} {'failed':>7}")
+        for row in run_local(worker_counts, args.batches, args.users, args.events_per_user,
+                             args.latency, args.slow_latency, channel_secret):
+            print(f"{row['workers']:>8} {row['events']:>8} {row['request_seconds']:>11} {row['seconds']:>9} "
+                  f"{row['events_per_second']:>10} {row['avg_wait_ms']:>12} {row['order_errors']:>13} "
+                  f"{row['failed_requests']:>7}")
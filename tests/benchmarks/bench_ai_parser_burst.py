@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""
+AI 解析器突發流量基準測試
+
+模擬一批訊息同時抵達（部分用戶送出相同的句子），比較：
+- threads：每則訊息一個執行緒直接呼叫 AIParser.parse_text
+- pooled：每則訊息一個執行緒呼叫 ConcurrentAIParser.parse_text（並行上限 + 相同請求合併）
+
+上游以「同時請求越多、回應越慢」的假 API 模擬，不需要網路。
+報告上游呼叫次數、每秒上游呼叫數與每則訊息的 p50/p99 延遲。
+
+使用方法：
+    python tests/benchmarks/bench_ai_parser_burst.py --messages 200 --phrases 20
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import threading
+import statistics
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from parsers.ai_parser import AIParser
+from parsers.concurrent_ai_parser import ConcurrentAIParser
+
+
+def percentile(samples, pct):
+    """計算百分位數"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class SimulatedUpstream:
+    """假的 Cursor API：基本延遲 base 秒，每多一個同時請求增加 per_request 秒"""
+
+    def __init__(self, base=0.05, per_request=0.01):
+        self.base = base
+        self.per_request = per_request
+        self.calls = 0
+        self.running = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, user_input):
+        with self.lock:
+            self.calls += 1
+            self.running += 1
+            delay = self.base + self.per_request * self.running
+        time.sleep(delay)
+        with self.lock:
+            self.running -= 1
+        return {"type": "conversation", "data": {"message": user_input, "keywords": []}}
+
+
+def make_parser(upstream):
+    parser = AIParser()
+    parser.cache = None
+    parser._call_cursor_api = upstream
+    return parser
+
+
+def run_threads(messages, parser):
+    """每則訊息一個執行緒，以 parser.parse_text 解析"""
+    latencies = []
+    lock = threading.Lock()
+
+    def handle(text):
+        start = time.perf_counter()
+        parser.parse_text(text)
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=handle, args=(text,)) for text in messages]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def run_pooled(messages, upstream, max_concurrency):
+    """所有訊息交給 ConcurrentAIParser"""
+    parser = ConcurrentAIParser(make_parser(upstream), max_concurrency=max_concurrency)
+    try:
+        return run_threads(messages, parser)
+    finally:
+        parser.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AI 解析器突發流量基準測試')
+    parser.add_argument('--messages', type=int, default=200, help='同時抵達的訊息數')
+    parser.add_argument('--phrases', type=int, default=20, help='不同句子的數量')
+    parser.add_argument('--concurrency', type=int, default=4, help='ConcurrentAIParser 的並行上限')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    rng = random.Random(1)
+    # 少數熱門句子佔大部分流量
+    weights = [1.0 / (rank + 1) for rank in range(args.phrases)]
+    messages = rng.choices([f"問題 {rank}" for rank in range(args.phrases)], weights, k=args.messages)
+
+    print(f"{'模式':>8} {'上游呼叫':>8} {'上游/秒':>10} {'p50(ms)':>10} {'p99(ms)':>10}")
+    for mode in ("threads", "pooled"):
+        upstream = SimulatedUpstream()
+        started = time.perf_counter()
+        if mode == "threads":
+            latencies = run_threads(messages, make_parser(upstream))
+        else:
+            latencies = run_pooled(messages, upstream, args.concurrency)
+        elapsed = time.perf_counter() - started
+        print(f"{mode:>8} {upstream.calls:>8} {upstream.calls / elapsed:>10.1f} "
+              f"{statistics.median(latencies) * 1000:>10.1f} {percentile(latencies, 99) * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""
+資料庫連接池基準測試
+
+模擬 `_handle_accounting` 處理一則記帳訊息時的資料庫呼叫序列，
+比較不使用連接池、使用連接池，以及在工作單元（db.session()）中執行時，
+每個 webhook 事件開啟的連接數與 p50/p99 延遲。
+
+使用方法：
+    python tests/benchmarks/bench_db_pool.py --events 2000 --threads 4
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import threading
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from database.connection import ConnectionPool, connections_opened
+from database.db_utils import DatabaseUtils
+from tests.db_helpers import create_test_database
+
+
+def simulate_accounting_event(db, user_id):
+    """重現一則「午餐 -120 [飲食] <現金>」訊息的資料庫呼叫"""
+    # 以 fetchall 查詢重現 get_user / add_transaction 的每一次連接，
+    # 呼叫次數與 handler 實際路徑相同
+    db.execute_query("SELECT * FROM users WHERE user_id = ?", (user_id,))
+    accounts = db.get_accounts(user_id)
+    account_id = accounts[0]["account_id"]
+    categories = db.get_categories(user_id, "expense")
+    category_id = categories[0]["category_id"]
+    db.execute_update(
+        "INSERT INTO transactions (user_id, account_id, category_id, type, amount, description, date) "
+        "VALUES (?, ?, ?, ?, ?, ?, date('now'))",
+        (user_id, account_id, category_id, "expense", 120, "午餐")
+    )
+    balance = db.execute_query("SELECT balance FROM accounts WHERE account_id = ?", (account_id,))
+    db.execute_update(
+        "UPDATE accounts SET balance = ? WHERE account_id = ?",
+        (balance[0]["balance"] - 120, account_id)
+    )
+
+
+def percentile(samples, pct):
+    """計算百分位數"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(db_path, pool_size, events, threads, use_session=False):
+    """執行一輪測試，返回結果字典"""
+    ConnectionPool.close_all()
+    db = DatabaseUtils(db_path, pool_size=pool_size)
+    db.execute_update("INSERT OR IGNORE INTO users (user_id, display_name) VALUES (?, ?)", ("bench_user", "Bench"))
+
+    latencies = []
+    lock = threading.Lock()
+    per_thread = events // threads
+
+    def worker():
+        local = []
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            if use_session:
+                with db.session():
+                    simulate_accounting_event(db, "bench_user")
+            else:
+                simulate_accounting_event(db, "bench_user")
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    opened_before = connections_opened()
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - started
+    opened = connections_opened() - opened_before
+    db.close()
+
+    return {
+        "mode": (f"pool={pool_size}" if pool_size else "no pool") + ("+session" if use_session else ""),
+        "events": len(latencies),
+        "connections_per_event": opened / len(latencies),
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": percentile(latencies, 99),
+        "events_per_sec": len(latencies) / elapsed
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='資料庫連接池基準測試')
+    parser.add_argument('--events', type=int, default=2000, help='模擬的 webhook 事件數')
+    parser.add_argument('--threads', type=int, default=4, help='併發執行緒數')
+    parser.add_argument('--pool-size', type=int, default=5, help='連接池大小')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = create_test_database(tmpdir)
+        results = [
+            run(db_path, 0, args.events, args.threads),
+            run(db_path, args.pool_size, args.events, args.threads),
+            run(db_path, args.pool_size, args.events, args.threads, use_session=True)
+        ]
+
+    print(f"{'模式':<16} {'事件數':>8} {'連接/事件':>10} {'p50(ms)':>10} {'p99(ms)':>10} {'事件/秒':>10}")
+    for r in results:
+        print(f"{r['mode']:<16} {r['events']:>8} {r['connections_per_event']:>10.2f} "
+              f"{r['p50_ms']:>10.3f} {r['p99_ms']:>10.3f} {r['events_per_sec']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
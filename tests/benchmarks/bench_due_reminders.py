@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""
+排程器提醒查詢基準測試
+
+建立一個含大量提醒（預設一百萬筆）的臨時資料庫：到期時間分佈在過去 300 天到未來 65 天，
+大部分過期的提醒沒有被標記完成（用戶很少按「完成」），提前分鐘數從 0 到一天不等。
+比較排程器每次載入未來 window 內提醒的耗時：
+- 舊查詢：以 datetime(due_date) >= ? 篩選，無法使用索引，每次掃描整個資料表
+- 新查詢：iter_due_reminders，以 idx_reminders_pending_due 讀取範圍並分批返回
+
+使用方法：
+    python tests/benchmarks/bench_due_reminders.py --rows 1000000 --window-hours 6 --chunk-size 1000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from datetime import timedelta
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from database.connection import ConnectionPool
+from database.db_utils import DatabaseUtils
+from database.timeutil import DB_TIME_FORMAT, local_now
+from tests.db_helpers import create_test_database
+
+# 加上索引之前排程器使用的查詢
+LEGACY_QUERY = """
+    SELECT due.*, d.status AS delivery_status, COALESCE(d.attempts, 0) AS delivery_attempts
+    FROM (
+        SELECT reminders.*,
+               datetime(due_date, '-' || COALESCE(remind_before, 0) || ' minutes') AS fire_at
+        FROM reminders
+        WHERE is_completed = 0
+          AND datetime(due_date) >= ?
+    ) AS due
+    LEFT JOIN reminder_deliveries d
+      ON d.reminder_id = due.reminder_id AND d.fire_at = due.fire_at
+    WHERE due.fire_at <= ?
+      AND (d.status IS NULL
+           OR d.status = 'scheduled'
+           OR (d.status = 'failed' AND d.attempts < ?)
+           OR (d.status = 'sending' AND d.claimed_at < ?))
+    ORDER BY due.fire_at ASC, due.reminder_id ASC
+"""
+
+LEADS = (0, 5, 10, 15, 30, 60, 1440)
+
+
+def populate(db, rows, seed=42):
+    """寫入 rows 筆合成提醒，每批 50000 筆"""
+    rng = random.Random(seed)
+    now = local_now()
+    batch = []
+    for i in range(rows):
+        due = now + timedelta(minutes=rng.randint(-300 * 1440, 65 * 1440))
+        # 約一半的資料使用 isoformat（'T' 分隔）寫入
+        due_text = due.isoformat(timespec='seconds') if i % 2 else due.strftime(DB_TIME_FORMAT)
+        lead = rng.choice(LEADS)
+        completed = due < now and rng.random() < 0.3
+        # 直接填入網頁端欄位，不觸發同步欄位的觸發器
+        batch.append((f"U{i % 20000}", '繳費', due_text, lead, completed, '繳費', due_text, lead))
+        if len(batch) == 50000:
+            _insert(db, batch)
+            batch = []
+    if batch:
+        _insert(db, batch)
+
+
+def _insert(db, batch):
+    db.execute_many(
+        "INSERT INTO reminders (user_id, title, due_date, remind_before, is_completed, content, datetime, notify_before) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        batch
+    )
+
+
+def time_runs(func, repeat):
+    """執行 repeat 次，返回 (中位數毫秒, 返回的筆數)"""
+    samples = []
+    count = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count = func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='排程器提醒查詢基準測試')
+    parser.add_argument('--rows', type=int, default=1000000, help='合成提醒的筆數')
+    parser.add_argument('--window-hours', type=float, default=6, help='每次載入的時間範圍（小時）')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='每次查詢讀取的提醒數')
+    parser.add_argument('--repeat', type=int, default=5, help='每種查詢執行的次數')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db = DatabaseUtils(create_test_database(tmpdir), pool_size=1)
+        started = time.perf_counter()
+        populate(db, args.rows)
+        db.execute_update("ANALYZE")
+        print(f"寫入 {args.rows} 筆提醒，耗時 {time.perf_counter() - started:.1f} 秒")
+
+        now = local_now()
+        until = now + timedelta(hours=args.window_hours)
+        due_after = now - timedelta(seconds=60)
+        stale_before = time.time() - 60
+
+        def legacy():
+            rows = db.execute_query(LEGACY_QUERY, (
+                due_after.strftime(DB_TIME_FORMAT), until.strftime(DB_TIME_FORMAT), 3, int(stale_before)
+            ))
+            return len(rows)
+
+        def chunked():
+            return sum(len(rows) for rows in db.iter_due_reminders(
+                until, due_after, chunk_size=args.chunk_size, stale_before=stale_before
+            ))
+
+        legacy_ms, legacy_rows = time_runs(legacy, args.repeat)
+        chunked_ms, chunked_rows = time_runs(chunked, args.repeat)
+        assert legacy_rows == chunked_rows, (legacy_rows, chunked_rows)
+
+        print(f"{'查詢':<12} {'筆數':>8} {'中位數(ms)':>12}")
+        print(f"{'舊查詢':<12} {legacy_rows:>8} {legacy_ms:>12.1f}")
+        print(f"{'分批索引查詢':<12} {chunked_rows:>8} {chunked_ms:>12.1f}")
+        print(f"最大提前分鐘數 {db.get_max_remind_before()}，加速 {legacy_ms / chunked_ms:.1f} 倍")
+        ConnectionPool.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+文字解析器基準測試
+
+以 tests/data/parser_corpus.txt 中的中文訊息（記帳、查詢、帳戶、提醒與一般對話）
+反覆呼叫 TextParser.parse_text，報告每秒可解析的訊息數與每則訊息的 p50/p99 延遲。
+
+使用方法：
+    python tests/benchmarks/bench_text_parser.py --rounds 200
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import statistics
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from parsers.text_parser import TextParser
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'parser_corpus.txt')
+
+
+def load_corpus(path=CORPUS_PATH):
+    """讀取測試語料，每行一則訊息"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.rstrip('\n') for line in f if line.strip()]
+
+
+def percentile(samples, pct):
+    """計算百分位數"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(parser, corpus, rounds):
+    """解析整個語料 rounds 次，返回結果字典"""
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for text in corpus:
+            start = time.perf_counter()
+            parser.parse_text(text)
+            latencies.append((time.perf_counter() - start) * 1_000_000)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "messages": len(latencies),
+        "messages_per_sec": len(latencies) / elapsed,
+        "p50_us": statistics.median(latencies),
+        "p99_us": percentile(latencies, 99)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文字解析器基準測試')
+    parser.add_argument('--rounds', type=int, default=200, help='語料重複解析的次數')
+    parser.add_argument('--cache-size', type=int, default=0, help='解析結果快取筆數，預設 0 只量測解析本身')
+    args = parser.parse_args()
+
+    # 解析失敗時的錯誤日誌不屬於解析成本
+    logging.disable(logging.CRITICAL)
+
+    corpus = load_corpus()
+    text_parser = TextParser(cache_size=args.cache_size)
+    # 先解析一輪，排除正規表示式編譯等一次性成本
+    run(text_parser, corpus, 1)
+    result = run(text_parser, corpus, args.rounds)
+
+    print(f"{'訊息數':>8} {'訊息/秒':>12} {'p50(us)':>10} {'p99(us)':>10}")
+    print(f"{result['messages']:>8} {result['messages_per_sec']:>12.1f} "
+          f"{result['p50_us']:>10.1f} {result['p99_us']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+分層解析離線評估
+
+重播標註語料 tests/data/parser_labelled.jsonl（每行 {"text": ..., "expected": {"type": ..., 其他欄位}}），
+對不同的信心門檻計算：
+- AI 呼叫率：規則解析信心不足、需要送到 AI 端點的比例
+- 規則準確率：由規則層直接回應的輸入中，結果與標註相符的比例
+- 整體準確率：假設 AI 端點的準確率為 --ai-accuracy 時的估計值
+
+不呼叫 AI 端點，用於調整 AI_CONFIDENCE_THRESHOLD* 設定。
+
+使用方法：
+    python tests/benchmarks/eval_tiered_parser.py --ai-accuracy 0.95 --details
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from parsers.ai_parser import AIParser
+
+LABELLED_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'parser_labelled.jsonl')
+
+
+def load_labelled(path=LABELLED_PATH):
+    """讀取標註語料"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def matches(result, expected):
+    """解析結果的類型與標註的欄位是否相符"""
+    if not result or result.get("type") != expected["type"]:
+        return False
+    data = result.get("data") or {}
+    return all(data.get(field) == value for field, value in expected.items() if field != "type")
+
+
+def choose(candidates, thresholds):
+    """與 AIParser.parse_local 相同：第一個信心達到門檻的規則結果，沒有時返回 None（送到 AI）"""
+    for tier, result, score in candidates:
+        if score >= thresholds.get(result["type"], 1.0):
+            return tier, result
+    return None
+
+
+def evaluate(examples, thresholds, ai_accuracy):
+    """以指定門檻評估，返回統計與規則層答錯的輸入"""
+    sent = 0
+    correct = 0
+    wrong = []
+    for example in examples:
+        chosen = choose(example["candidates"], thresholds)
+        if chosen is None:
+            sent += 1
+            continue
+        tier, result = chosen
+        if matches(result, example["expected"]):
+            correct += 1
+        else:
+            wrong.append((example["text"], tier, result))
+
+    total = len(examples)
+    kept = total - sent
+    return {
+        "llm_rate": sent / total,
+        "rules_accuracy": correct / kept if kept else 1.0,
+        "overall_accuracy": (correct + ai_accuracy * sent) / total,
+        "wrong": wrong
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分層解析離線評估')
+    parser.add_argument('--corpus', default=LABELLED_PATH, help='標註語料路徑（JSONL）')
+    parser.add_argument('--ai-accuracy', type=float, default=0.95, help='假設的 AI 端點準確率')
+    parser.add_argument('--details', action='store_true', help='列出目前設定下規則層答錯的輸入')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    ai_parser = AIParser()
+    examples = []
+    for row in load_labelled(args.corpus):
+        examples.append({**row, "candidates": list(ai_parser.rule_candidates(row["text"]))})
+
+    print(f"{'門檻':>8} {'AI 呼叫率':>10} {'規則準確率':>10} {'整體準確率':>10}")
+    for step in range(11):
+        threshold = step / 10
+        report = evaluate(examples, dict.fromkeys(ai_parser.thresholds, threshold), args.ai_accuracy)
+        print(f"{threshold:>8.1f} {report['llm_rate']:>10.1%} {report['rules_accuracy']:>10.1%} "
+              f"{report['overall_accuracy']:>10.1%}")
+
+    report = evaluate(examples, ai_parser.thresholds, args.ai_accuracy)
+    print(f"{'目前設定':>6} {report['llm_rate']:>10.1%} {report['rules_accuracy']:>10.1%} "
+          f"{report['overall_accuracy']:>10.1%}  {ai_parser.thresholds}")
+
+    if args.details:
+        for text, tier, result in report["wrong"]:
+            print(f"  [{tier}] {text} -> {json.dumps(result, ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+"""測試與基準測試共用的資料庫輔助函數"""
+import os
+import sys
+import contextlib
+import io
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from init_db import init_db
+
+
+def create_test_database(directory, name='test.db'):
+    """在指定目錄建立一個含預設資料的測試資料庫，返回檔案路徑"""
+    db_path = os.path.join(directory, name)
+    # init_db 會輸出初始化訊息，測試中不需要顯示
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_db(db_path)
+    return db_path
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+import sys
+import os
+import json
+import time
+import logging
+import threading
+import unittest
+import requests
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import parsers.ai_parser as ai_parser_module
+from parsers.ai_parser import AIParser
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+API_RESULT = {"type": "conversation", "data": {"message": "你好", "keywords": []}}
+
+
+class StubCursorApi(BaseHTTPRequestHandler):
+    """本地的 Cursor API 替身：依序回應 server.statuses 中的狀態碼，用完後一律回應 200"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.clients.add(self.client_address)
+            status = server.statuses.pop(0) if server.statuses else 200
+        time.sleep(server.delay)
+
+        body = json.dumps({"choices": [{"text": "```json\n" + json.dumps(API_RESULT) + "\n```"}]}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestAIParserHttp(unittest.TestCase):
+    """測試 Cursor API 呼叫的連線重用、逾時、重試與熔斷"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubCursorApi)
+        self.server.lock = threading.Lock()
+        self.server.requests = 0
+        self.server.clients = set()
+        self.server.statuses = []
+        self.server.delay = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        env = {
+            'CURSOR_API_KEY': 'test-key',
+            'CURSOR_API_URL': f'http://127.0.0.1:{self.server.server_port}/v1/completions',
+            'AI_READ_TIMEOUT': '0.2',
+            'AI_MAX_RETRIES': '2',
+            'AI_BREAKER_FAILURES': '2',
+            'AI_BREAKER_RESET': '60',
+            'PARSE_CACHE_SIZE': '0',
+            'FLASK_ENV': 'production'
+        }
+        patches = [
+            mock.patch.dict(os.environ, env),
+            mock.patch.object(ai_parser_module, 'backoff_delay', return_value=0),
+            # 每個測試使用新的 session 與熔斷器
+            mock.patch.object(AIParser, '_session', None)
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.parser = AIParser()
+
+    def test_retries_transient_errors_on_one_connection(self):
+        """暫時性錯誤重試後成功，多次呼叫重用同一個連線"""
+        self.server.statuses = [503]
+        self.assertEqual(self.parser.parse_text("你好"), API_RESULT)
+        self.assertEqual(self.parser.parse_text("早安"), API_RESULT)
+
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(len(self.server.clients), 1)
+        latency = AIParser.http_status()["latency"]
+        self.assertEqual(latency["http_5xx"]["count"], 1)
+        self.assertEqual(latency["ok"]["count"], 2)
+
+    def test_read_timeout_does_not_hang(self):
+        """上游無回應時在讀取逾時後放棄，返回預設回應"""
+        self.server.delay = 1.0
+        started = time.perf_counter()
+        result = self.parser.parse_text("你好")
+
+        self.assertLess(time.perf_counter() - started, 1.5)
+        self.assertEqual(result["type"], "conversation")
+        self.assertEqual(AIParser.http_status()["latency"]["timeout"]["count"], 3)
+
+    def test_open_breaker_fails_fast_to_rule_parsing(self):
+        """連續失敗後熔斷，之後的請求不送出並改用規則解析"""
+        self.server.statuses = [503] * 6
+        for text in ("你好", "早安"):
+            self.assertNotEqual(self.parser.parse_text(text), API_RESULT)
+        self.assertEqual(self.server.requests, 6)
+
+        result = self.parser.parse_text("晚安")
+        self.assertEqual(result["data"]["message"], "晚安")
+        self.assertEqual(self.server.requests, 6)
+        breaker = AIParser.http_status()["breaker"]
+        self.assertEqual(breaker["state"], "open")
+        self.assertEqual(breaker["short_circuited"], 1)
+
+    def test_unexpected_error_during_probe_reopens_breaker(self):
+        """半開狀態的試探請求發生非逾時的例外時重新熔斷，冷卻後仍會再放行試探請求"""
+        self.server.statuses = [503] * 6
+        for text in ("你好", "早安"):
+            self.parser.parse_text(text)
+        breaker = AIParser._breaker
+        self.assertEqual(breaker.state, "open")
+
+        breaker.reset_timeout = 0
+        self.assertEqual(breaker.state, "half_open")
+        with mock.patch.object(AIParser._session, 'post',
+                               side_effect=requests.exceptions.ChunkedEncodingError("連線中斷")):
+            self.assertNotEqual(self.parser.parse_text("晚安"), API_RESULT)
+        self.assertFalse(breaker._probing)
+
+        # 冷卻後的試探請求成功，熔斷器關閉
+        self.assertEqual(self.parser.parse_text("午安"), API_RESULT)
+        self.assertEqual(breaker.state, "closed")
+        self.assertEqual(AIParser.http_status()["latency"]["request_error"]["count"], 3)
+
+    def test_non_request_error_still_ends_probe(self):
+        """送出請求時發生其他例外也會記錄失敗"""
+        with mock.patch.object(AIParser, '_session', mock.Mock(post=mock.Mock(side_effect=ValueError("bad")))):
+            breaker = AIParser._breaker
+            breaker.reset_timeout = 0
+            breaker._state, breaker._opened_at = "open", 0
+            self.assertEqual(breaker.state, "half_open")
+            self.parser.parse_text("晚安")
+            self.assertFalse(breaker._probing)
+            self.assertEqual(breaker._state, "open")
+
+if __name__ == "__main__":
+    unittest.main()
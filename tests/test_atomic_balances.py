@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+import sys
+import os
+import random
+import logging
+import tempfile
+import threading
+import unittest
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection import ConnectionPool
+from database.db_utils import DatabaseUtils
+from tests.db_helpers import create_test_database
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+THREADS = 8
+OPERATIONS_PER_THREAD = 400
+
+
+class TestAtomicBalances(unittest.TestCase):
+    """測試交易新增、修改、刪除與帳戶餘額的一致性"""
+
+    def setUp(self):
+        """建立臨時資料庫與兩個測試帳戶"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = create_test_database(self.tmpdir.name)
+        self.db = DatabaseUtils(self.db_path, pool_size=THREADS)
+        self.db.create_user('test_user', '測試用戶')
+        self.account_a = self.db.add_account('test_user', '現金', 0, True)
+        self.account_b = self.db.add_account('test_user', '銀行', 0, False)
+
+    def tearDown(self):
+        """關閉連接池並清除臨時檔案"""
+        ConnectionPool.close_all()
+        self.tmpdir.cleanup()
+
+    def _balance(self, account_id):
+        rows = self.db.execute_query("SELECT balance FROM accounts WHERE account_id = ?", (account_id,))
+        return rows[0]["balance"]
+
+    def _expected_balance(self, account_id):
+        rows = self.db.execute_query(
+            """
+            SELECT COALESCE(SUM(CASE WHEN type = 'income' THEN amount ELSE -amount END), 0) AS total
+            FROM transactions WHERE account_id = ?
+            """,
+            (account_id,)
+        )
+        return rows[0]["total"]
+
+    def test_add_transaction_updates_balance(self):
+        """新增交易應同時更新餘額"""
+        self.db.add_transaction('test_user', self.account_a, 1, 'expense', 120, '午餐')
+        self.db.add_transaction('test_user', self.account_a, 9, 'income', 1000, '薪水')
+        self.assertEqual(self._balance(self.account_a), 880)
+
+    def test_failed_insert_does_not_touch_balance(self):
+        """交易寫入失敗時餘額不應改變"""
+        with self.assertRaises(Exception):
+            # type 為 NOT NULL 欄位
+            self.db.add_transaction('test_user', self.account_a, 1, None, 50, '錯誤資料')
+        self.assertEqual(self._balance(self.account_a), 0)
+
+    def test_update_and_delete_revert_balances(self):
+        """修改與刪除交易應還原原帳戶並套用到新帳戶"""
+        transaction_id = self.db.add_transaction('test_user', self.account_a, 1, 'expense', 100, '晚餐')
+
+        original = self.db.update_transaction(
+            transaction_id, 'test_user', 'income', 300, '2024-01-01', 9, self.account_b, '退款'
+        )
+        self.assertEqual(original["amount"], 100)
+        self.assertEqual(self._balance(self.account_a), 0)
+        self.assertEqual(self._balance(self.account_b), 300)
+
+        self.assertIsNone(self.db.delete_transaction(transaction_id, 'other_user'))
+        self.db.delete_transaction(transaction_id, 'test_user')
+        self.assertEqual(self._balance(self.account_b), 0)
+
+    def test_concurrent_writes_keep_exact_balances(self):
+        """多執行緒同時新增、修改、刪除交易後，餘額應與交易明細完全一致"""
+        errors = []
+
+        def worker(seed):
+            rng = random.Random(seed)
+            own = []
+            try:
+                for _ in range(OPERATIONS_PER_THREAD):
+                    action = rng.random()
+                    account_id = rng.choice([self.account_a, self.account_b])
+                    type_name = rng.choice(['income', 'expense'])
+                    amount = rng.randint(1, 500)
+
+                    if action < 0.7 or not own:
+                        own.append(self.db.add_transaction(
+                            'test_user', account_id, 1, type_name, amount, '併發測試'
+                        ))
+                    elif action < 0.85:
+                        self.db.update_transaction(
+                            rng.choice(own), 'test_user', type_name, amount,
+                            '2024-01-01', 1, account_id, '併發修改'
+                        )
+                    else:
+                        self.db.delete_transaction(own.pop(rng.randrange(len(own))), 'test_user')
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        for account_id in (self.account_a, self.account_b):
+            self.assertEqual(self._balance(account_id), self._expected_balance(account_id))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import asyncio
+import logging
+import threading
+import unittest
+from unittest import mock
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parsers.ai_parser import AIParser
+from parsers.concurrent_ai_parser import ConcurrentAIParser
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class FakeUpstream:
+    """模擬耗時的 Cursor API，記錄呼叫次數與最大同時呼叫數"""
+
+    def __init__(self, delay=0.1):
+        self.delay = delay
+        self.calls = []
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, user_input):
+        with self.lock:
+            self.calls.append(user_input)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        return {"type": "conversation", "data": {"message": user_input, "keywords": []}}
+
+
+class TestConcurrentAIParser(unittest.TestCase):
+    """測試並行上限與相同請求的合併"""
+
+    def setUp(self):
+        patcher = mock.patch.dict(os.environ, {'PARSE_CACHE_SIZE': '0'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.upstream = FakeUpstream()
+
+    def make_parser(self, max_concurrency):
+        parser = AIParser()
+        parser._call_cursor_api = self.upstream
+        concurrent_parser = ConcurrentAIParser(parser, max_concurrency=max_concurrency)
+        self.addCleanup(concurrent_parser.close)
+        return concurrent_parser
+
+    def test_identical_prompts_share_one_upstream_call(self):
+        """同時送出的相同句子只呼叫一次 API，每個呼叫端取得各自的結果副本"""
+        parser = self.make_parser(max_concurrency=4)
+
+        async def burst():
+            return await asyncio.gather(*(parser.parse_text_async("今天天氣如何") for _ in range(20)))
+
+        results = asyncio.run(burst())
+        self.assertEqual(len(self.upstream.calls), 1)
+        self.assertTrue(all(result == results[0] for result in results))
+        self.assertIsNot(results[0], results[1])
+        self.assertEqual(parser.status()["coalesced"], 19)
+
+    def test_concurrency_limit_and_sync_wrapper(self):
+        """不同句子的 API 呼叫數不超過並行上限；parse_text 直接返回結果"""
+        parser = self.make_parser(max_concurrency=2)
+        futures = [parser.submit(f"問題{i}") for i in range(6)]
+        results = [future.result(timeout=5) for future in futures]
+
+        self.assertEqual([result["data"]["message"] for result in results], [f"問題{i}" for i in range(6)])
+        self.assertEqual(len(self.upstream.calls), 6)
+        self.assertEqual(self.upstream.max_running, 2)
+        # 快速匹配可處理的輸入不經過 API
+        self.assertEqual(parser.parse_text("午餐 -120")["type"], "accounting")
+        self.assertEqual(len(self.upstream.calls), 6)
+
+if __name__ == "__main__":
+    unittest.main()
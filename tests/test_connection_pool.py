@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+import sys
+import os
+import logging
+import tempfile
+import threading
+import unittest
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection import ConnectionPool, PoolTimeoutError
+from database.db_utils import DatabaseUtils
+from tests.db_helpers import create_test_database
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class TestConnectionPool(unittest.TestCase):
+    """測試 SQLite 連接池"""
+
+    def setUp(self):
+        """建立臨時資料庫"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = create_test_database(self.tmpdir.name)
+
+    def tearDown(self):
+        """關閉連接池並清除臨時檔案"""
+        ConnectionPool.close_all()
+        self.tmpdir.cleanup()
+
+    def test_reuses_connection_across_calls(self):
+        """連續呼叫應重複使用同一個連接"""
+        db = DatabaseUtils(self.db_path, pool_size=2)
+        for _ in range(10):
+            db.get_accounts('test_user')
+            db.add_category('test_user', '測試', 'expense')
+
+        status = db.pool.status()
+        self.assertEqual(status["opened"], 1)
+        self.assertEqual(status["idle"], 1)
+
+    def test_instances_share_pool(self):
+        """同一路徑的多個實例共用連接池"""
+        first = DatabaseUtils(self.db_path, pool_size=2)
+        second = DatabaseUtils(self.db_path, pool_size=2)
+        self.assertIs(first.pool, second.pool)
+
+    def test_conflicting_pool_settings_warn(self):
+        """同一路徑以不同設定取得連接池時沿用現有連接池並記錄警告"""
+        first = DatabaseUtils(self.db_path, pool_size=2)
+        with self.assertLogs('database.connection', level='WARNING') as logs:
+            second = DatabaseUtils(self.db_path, pool_size=4, profile='durable')
+        self.assertIs(first.pool, second.pool)
+        self.assertEqual(first.pool.max_size, 2)
+        self.assertIn("max_size=2", logs.output[0])
+        self.assertIn("pragmas=", logs.output[0])
+
+    def test_nested_acquire_is_reentrant(self):
+        """同一執行緒巢狀借用返回同一個連接"""
+        pool = ConnectionPool(self.db_path, max_size=1)
+        outer = pool.acquire()
+        inner = pool.acquire()
+        self.assertIs(outer, inner)
+        pool.release(inner)
+        pool.release(outer)
+        self.assertEqual(pool.status()["idle"], 1)
+
+    def test_max_size_times_out(self):
+        """連接全部借出時應在逾時後拋出錯誤"""
+        pool = ConnectionPool(self.db_path, max_size=1, timeout=0.1)
+        conn = pool.acquire()
+
+        errors = []
+        def borrow():
+            try:
+                pool.acquire()
+            except PoolTimeoutError as e:
+                errors.append(e)
+
+        worker = threading.Thread(target=borrow)
+        worker.start()
+        worker.join()
+        pool.release(conn)
+
+        self.assertEqual(len(errors), 1)
+
+    def test_unhealthy_connection_is_replaced(self):
+        """失效的閒置連接應被丟棄並重新建立"""
+        pool = ConnectionPool(self.db_path, max_size=1, health_check_interval=0)
+        conn = pool.acquire()
+        pool.release(conn)
+        conn.close()
+
+        fresh = pool.acquire()
+        self.assertIsNot(fresh, conn)
+        fresh.execute("SELECT 1")
+        pool.release(fresh)
+        self.assertEqual(pool.status()["discarded"], 1)
+
+    def test_uncommitted_work_is_rolled_back_on_release(self):
+        """歸還連接時應回滾未提交的交易"""
+        pool = ConnectionPool(self.db_path, max_size=1)
+        conn = pool.acquire()
+        conn.execute("INSERT INTO users (user_id, display_name) VALUES ('u1', 'x')")
+        pool.release(conn)
+
+        conn = pool.acquire()
+        row = conn.execute("SELECT COUNT(*) FROM users WHERE user_id = 'u1'").fetchone()
+        pool.release(conn)
+        self.assertEqual(row[0], 0)
+
+    def test_close_releases_idle_connections(self):
+        """關閉連接池後不可再借出連接"""
+        db = DatabaseUtils(self.db_path, pool_size=2)
+        db.get_accounts('test_user')
+        db.close()
+        self.assertEqual(db.pool.status()["size"], 0)
+        with self.assertRaises(Exception):
+            db.pool.acquire()
+
+if __name__ == "__main__":
+    unittest.main()
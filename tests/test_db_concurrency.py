@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+import sys
+import os
+import logging
+import sqlite3
+import tempfile
+import threading
+import unittest
+import multiprocessing
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection import ConnectionPool
+from database.db_utils import DatabaseUtils
+from database.profiles import resolve_profile
+from tests.db_helpers import create_test_database
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+WRITES_PER_PROCESS = 300
+READS_PER_THREAD = 300
+
+
+def _writer_process(db_path, worker_id, error_queue):
+    """模擬 web 或 cron 進程持續寫入"""
+    db = DatabaseUtils(db_path, pool_size=1, profile='performance')
+    errors = 0
+    for i in range(WRITES_PER_PROCESS):
+        try:
+            db.execute_update(
+                "INSERT INTO transactions (user_id, account_id, category_id, type, amount, description, date) "
+                "VALUES (?, 1, 1, 'expense', 1, ?, '2024-01-01')",
+                (f"stress_{worker_id}", f"w{worker_id}-{i}")
+            )
+        except sqlite3.OperationalError as e:
+            if 'locked' in str(e) or 'busy' in str(e):
+                errors += 1
+            else:
+                raise
+    error_queue.put(errors)
+
+
+class TestDatabaseConcurrency(unittest.TestCase):
+    """測試 WAL 設定檔下多進程讀寫不會出現鎖定錯誤"""
+
+    def setUp(self):
+        """建立臨時資料庫"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = create_test_database(self.tmpdir.name)
+
+    def tearDown(self):
+        """關閉連接池並清除臨時檔案"""
+        ConnectionPool.close_all()
+        self.tmpdir.cleanup()
+
+    def test_profile_is_applied_on_connect(self):
+        """新連接應套用設定檔的 PRAGMA"""
+        db = DatabaseUtils(self.db_path, pool_size=1, profile='performance')
+        effective = db.check_settings()
+        self.assertEqual(effective["journal_mode"].lower(), "wal")
+        self.assertEqual(effective["synchronous"], 1)
+        self.assertEqual(effective["busy_timeout"], 5000)
+        self.assertEqual(effective["temp_store"], 2)
+
+    def test_environment_overrides_profile(self):
+        """環境變數可以覆寫單一 PRAGMA"""
+        name, pragmas = resolve_profile(environ={
+            'DB_PRAGMA_PROFILE': 'low_memory',
+            'DB_PRAGMA_BUSY_TIMEOUT': '8000'
+        })
+        self.assertEqual(name, 'low_memory')
+        self.assertEqual(pragmas["busy_timeout"], '8000')
+        self.assertEqual(pragmas["cache_size"], -2000)
+
+    def test_concurrent_readers_and_writers(self):
+        """多個寫入進程與讀取執行緒同時運作時不應出現 database is locked"""
+        db = DatabaseUtils(self.db_path, pool_size=4, profile='performance')
+        db.check_settings()
+
+        ctx = multiprocessing.get_context('spawn')
+        error_queue = ctx.Queue()
+        writers = [
+            ctx.Process(target=_writer_process, args=(self.db_path, i, error_queue))
+            for i in range(3)
+        ]
+
+        read_errors = []
+        def reader():
+            for _ in range(READS_PER_THREAD):
+                try:
+                    db.get_transactions('stress_0', limit=20)
+                    db.get_daily_summary('stress_1', '2024-01-01', '2024-01-31')
+                except sqlite3.OperationalError as e:
+                    read_errors.append(e)
+
+        readers = [threading.Thread(target=reader) for _ in range(4)]
+
+        for process in writers:
+            process.start()
+        for thread in readers:
+            thread.start()
+        for thread in readers:
+            thread.join()
+        for process in writers:
+            process.join(timeout=120)
+            self.assertEqual(process.exitcode, 0)
+
+        write_errors = sum(error_queue.get(timeout=10) for _ in writers)
+        self.assertEqual(write_errors, 0)
+        self.assertEqual(read_errors, [])
+
+        total = db.execute_query("SELECT COUNT(*) AS total FROM transactions WHERE user_id LIKE 'stress_%'")
+        self.assertEqual(total[0]["total"], WRITES_PER_PROCESS * len(writers))
+
+if __name__ == "__main__":
+    unittest.main()
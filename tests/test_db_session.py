@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+import sys
+import os
+import logging
+import sqlite3
+import tempfile
+import unittest
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection import ConnectionPool, connections_opened
+from database.db_utils import DatabaseUtils
+from tests.db_helpers import create_test_database
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class TestDatabaseSession(unittest.TestCase):
+    """測試 DatabaseUtils 工作單元"""
+
+    def setUp(self):
+        """建立臨時資料庫"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = create_test_database(self.tmpdir.name)
+        self.db = DatabaseUtils(self.db_path, pool_size=0)
+        self.db.create_user('test_user', '測試用戶')
+        self.account_id = self.db.add_account('test_user', '現金', 0, True)
+
+    def tearDown(self):
+        """關閉連接池並清除臨時檔案"""
+        ConnectionPool.close_all()
+        self.tmpdir.cleanup()
+
+    def _count(self, table):
+        # 使用獨立連接讀取，只能看到已提交的資料
+        conn = self.db.get_connection()
+        try:
+            return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        finally:
+            conn.close()
+
+    def _handler_chain(self):
+        """重現記帳 handler 的資料庫呼叫序列"""
+        accounts = self.db.get_accounts('test_user')
+        category_id = self.db.add_category('test_user', '早餐', 'expense')
+        self.db.add_transaction('test_user', accounts[0]["account_id"], category_id, 'expense', 60, '早餐')
+        self.db.get_accounts('test_user')
+
+    def test_session_uses_single_connection(self):
+        """工作單元中所有輔助方法共用一個連接"""
+        before = connections_opened()
+        with self.db.session():
+            self._handler_chain()
+        self.assertEqual(connections_opened() - before, 1)
+
+    def test_session_commits_once_at_exit(self):
+        """工作單元結束前，其他連接看不到寫入"""
+        with self.db.session():
+            self._handler_chain()
+            self.assertEqual(self._count('transactions'), 0)
+        self.assertEqual(self._count('transactions'), 1)
+
+    def test_session_rolls_back_on_exception(self):
+        """發生例外時整個工作單元回滾"""
+        with self.assertRaises(RuntimeError):
+            with self.db.session():
+                self._handler_chain()
+                raise RuntimeError("處理失敗")
+
+        self.assertEqual(self._count('transactions'), 0)
+        self.assertEqual(self._count("categories WHERE name = '早餐'"), 0)
+        balance = self.db.execute_query("SELECT balance FROM accounts WHERE account_id = ?", (self.account_id,))
+        self.assertEqual(balance[0]["balance"], 0)
+
+    def test_nested_session_joins_outer(self):
+        """巢狀工作單元由外層負責提交"""
+        with self.db.session():
+            with self.db.session(immediate=True):
+                self._handler_chain()
+            self.assertEqual(self._count('transactions'), 0)
+        self.assertEqual(self._count('transactions'), 1)
+
+    def test_immediate_session_takes_write_lock_first(self):
+        """immediate 工作單元在第一次讀取前就持有寫入鎖，其他連接無法插入寫入"""
+        with self.db.session(immediate=True):
+            self.db.get_accounts('test_user')
+            conn = sqlite3.connect(self.db_path, timeout=0)
+            try:
+                with self.assertRaises(sqlite3.OperationalError):
+                    conn.execute("BEGIN IMMEDIATE")
+            finally:
+                conn.close()
+            self._handler_chain()
+        self.assertEqual(self._count('transactions'), 1)
+
+    def test_instances_share_session(self):
+        """同一資料庫的其他實例也會加入工作單元"""
+        other = DatabaseUtils(self.db_path, pool_size=2)
+        with self.db.session():
+            other.add_category('test_user', '午餐', 'expense')
+            self.assertEqual(self._count("categories WHERE name = '午餐'"), 0)
+        self.assertEqual(self._count("categories WHERE name = '午餐'"), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import logging
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection import ConnectionPool
+from database.db_utils import DatabaseUtils
+from database.report_cache import ReportCache
+from events.dedup import EventDeduplicator
+from tests.db_helpers import create_test_database
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def make_event(event_id, is_redelivery=False):
+    """建立帶有 webhookEventId 與 deliveryContext 的測試事件"""
+    return SimpleNamespace(
+        webhook_event_id=event_id,
+        delivery_context=SimpleNamespace(is_redelivery=is_redelivery)
+    )
+
+
+class TestEventDeduplicator(unittest.TestCase):
+    """測試 webhook 重送事件的去重"""
+
+    def setUp(self):
+        """建立臨時資料庫"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db = DatabaseUtils(create_test_database(self.tmpdir.name), pool_size=1)
+
+    def tearDown(self):
+        """關閉連接池、清空快取並清除臨時檔案"""
+        ConnectionPool.close_all()
+        ReportCache.clear_all()
+        self.tmpdir.cleanup()
+
+    def test_redelivered_event_is_skipped(self):
+        """同一個事件第二次送達時略過，沒有 ID 的事件一律處理"""
+        dedup = EventDeduplicator(self.db)
+        self.assertTrue(dedup.claim(make_event('evt1')))
+        self.assertFalse(dedup.claim(make_event('evt1', is_redelivery=True)))
+        self.assertTrue(dedup.claim(make_event('evt2')))
+        self.assertTrue(dedup.claim(SimpleNamespace()))
+        self.assertTrue(dedup.claim(SimpleNamespace()))
+
+        status = dedup.status()
+        self.assertEqual(status["duplicates"], 1)
+        self.assertEqual(status["memory_hits"], 1)
+        self.assertEqual(status["redeliveries"], 1)
+
+    def test_store_catches_duplicates_after_restart_or_eviction(self):
+        """記憶體已淘汰或進程重啟後，仍由資料表辨識重送"""
+        dedup = EventDeduplicator(self.db, capacity=2)
+        for i in range(5):
+            self.assertTrue(dedup.claim(make_event(f"evt{i}")))
+        self.assertEqual(dedup.status()["recent"], 2)
+        self.assertFalse(dedup.claim(make_event('evt0', is_redelivery=True)))
+
+        restarted = EventDeduplicator(self.db)
+        self.assertFalse(restarted.claim(make_event('evt3', is_redelivery=True)))
+        self.assertEqual(restarted.status()["store_hits"], 1)
+
+    def test_expired_records_are_pruned(self):
+        """超過保留期限的事件記錄會被刪除"""
+        self.db.claim_webhook_event('old', time.time() - 7200)
+        dedup = EventDeduplicator(self.db, ttl=3600, prune_interval=0)
+        self.assertTrue(dedup.claim(make_event('new')))
+
+        rows = self.db.execute_query("SELECT event_id FROM webhook_events")
+        self.assertEqual([row["event_id"] for row in rows], ['new'])
+        self.assertEqual(dedup.status()["pruned"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
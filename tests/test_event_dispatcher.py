@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import logging
+import threading
+import unittest
+from types import SimpleNamespace
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from events.dispatcher import EventDispatcher, ReplyFallbackApi
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def make_event(reply_token, age=0.0, user_id='test_user', group_id=None):
+    """建立與 LINE webhook 事件具有相同欄位的測試事件"""
+    return SimpleNamespace(
+        reply_token=reply_token,
+        timestamp=int((time.time() - age) * 1000),
+        source=SimpleNamespace(user_id=user_id, group_id=group_id)
+    )
+
+
+class RecordingApi:
+    """記錄回覆與推播呼叫的 MessagingApi 替身"""
+
+    def __init__(self):
+        self.calls = []
+
+    def reply_message_with_http_info(self, request):
+        self.calls.append(('reply', request.reply_token))
+
+    def push_message_with_http_info(self, request):
+        self.calls.append(('push', request["to"]))
+
+
+class TestEventDispatcher(unittest.TestCase):
+    """測試 webhook 事件的非同步派送"""
+
+    def test_submit_returns_before_processing(self):
+        """事件入列後立即返回，停止時處理完佇列中剩餘的事件"""
+        processed = []
+
+        def slow_process(event):
+            time.sleep(0.05)
+            processed.append(event.reply_token)
+
+        dispatcher = EventDispatcher(slow_process, workers=2, queue_size=100).start()
+        started = time.monotonic()
+        for i in range(10):
+            self.assertTrue(dispatcher.submit(make_event(f"token{i}")))
+        self.assertLess(time.monotonic() - started, 0.05)
+
+        self.assertEqual(dispatcher.shutdown(timeout=5), 0)
+        self.assertEqual(sorted(processed), sorted(f"token{i}" for i in range(10)))
+        status = dispatcher.status()
+        self.assertEqual(status["processed"], 10)
+        self.assertEqual(status["depth"], 0)
+        self.assertFalse(dispatcher.submit(make_event('late')))
+
+    def test_full_queue_is_rejected_and_counted(self):
+        """佇列已滿時拒絕事件並記錄於背壓指標"""
+        release = threading.Event()
+        dispatcher = EventDispatcher(lambda event: release.wait(), workers=1, queue_size=1, enqueue_timeout=0.01)
+        dispatcher.start()
+        try:
+            self.assertTrue(dispatcher.submit(make_event('a')))
+            # 等待工作執行緒取走第一個事件
+            while dispatcher.status()["in_flight"] == 0:
+                time.sleep(0.001)
+            self.assertTrue(dispatcher.submit(make_event('b')))
+            self.assertFalse(dispatcher.submit(make_event('c')))
+            status = dispatcher.status()
+            self.assertEqual(status["rejected"], 1)
+            self.assertEqual(status["depth"], 1)
+        finally:
+            release.set()
+            dispatcher.shutdown(timeout=5)
+
+    def test_partitions_keep_order_and_run_in_parallel(self):
+        """同一用戶的事件依序處理，慢速用戶不擋住其他用戶"""
+        finished = []
+        lock = threading.Lock()
+
+        def process(event):
+            if event.source.user_id == 'slow_user':
+                time.sleep(0.05)
+            with lock:
+                finished.append((event.source.user_id, event.reply_token))
+
+        dispatcher = EventDispatcher(process, workers=2).start()
+        # 同一群組中的兩位用戶交錯送出事件
+        for i in range(4):
+            dispatcher.submit(make_event(i, user_id='slow_user', group_id='group1'))
+            dispatcher.submit(make_event(i, user_id='fast_user', group_id='group1'))
+        dispatcher.shutdown(timeout=5)
+
+        for user_id in ('slow_user', 'fast_user'):
+            self.assertEqual([token for user, token in finished if user == user_id], [0, 1, 2, 3])
+        # 快速用戶的事件全部在慢速用戶第二個事件之前完成
+        self.assertLess(finished.index(('fast_user', 3)), finished.index(('slow_user', 1)))
+        self.assertEqual(dispatcher.status()["max_partitions"], 2)
+
+    def test_stale_reply_token_falls_back_to_push(self):
+        """回覆令牌過期的事件改以推播送到來源聊天室"""
+        api = RecordingApi()
+        dispatcher = EventDispatcher(None, workers=1, reply_ttl=50)
+        wrapped = ReplyFallbackApi(api, dispatcher, lambda target, messages: {"to": target, "messages": messages})
+
+        def process(event):
+            wrapped.reply_message_with_http_info(SimpleNamespace(reply_token=event.reply_token, messages=['hi']))
+
+        dispatcher.process = process
+        dispatcher.start()
+        dispatcher.submit(make_event('fresh'))
+        dispatcher.submit(make_event('stale', age=120, group_id='group1'))
+        dispatcher.shutdown(timeout=5)
+
+        self.assertEqual(api.calls, [('reply', 'fresh'), ('push', 'group1')])
+        self.assertEqual(dispatcher.status()["push_fallbacks"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+import sys
+import os
+import logging
+import tempfile
+import unittest
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection import ConnectionPool
+from database.db_utils import DatabaseUtils
+from tests.db_helpers import create_test_database
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class TestIterQuery(unittest.TestCase):
+    """測試單筆查詢與串流查詢"""
+
+    def setUp(self):
+        """建立臨時資料庫並寫入測試交易"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = create_test_database(self.tmpdir.name)
+        self.db = DatabaseUtils(self.db_path, pool_size=1)
+        self.db.create_user('test_user', '測試用戶')
+        self.db.execute_many(
+            "INSERT INTO transactions (user_id, account_id, category_id, type, amount, description, date) "
+            "VALUES ('test_user', 1, 1, 'expense', ?, ?, '2024-01-01')",
+            [(i, f"第{i}筆") for i in range(1, 1001)]
+        )
+
+    def tearDown(self):
+        """關閉連接池並清除臨時檔案"""
+        ConnectionPool.close_all()
+        self.tmpdir.cleanup()
+
+    def test_fetchone_returns_first_row(self):
+        """fetchall=False 應返回第一筆，且只有一筆結果時也能正常運作"""
+        user = self.db.get_user('test_user')
+        self.assertEqual(user["display_name"], '測試用戶')
+
+        row = self.db.execute_query(
+            "SELECT amount FROM transactions ORDER BY amount", fetchall=False
+        )
+        self.assertEqual(row["amount"], 1)
+        self.assertIsNone(self.db.execute_query(
+            "SELECT * FROM users WHERE user_id = 'nobody'", fetchall=False
+        ))
+
+    def test_iter_query_streams_all_rows(self):
+        """串流查詢應依序返回所有資料"""
+        query = "SELECT transaction_id, amount FROM transactions ORDER BY amount"
+        amounts = [row["amount"] for row in self.db.iter_query(query, chunk_size=64)]
+        self.assertEqual(amounts, list(range(1, 1001)))
+
+    def test_row_types(self):
+        """支援 tuple 與 namedtuple 格式"""
+        query = "SELECT amount, description FROM transactions ORDER BY amount LIMIT 1"
+        self.assertEqual(next(self.db.iter_query(query, row_type='tuple')), (1, '第1筆'))
+
+        row = next(self.db.iter_query(query, row_type='namedtuple'))
+        self.assertEqual(row.amount, 1)
+        self.assertEqual(row.description, '第1筆')
+
+        with self.assertRaises(ValueError):
+            next(self.db.iter_query(query, row_type='list'))
+
+    def test_connection_released_when_closed_early(self):
+        """提前結束迭代時應歸還連接"""
+        rows = self.db.iter_query("SELECT * FROM transactions", chunk_size=10)
+        next(rows)
+        self.assertEqual(self.db.pool.status()["idle"], 0)
+        rows.close()
+        self.assertEqual(self.db.pool.status()["idle"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
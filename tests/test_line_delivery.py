@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+import sys
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from linebot.v3.messaging import ApiClient, Configuration, MessagingApi, TextMessage
+
+import scheduler.delivery as delivery_module
+from scheduler.delivery import BulkPusher
+from database.connection import ConnectionPool
+from database.db_utils import DatabaseUtils, reminder_title_key
+from database.timeutil import DB_TIME_FORMAT, local_now
+from database.report_cache import ReportCache
+from scheduler.reminder_scheduler import ReminderScheduler
+from handlers.message_handler import MessageHandler
+from tests.db_helpers import create_test_database
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class StubLineApi(BaseHTTPRequestHandler):
+    """本地的 LINE Messaging API 替身：記錄 push 與 multicast 請求，依序回應 server.statuses 中的狀態碼"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        server = self.server
+        with server.lock:
+            status = server.statuses.pop(0) if server.statuses else 200
+            server.requests.append((self.path, body, self.headers.get('X-Line-Retry-Key'), status))
+
+        if status != 200:
+            payload = {"message": "error"}
+        elif self.path.endswith('/push'):
+            payload = {"sentMessages": [{"id": str(i), "quoteToken": "q"} for i, _ in enumerate(body["messages"])]}
+        else:
+            payload = {}
+        payload = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestLineDelivery(unittest.TestCase):
+    """測試提醒通知的 multicast 合併、訊息分批、限流與重試"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubLineApi)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.statuses = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        configuration = Configuration(host=f'http://127.0.0.1:{self.server.server_port}', access_token='test-token')
+        self.api = MessagingApi(ApiClient(configuration))
+        patcher = mock.patch.object(delivery_module, 'backoff_delay', return_value=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def requests_to(self, path):
+        return [body for request_path, body, _, _ in self.server.requests if request_path == path]
+
+    def test_identical_payloads_are_multicast(self):
+        """內容相同的訊息每 500 位收件者一個 multicast 請求，每個請求最多 5 則訊息"""
+        pusher = BulkPusher(self.api, rate=0, workers=4)
+        notice = [TextMessage(text='繳費日')]
+        deliveries = [(f'U{i}', notice) for i in range(1001)]
+        deliveries.append(('Ulong', [TextMessage(text=f'提醒 {i}') for i in range(7)]))
+
+        self.assertEqual(pusher.send(deliveries), {})
+        multicasts = self.requests_to('/v2/bot/message/multicast')
+        pushes = self.requests_to('/v2/bot/message/push')
+        self.assertEqual(sorted(len(body["to"]) for body in multicasts), [500, 500])
+        self.assertEqual(sorted((body["to"], len(body["messages"])) for body in pushes),
+                         [('U1000', 1), ('Ulong', 2), ('Ulong', 5)])
+        self.assertEqual(pusher.status()["requests"], 5)
+        pusher.close()
+
+    def test_retries_transient_errors_with_same_key(self):
+        """429 與 5xx 以同一個重試鍵重試，400 不重試並回報收件者"""
+        pusher = BulkPusher(self.api, rate=0, workers=1, max_retries=3)
+        self.server.statuses = [429, 503]
+        self.assertEqual(pusher.send([('U1', [TextMessage(text='a')]), ('U2', [TextMessage(text='a')])]), {})
+        keys = [key for _, _, key, _ in self.server.requests]
+        self.assertEqual(len(keys), 3)
+        self.assertEqual(len(set(keys)), 1)
+
+        self.server.statuses = [400]
+        errors = pusher.send([('U3', [TextMessage(text='b')])])
+        self.assertEqual(list(errors), ['U3'])
+        self.assertEqual(len(self.server.requests), 4)
+        self.assertEqual(pusher.status()["retries"], 2)
+        pusher.close()
+
+    def test_rate_limit_paces_requests(self):
+        """超過每秒請求數時等待權杖"""
+        pusher = BulkPusher(self.api, rate=10, workers=4)
+        start = time.monotonic()
+        pusher.send([(f'U{i}', [TextMessage(text=str(i))]) for i in range(15)])
+        # 前 10 個請求立即送出，其餘 5 個需要約 0.5 秒
+        self.assertGreaterEqual(time.monotonic() - start, 0.4)
+        self.assertEqual(len(self.server.requests), 15)
+        pusher.close()
+
+    def test_shared_reminder_sent_as_one_multicast(self):
+        """多位用戶同一時間、同一標題的提醒卡片與相同的提醒列表各合併成一個 multicast 請求"""
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        db = DatabaseUtils(create_test_database(tmpdir.name), pool_size=2)
+        due = (local_now() + timedelta(minutes=30)).strftime(DB_TIME_FORMAT)
+        for user_id in ('U1', 'U2'):
+            db.create_user(user_id, user_id)
+            db.add_reminder(user_id, '繳費日', due, remind_before=60)
+        # U5 同時有兩個相同的提醒，按鈕改帶各自的提醒 ID
+        db.create_user('U5', 'U5')
+        duplicates = [db.add_reminder('U5', '繳費日', due, remind_before=60) for _ in range(2)]
+        for user_id in ('U3', 'U4'):
+            db.create_user(user_id, user_id)
+            for i in range(6):
+                db.add_reminder(user_id, f'繳費日 {i}', due, remind_before=60)
+
+        scheduler = ReminderScheduler(self.api, db, pusher=BulkPusher(self.api, rate=0))
+        try:
+            self.assertEqual(scheduler.check_reminders(), 16)
+        finally:
+            scheduler.pusher.close()
+            ConnectionPool.close_all()
+            ReportCache.clear_all()
+
+        def postbacks(body):
+            return [json.loads(message["contents"]["footer"]["contents"][0]["action"]["data"])
+                    for message in body["messages"] if message["type"] == "flex"]
+
+        multicasts = self.requests_to('/v2/bot/message/multicast')
+        pushes = self.requests_to('/v2/bot/message/push')
+        self.assertEqual(sorted(sorted(body["to"]) for body in multicasts), [['U1', 'U2'], ['U3', 'U4']])
+        self.assertEqual([body["to"] for body in pushes], ['U5'])
+        card = next(body for body in multicasts if 'U1' in body["to"])
+        self.assertEqual(postbacks(card), [{"action": "complete_reminder", "due_date": due,
+                                            "title_key": reminder_title_key('繳費日')}])
+        self.assertEqual(postbacks(pushes[0]), [{"action": "complete_reminder", "reminder_id": reminder_id}
+                                                for reminder_id in duplicates])
+
+    def test_complete_button_targets_one_reminder(self):
+        """完成按鈕只完成卡片上的提醒；以標題與時間識別的按鈕遇到重複的提醒時不做變更"""
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        db = DatabaseUtils(create_test_database(tmpdir.name), pool_size=2)
+        self.addCleanup(ReportCache.clear_all)
+        self.addCleanup(ConnectionPool.close_all)
+        due = (local_now() + timedelta(minutes=30)).strftime(DB_TIME_FORMAT)
+        db.create_user('U1', 'U1')
+        first = db.add_reminder('U1', '吃藥', due)
+        second = db.add_reminder('U1', '吃藥', due)
+        other = db.add_reminder('U1', '開會', due)
+
+        line_bot_api = mock.Mock()
+        handler = MessageHandler(line_bot_api=line_bot_api, db=db)
+
+        def click(data):
+            event = mock.Mock(reply_token='token', postback=mock.Mock(data=json.dumps(data, ensure_ascii=False)))
+            event.source.user_id = 'U1'
+            handler.handle_postback(event)
+            request = line_bot_api.reply_message_with_http_info.call_args[0][0]
+            return request.messages[0].text
+
+        def completed():
+            rows = db.execute_query("SELECT reminder_id FROM reminders WHERE is_completed = 1")
+            return sorted(row["reminder_id"] for row in rows)
+
+        self.assertIn("有多個相同的提醒", click({"action": "complete_reminder", "title": "吃藥", "due_date": due}))
+        self.assertEqual(completed(), [])
+
+        self.assertIn("已標記為完成", click({"action": "complete_reminder", "reminder_id": first}))
+        self.assertEqual(completed(), [first])
+
+        # 只剩一個符合的未完成提醒時，舊版按鈕可以完成它
+        self.assertIn("已標記為完成", click({"action": "complete_reminder", "title": "吃藥", "due_date": due}))
+        self.assertEqual(completed(), sorted([first, second]))
+        self.assertIn("無法找到", click({"action": "complete_reminder", "title": "吃藥", "due_date": due}))
+
+        # 共用通知的按鈕以標題雜湊識別
+        self.assertIn("已標記為完成", click({"action": "complete_reminder", "due_date": due,
+                                          "title_key": reminder_title_key('開會')}))
+        self.assertEqual(completed(), sorted([first, second, other]))
+
+if __name__ == "__main__":
+    unittest.main()
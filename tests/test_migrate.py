@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+import sys
+import os
+import logging
+import sqlite3
+import tempfile
+import unittest
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.migrate import MigrationRunner, MIGRATIONS_DIR
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+SCHEMA_PATH = os.path.join(os.path.dirname(MIGRATIONS_DIR), 'schema.sql')
+
+
+class TestMigrationRunner(unittest.TestCase):
+    """測試版本化遷移執行器"""
+
+    def setUp(self):
+        """建立臨時目錄"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'test.db')
+
+    def tearDown(self):
+        """清除臨時檔案"""
+        self.tmpdir.cleanup()
+
+    def _columns(self, table):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        finally:
+            conn.close()
+
+    def _create_legacy_database(self, reminders=0):
+        """模擬導入遷移前由 init_db.py 建立的資料庫"""
+        conn = sqlite3.connect(self.db_path)
+        with open(SCHEMA_PATH, 'r', encoding='utf-8') as f:
+            conn.executescript(f.read())
+        conn.executemany(
+            "INSERT INTO reminders (user_id, title, due_date, remind_before, is_completed) VALUES (?, ?, ?, ?, ?)",
+            [('test_user', f"提醒{i}", '2024-01-01 09:00:00', 10, i % 2) for i in range(reminders)]
+        )
+        conn.executemany(
+            "INSERT INTO transactions (user_id, type, amount, date) VALUES ('test_user', 'expense', ?, '2024-01-01')",
+            [(amount,) for amount in (10, 20, 30)]
+        )
+        conn.commit()
+        conn.close()
+
+    def test_fresh_database_applies_all_migrations(self):
+        """新資料庫應套用所有遷移，再次執行不做任何事"""
+        runner = MigrationRunner(self.db_path)
+        results = runner.run()
+
+        self.assertEqual([r["version"] for r in results], [m.version for m in runner.discover()])
+        self.assertIn('status', self._columns('reminders'))
+        self.assertIn('last_sync', self._columns('users'))
+        self.assertEqual(runner.run(), [])
+
+    def test_dry_run_does_not_modify_database(self):
+        """dry-run 只列出操作，不建立資料庫也不記錄版本"""
+        results = MigrationRunner(self.db_path).run(dry_run=True)
+        self.assertTrue(results)
+        self.assertTrue(all(r["planned"] for r in results))
+        self.assertFalse(os.path.exists(self.db_path))
+
+        self._create_legacy_database(reminders=3)
+        results = MigrationRunner(self.db_path).run(dry_run=True)
+        self.assertNotIn('status', self._columns('reminders'))
+        self.assertTrue(any('3 筆' in statement for r in results for statement in r["planned"]))
+
+    def test_legacy_database_is_backfilled_in_batches(self):
+        """既有資料庫升級時分批回填提醒欄位並填入彙總表"""
+        self._create_legacy_database(reminders=25)
+        with self.assertLogs('database.migrate', level='INFO') as logs:
+            MigrationRunner(self.db_path, batch_size=10).run()
+
+        batches = [line for line in logs.output if '回填 reminders' in line]
+        self.assertEqual(len(batches), 3)
+
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute(
+            "SELECT COUNT(*) FROM reminders WHERE content = title AND datetime = due_date "
+            "AND notify_before = remind_before AND status = CASE WHEN is_completed THEN 'completed' ELSE 'pending' END"
+        ).fetchone()
+        rollup = conn.execute(
+            "SELECT total_amount, transaction_count FROM transaction_daily_rollups WHERE user_id = 'test_user'"
+        ).fetchone()
+        conn.close()
+        self.assertEqual(rows[0], 25)
+        # 既有交易應填入彙總表
+        self.assertEqual(rollup, (60, 3))
+
+    def test_triggers_keep_line_and_web_columns_in_sync(self):
+        """LINE 端與網頁端欄位透過觸發器保持一致"""
+        MigrationRunner(self.db_path).run()
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(
+            "INSERT INTO reminders (user_id, title, due_date) VALUES ('test_user', '繳費', '2024-01-01 09:00:00')"
+        )
+        row = conn.execute("SELECT content, datetime, status FROM reminders").fetchone()
+        self.assertEqual(row, ('繳費', '2024-01-01 09:00:00', 'pending'))
+
+        conn.execute("UPDATE reminders SET status = 'completed', content = '繳電費'")
+        row = conn.execute("SELECT title, is_completed FROM reminders").fetchone()
+        self.assertEqual(row, ('繳電費', 1))
+
+        conn.execute("UPDATE reminders SET is_completed = 0")
+        row = conn.execute("SELECT status, completed_at FROM reminders").fetchone()
+        self.assertEqual(row, ('pending', None))
+        conn.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+import sys
+import os
+import logging
+import tempfile
+import unittest
+from unittest import mock
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection import ConnectionPool
+from database.db_utils import DatabaseUtils
+from database.pagination import InvalidCursorError, encode_cursor
+from database.report_cache import ReportCache
+from tests.db_helpers import create_test_database
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class TestKeysetPagination(unittest.TestCase):
+    """測試交易列表的 keyset 分頁"""
+
+    def setUp(self):
+        """建立臨時資料庫，同一天有多筆交易以測試排序鍵的第二欄"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = create_test_database(self.tmpdir.name)
+        self.db = DatabaseUtils(self.db_path, pool_size=1)
+        self.db.execute_many(
+            "INSERT INTO transactions (user_id, account_id, category_id, type, amount, date) "
+            "VALUES ('test_user', 1, ?, ?, ?, ?)",
+            [
+                (i % 3 + 1, 'income' if i % 4 == 0 else 'expense', i, f"2024-{i % 12 + 1:02d}-{i % 5 + 1:02d}")
+                for i in range(2000)
+            ]
+        )
+
+    def tearDown(self):
+        """關閉連接池、清空快取並清除臨時檔案"""
+        ConnectionPool.close_all()
+        ReportCache.clear_all()
+        self.tmpdir.cleanup()
+
+    def _walk(self, limit, **filters):
+        ids, cursor, pages = [], None, 0
+        while True:
+            rows, cursor = self.db.get_transactions_page(
+                'test_user', '2024-01-01', '2024-12-31', limit=limit, cursor=cursor, **filters
+            )
+            ids.extend(row["transaction_id"] for row in rows)
+            pages += 1
+            if cursor is None:
+                return ids, pages
+
+    def test_pages_cover_all_rows_in_order(self):
+        """依游標逐頁讀取的結果應與一次排序讀取完全相同"""
+        expected = [
+            row["transaction_id"] for row in self.db.execute_query(
+                "SELECT transaction_id FROM transactions WHERE user_id = 'test_user' "
+                "ORDER BY date DESC, transaction_id DESC"
+            )
+        ]
+        ids, pages = self._walk(limit=70)
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 29)
+
+        ids, _ = self._walk(limit=100, type_name='income', category_id=2)
+        rows = self.db.execute_query(
+            "SELECT type, category_id FROM transactions WHERE transaction_id IN (%s)" % ",".join(map(str, ids))
+        )
+        self.assertTrue(all(row["type"] == 'income' and row["category_id"] == 2 for row in rows))
+
+    def test_invalid_or_mismatched_cursor_is_rejected(self):
+        """格式錯誤或不同查詢條件的游標應被拒絕"""
+        with self.assertRaises(InvalidCursorError):
+            self.db.get_transactions_page('test_user', '2024-01-01', '2024-12-31', cursor='not-a-cursor')
+
+        _, cursor = self.db.get_transactions_page('test_user', '2024-01-01', '2024-12-31', limit=10)
+        with self.assertRaises(InvalidCursorError):
+            self.db.get_transactions_page('test_user', '2024-01-01', '2024-12-31', type_name='income', cursor=cursor)
+        with self.assertRaises(InvalidCursorError):
+            self.db.get_transactions_page('other_user', '2024-01-01', '2024-12-31', cursor=cursor)
+
+    def test_deep_page_uses_index_without_sort(self):
+        """深層分頁的查詢計畫應沿索引讀取，不需排序"""
+        cursor = encode_cursor('2024-06-01', 1000, {
+            "user_id": 'test_user', "start_date": '2024-01-01', "end_date": '2024-12-31'
+        })
+        with mock.patch.object(self.db, 'execute_query', wraps=self.db.execute_query) as spy:
+            self.db.get_transactions_page('test_user', '2024-01-01', '2024-12-31', cursor=cursor)
+        query, params = spy.call_args[0]
+
+        with self.db.connection() as conn:
+            plan = [row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+        self.assertTrue(plan[0].startswith('SEARCH t USING INDEX'), plan)
+        self.assertFalse(any('TEMP B-TREE' in detail for detail in plan), plan)
+
+    def test_count_from_rollups(self):
+        """總筆數由日彙總表計算，結果與直接計數相同"""
+        self.assertEqual(self.db.count_transactions('test_user', '2024-01-01', '2024-12-31'), 2000)
+        raw = self.db.execute_query(
+            "SELECT COUNT(*) AS total FROM transactions WHERE user_id = 'test_user' AND type = 'expense' "
+            "AND category_id = 1 AND date BETWEEN '2024-03-01' AND '2024-06-30'"
+        )[0]["total"]
+        self.assertEqual(
+            self.db.count_transactions('test_user', '2024-03-01', '2024-06-30', 'expense', 1), raw
+        )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+import sys
+import os
+import logging
+import unittest
+from datetime import datetime
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parsers.parse_cache import ParseCache
+from parsers.text_parser import TextParser, reference_time
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'parser_corpus.txt')
+
+
+class TestParseCache(unittest.TestCase):
+    """測試解析結果快取"""
+
+    def test_repeated_phrase_hits_cache(self):
+        """相同的句子命中快取，修改返回值不影響快取內容"""
+        parser = TextParser(cache_size=16)
+        first = parser.parse_text("午餐 -120")
+        first["data"]["amount"] = 0
+        second = parser.parse_text("午餐 -120")
+
+        self.assertEqual(second["data"]["amount"], 120)
+        status = parser.cache.status()
+        self.assertEqual((status["hits"], status["misses"], status["entries"]), (1, 1, 1))
+        self.assertEqual(status["hit_rate"], 0.5)
+
+    def test_cache_does_not_change_results(self):
+        """啟用與停用快取的解析結果相同，空白不同的句子各自解析"""
+        with open(CORPUS_PATH, 'r', encoding='utf-8') as f:
+            corpus = [line.rstrip('\n') for line in f if line.strip() and not line.startswith('#')]
+        texts = []
+        for text in corpus:
+            texts.extend([text, f" {text} ", text.replace(' ', '　'), text.replace(' ', '  ')])
+
+        cached = TextParser(cache_size=4096)
+        uncached = TextParser(cache_size=0)
+        with reference_time(datetime(2024, 3, 10, 9, 0)):
+            expected = [uncached.parse_text(text) for text in texts]
+            # 第二輪全部來自快取
+            for _ in range(2):
+                self.assertEqual([cached.parse_text(text) for text in texts], expected)
+        self.assertGreater(cached.cache.stats["hits"], 0)
+
+    def test_relative_dates_follow_reference_day(self):
+        """換日後重新解析，今天/昨天不會沿用快取中的舊日期"""
+        parser = TextParser(cache_size=16)
+        with reference_time(datetime(2024, 3, 10, 9, 0)):
+            self.assertEqual(parser.parse_text("昨天 午餐 -120")["data"]["date"], "2024-03-09")
+        with reference_time(datetime(2024, 3, 10, 21, 0)):
+            self.assertEqual(parser.parse_text("昨天 午餐 -120")["data"]["date"], "2024-03-09")
+        with reference_time(datetime(2024, 3, 11, 8, 0)):
+            self.assertEqual(parser.parse_text("昨天 午餐 -120")["data"]["date"], "2024-03-10")
+        self.assertEqual(parser.cache.stats["hits"], 1)
+
+    def test_size_cap_evicts_least_recently_used(self):
+        """超過筆數上限時淘汰最久未使用的項目"""
+        cache = ParseCache(max_entries=2)
+        cache.put("a", {"type": "conversation"})
+        cache.put("b", {"type": "conversation"})
+        cache.get("a")
+        cache.put("c", {"type": "conversation"})
+
+        self.assertEqual(cache.get("b"), (False, None))
+        self.assertTrue(cache.get("a")[0])
+        self.assertEqual(cache.status()["evictions"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
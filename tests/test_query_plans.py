@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+import sys
+import os
+import re
+import logging
+import tempfile
+import unittest
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection import ConnectionPool
+from database.db_utils import DatabaseUtils
+from tests.db_helpers import create_test_database
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 對 transactions 做全表掃描的查詢計畫（SEARCH 表示有使用索引條件）
+FULL_SCAN = re.compile(r'^SCAN (t|transactions)\b')
+
+
+class RecordingDatabaseUtils(DatabaseUtils):
+    """記錄所有執行過的查詢，以便對實際 SQL 取得查詢計畫"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.recorded = []
+
+    def execute_query(self, query, params=(), fetchall=True):
+        self.recorded.append((query, params))
+        return super().execute_query(query, params, fetchall)
+
+
+class TestQueryPlans(unittest.TestCase):
+    """確認交易熱路徑查詢都有使用索引"""
+
+    @classmethod
+    def setUpClass(cls):
+        """建立臨時資料庫並寫入足量資料，讓查詢規劃器的選擇接近正式環境"""
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.db_path = create_test_database(cls.tmpdir.name)
+        cls.db = RecordingDatabaseUtils(cls.db_path, pool_size=1)
+        # 不使用報表快取，確保每次呼叫都實際執行查詢
+        cls.db.report_cache = None
+        rows = [
+            (f"user_{i % 50}", 1, i % 12 + 1, 'income' if i % 7 == 0 else 'expense',
+             i % 300, f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}")
+            for i in range(5000)
+        ]
+        cls.db.execute_many(
+            "INSERT INTO transactions (user_id, account_id, category_id, type, amount, date) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        """關閉連接池並清除臨時檔案"""
+        ConnectionPool.close_all()
+        cls.tmpdir.cleanup()
+
+    def _plan(self, query, params):
+        with self.db.connection() as conn:
+            return [row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+
+    def assertUsesIndex(self, query, params):
+        plan = self._plan(query, params)
+        scans = [detail for detail in plan if FULL_SCAN.match(detail)]
+        self.assertEqual(scans, [], f"查詢退化為全表掃描：{plan}\n{query}")
+        return plan
+
+    def _recorded_call(self, method, *args):
+        self.db.recorded.clear()
+        method(*args)
+        self.assertEqual(len(self.db.recorded), 1)
+        return self.db.recorded[0]
+
+    def test_get_transactions(self):
+        """交易列表應依索引順序讀取，不需暫存排序"""
+        for args in [
+            ('user_1',),
+            ('user_1', '2024-01-01', '2024-03-31'),
+            ('user_1', '2024-01-01', '2024-03-31', 'expense'),
+            ('user_1', '2024-01-01', '2024-03-31', 'expense', 3),
+        ]:
+            query, params = self._recorded_call(self.db.get_transactions, *args)
+            plan = self.assertUsesIndex(query, params)
+            if len(args) < 4:
+                self.assertFalse(any('TEMP B-TREE' in detail for detail in plan), plan)
+
+    def assertSearchesRollup(self, plan):
+        self.assertTrue(
+            any(re.match(r'^SEARCH (r|\w*_rollups) USING PRIMARY KEY \(user_id=\?', detail) for detail in plan), plan
+        )
+
+    def test_category_summaries(self):
+        """分類摘要應以主鍵範圍讀取日彙總表"""
+        for method in (self.db.get_expense_summary_by_category, self.db.get_income_summary_by_category):
+            query, params = self._recorded_call(method, 'user_1', '2024-01-01', '2024-12-31')
+            self.assertSearchesRollup(self.assertUsesIndex(query, params))
+
+    def test_daily_and_monthly_summary(self):
+        """每日與月度摘要應以主鍵範圍讀取彙總表"""
+        for method, args in [
+            (self.db.get_daily_summary, ('user_1', '2024-01-01', '2024-01-31')),
+            (self.db.get_monthly_summary, ('user_1', 2024)),
+        ]:
+            query, params = self._recorded_call(method, *args)
+            self.assertSearchesRollup(self.assertUsesIndex(query, params))
+
+    def test_monthly_summary_results(self):
+        """改用日期範圍後結果不變"""
+        expected = self.db.execute_query(
+            """
+            SELECT strftime('%m', date) as month, SUM(amount) as total
+            FROM transactions
+            WHERE user_id = ? AND strftime('%Y', date) = ?
+            GROUP BY strftime('%m', date)
+            ORDER BY month
+            """,
+            ('user_1', '2024')
+        )
+        months = self.db.get_monthly_summary('user_1', '2024')
+        self.assertEqual([row["month"] for row in months], [row["month"] for row in expected])
+        self.assertEqual(
+            [row["total_income"] + row["total_expense"] for row in months],
+            [row["total"] for row in expected]
+        )
+        self.assertEqual(self.db.get_monthly_summary('user_1', 2023), [])
+
+    def test_transactions_page(self):
+        """網頁交易列表的 keyset 分頁查詢不應全表掃描"""
+        for args in [
+            ('user_1', '2024-01-01', '2024-12-31'),
+            ('user_1', '2024-01-01', '2024-12-31', 'expense'),
+            ('user_1', '2024-01-01', '2024-12-31', 'expense', 3),
+        ]:
+            query, params = self._recorded_call(self.db.get_transactions_page, *args)
+            self.assertUsesIndex(query, params)
+
+    def test_due_reminders_page(self):
+        """排程器的提醒查詢應以到期時間索引讀取範圍，依索引順序分頁"""
+        self.db.execute_many(
+            "INSERT INTO reminders (user_id, title, due_date, remind_before, is_completed) VALUES (?, ?, ?, ?, ?)",
+            [(f"user_{i % 50}", '提醒', f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}T09:00:00", 30, i % 3 == 0)
+             for i in range(5000)]
+        )
+        query, params = self._recorded_call(
+            self.db.get_due_reminders_page, '2024-03-02 12:00:00', '2024-03-01 00:00:00',
+            ('2024-03-01 09:00:00', 10), 100, 3, 0, '2024-03-02 13:00:00'
+        )
+        plan = self._plan(query, params)
+        self.assertTrue(any('USING INDEX idx_reminders_pending_due' in detail for detail in plan), plan)
+        self.assertFalse(any(re.match(r'^SCAN (reminders|r)\b', detail) or 'TEMP B-TREE' in detail
+                             for detail in plan), plan)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import logging
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection import ConnectionPool
+from database.db_utils import DatabaseUtils
+from database.timeutil import local_now, to_local
+from database.report_cache import ReportCache
+from scheduler.reminder_scheduler import ReminderScheduler
+from tests.db_helpers import create_test_database
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class FakeLineApi:
+    """記錄推送時間與對象的 LINE API 替身"""
+
+    def __init__(self):
+        self.pushes = []
+        self.pushed = threading.Event()
+
+    def push_message_with_http_info(self, request, x_line_retry_key=None):
+        self.pushes.append((local_now(), request.to, request.messages))
+        self.pushed.set()
+
+
+class TestReminderScheduler(unittest.TestCase):
+    """測試以觸發時間排序的提醒排程"""
+
+    def setUp(self):
+        """建立臨時資料庫與排程器"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db = DatabaseUtils(create_test_database(self.tmpdir.name), pool_size=2)
+        self.db.create_user('U1', '用戶一')
+        self.db.create_user('U2', '用戶二')
+        self.api = FakeLineApi()
+        self.scheduler = ReminderScheduler(self.api, self.db, poll_interval=0.2)
+
+    def tearDown(self):
+        """停止排程器、關閉連接池並清除臨時檔案"""
+        self.scheduler.stop()
+        ConnectionPool.close_all()
+        ReportCache.clear_all()
+        self.tmpdir.cleanup()
+
+    def add_reminder(self, user_id, title, due, remind_before=0):
+        self.db.add_reminder(user_id, title, due.isoformat(timespec='seconds'), remind_before=remind_before)
+        return self.db.execute_query("SELECT MAX(reminder_id) AS id FROM reminders", fetchall=False)["id"]
+
+    def test_fires_once_at_fire_time(self):
+        """在 due_date - remind_before 送出一次，之後的檢查不再重複推送"""
+        target = (local_now() + timedelta(seconds=2)).replace(microsecond=0)
+        self.add_reminder('U1', '開會', target + timedelta(minutes=10), remind_before=10)
+        self.scheduler.start()
+
+        self.assertTrue(self.api.pushed.wait(5))
+        pushed_at, user_id, _ = self.api.pushes[0]
+        self.assertEqual(user_id, 'U1')
+        self.assertLess(abs((pushed_at - target).total_seconds()), 1.0)
+
+        time.sleep(0.6)
+        self.assertEqual(len(self.api.pushes), 1)
+        # 閒置時只檢查變動記錄，不重新載入
+        self.assertEqual(self.scheduler.status()["loads"], 1)
+
+    def test_idle_scheduler_waits_for_wake(self):
+        """閒置時只在變動檢查時間讀取變動記錄；wake() 後立即套用新提醒"""
+        self.scheduler.stop()
+        self.scheduler = ReminderScheduler(self.api, self.db, poll_interval=60)
+        self.scheduler.start()
+        time.sleep(0.5)
+        self.assertEqual(self.scheduler.status()["change_checks"], 0)
+
+        target = (local_now() + timedelta(seconds=1)).replace(microsecond=0)
+        self.add_reminder('U1', '開會', target)
+        self.scheduler.wake()
+        self.assertTrue(self.api.pushed.wait(5))
+        status = self.scheduler.status()
+        self.assertEqual((status["loads"], status["change_checks"]), (1, 1))
+
+    def test_changes_are_picked_up(self):
+        """新增、完成與刪除提醒後更新排程，只推送仍然有效的提醒"""
+        soon = local_now() + timedelta(minutes=5)
+        completed = self.add_reminder('U1', '已完成', soon)
+        deleted = self.add_reminder('U1', '已刪除', soon)
+        self.assertEqual(self.scheduler.check_reminders(), 0)
+        self.assertEqual(self.scheduler.status()["pending"], 2)
+
+        self.db.complete_reminder(completed, 'U1')
+        self.db.delete_reminder(deleted)
+        # 觸發時間已過、但尚未到期的新提醒立即推送
+        self.add_reminder('U2', '繳費', soon, remind_before=30)
+        self.assertEqual(self.scheduler.check_reminders(), 1)
+        self.assertEqual([to for _, to, _ in self.api.pushes], ['U2'])
+        self.assertEqual(self.scheduler.status()["pending"], 0)
+
+        self.assertEqual(self.scheduler.check_reminders(soon + timedelta(seconds=1)), 0)
+        self.assertEqual(len(self.api.pushes), 1)
+        # 變動只重新讀取相關的提醒，不重新載入整個範圍
+        self.assertEqual(self.scheduler.status()["loads"], 1)
+
+    def test_rollover_and_distant_changes_do_not_reload(self):
+        """重複提醒的下一次提醒與範圍外的新提醒只套用變動記錄，套用後的記錄被刪除"""
+        due = local_now() + timedelta(minutes=5)
+        self.db.add_reminder('U1', '吃藥', due.isoformat(timespec='seconds'), None, 0, 'daily', 1)
+        self.assertEqual(self.scheduler.check_reminders(), 0)
+
+        self.add_reminder('U2', '年度健檢', due + timedelta(days=30))
+        self.assertEqual(self.scheduler.check_reminders(due), 1)
+        # 下一次提醒（明天）在載入範圍之外
+        self.assertEqual(self.scheduler.check_reminders(due), 0)
+        self.assertEqual(self.db.execute_query(
+            "SELECT COUNT(*) AS n FROM reminders WHERE title = '吃藥'", fetchall=False)["n"], 2)
+
+        status = self.scheduler.status()
+        self.assertEqual((status["loads"], status["pending"]), (1, 0))
+        self.assertEqual(status["changed_reminders"], 2)
+        self.assertEqual(self.db.get_reminder_changes(0), [])
+
+    def test_each_occurrence_is_claimed_once(self):
+        """多個排程器處理同一個資料庫時，每次觸發只由一個排程器推送"""
+        due = local_now() + timedelta(minutes=5)
+        reminder_id = self.add_reminder('U1', '繳費', due)
+        other_api = FakeLineApi()
+        other = ReminderScheduler(other_api, self.db, poll_interval=0.2)
+        other.owner = 'other-process'
+
+        # 兩個排程器都已載入這次觸發
+        for scheduler in (self.scheduler, other):
+            self.assertEqual(scheduler.check_reminders(), 0)
+            self.assertEqual(scheduler.status()["pending"], 1)
+        self.assertEqual(self.db.get_reminder_deliveries(reminder_id)[0]["status"], "scheduled")
+
+        self.assertEqual(self.scheduler.check_reminders(due), 1)
+        self.assertEqual(other.check_reminders(due), 0)
+        self.assertEqual(other.status()["claimed_elsewhere"], 1)
+        self.assertEqual(other_api.pushes, [])
+
+        delivery = self.db.get_reminder_deliveries(reminder_id)[0]
+        self.assertEqual((delivery["status"], delivery["attempts"]), ("sent", 1))
+        self.db.complete_reminder(reminder_id, 'U1')
+        self.assertEqual(self.db.get_reminder_deliveries(reminder_id)[0]["status"], "acknowledged")
+
+    def test_failed_push_is_retried(self):
+        """推送失敗時記錄錯誤與嘗試次數，稍後重試"""
+        reminder_id = self.add_reminder('U1', '繳費', local_now() + timedelta(minutes=5), remind_before=30)
+        self.scheduler.retry_delay = 0
+        self.api.push_message_with_http_info = mock.Mock(side_effect=[RuntimeError('429 Too Many Requests'), None])
+
+        self.assertEqual(self.scheduler.check_reminders(), 0)
+        delivery = self.db.get_reminder_deliveries(reminder_id)[0]
+        self.assertEqual((delivery["status"], delivery["attempts"]), ("failed", 1))
+        self.assertIn('429', delivery["last_error"])
+
+        self.assertEqual(self.scheduler.check_reminders(), 1)
+        delivery = self.db.get_reminder_deliveries(reminder_id)[0]
+        self.assertEqual((delivery["status"], delivery["attempts"]), ("sent", 2))
+
+    def test_retry_backoff_survives_reload(self):
+        """重新載入或由其他排程器接手時，失敗的觸發仍等到重試時間才重送"""
+        reminder_id = self.add_reminder('U1', '繳費', local_now() + timedelta(minutes=5), remind_before=30)
+        self.scheduler.retry_delay = 1
+        self.api.push_message_with_http_info = mock.Mock(side_effect=[RuntimeError('503 Service Unavailable'), None])
+        self.assertEqual(self.scheduler.check_reminders(), 0)
+        delivery = self.db.get_reminder_deliveries(reminder_id)[0]
+        self.assertEqual(delivery["status"], "failed")
+        self.assertGreaterEqual(delivery["next_attempt_at"], delivery["updated_at"] + 1)
+
+        other = ReminderScheduler(self.api, self.db, poll_interval=0.2)
+        self.assertEqual(other.check_reminders(), 0)
+        self.assertEqual(other.status()["pending"], 1)
+        self.assertEqual(self.api.push_message_with_http_info.call_count, 1)
+
+        time.sleep(1.1)
+        self.assertEqual(other.check_reminders(), 1)
+        self.assertEqual(self.db.get_reminder_deliveries(reminder_id)[0]["status"], "sent")
+
+    def test_due_reminders_are_paged_in_local_time(self):
+        """全域提醒查詢依到期時間分頁，混合格式與帶時區的時間都換算為 APP_TIMEZONE"""
+        now = datetime(2024, 3, 10, 9, 0)
+        self.db.add_reminder('U1', '早會', '2024-03-10T09:30:00', remind_before=60)
+        self.db.add_reminder('U2', '早會', '2024-03-10 09:30:00', remind_before=60)
+        # UTC 01:45 即台灣時間 09:45
+        self.db.add_reminder('U1', '繳費', '2024-03-10T01:45:00+00:00', remind_before=60)
+        # 提前一天提醒：到期時間在查詢範圍之後，觸發時間已到
+        self.db.add_reminder('U2', '出差', '2024-03-11 08:00:00', remind_before=1440)
+        self.db.add_reminder('U1', '太晚', '2024-03-10 12:00:00', remind_before=10)
+        self.db.add_reminder('U1', '已過期', '2024-03-09 09:00:00', remind_before=0)
+
+        with mock.patch.dict(os.environ, {'APP_TIMEZONE': 'Asia/Taipei'}):
+            pages = list(self.db.iter_due_reminders(now + timedelta(hours=1), now - timedelta(minutes=1),
+                                                    chunk_size=2))
+        self.assertEqual([len(rows) for rows in pages], [2, 2])
+        self.assertEqual([(row["title"], row["fire_at"]) for rows in pages for row in rows], [
+            ('早會', '2024-03-10 08:30:00'),
+            ('早會', '2024-03-10 08:30:00'),
+            ('繳費', '2024-03-10 08:45:00'),
+            ('出差', '2024-03-10 08:00:00'),
+        ])
+
+        with mock.patch.dict(os.environ, {'APP_TIMEZONE': 'Asia/Taipei'}):
+            self.assertEqual(to_local('2024-03-10T16:30:00Z'), datetime(2024, 3, 11, 0, 30))
+
+if __name__ == "__main__":
+    unittest.main()
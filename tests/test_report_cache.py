@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+import sys
+import os
+import logging
+import tempfile
+import unittest
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection import ConnectionPool
+from database.db_utils import DatabaseUtils
+from database.report_cache import ReportCache
+from tests.db_helpers import create_test_database
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class TestReportCache(unittest.TestCase):
+    """測試報表快取與版本號失效"""
+
+    def setUp(self):
+        """建立臨時資料庫與測試交易"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = create_test_database(self.tmpdir.name)
+        self.db = DatabaseUtils(self.db_path, pool_size=2)
+        self.db.create_user('test_user', '測試用戶')
+        self.account_id = self.db.add_account('test_user', '現金', 0, True)
+        self.db.add_transaction('test_user', self.account_id, 1, 'expense', 100, '午餐', '2024-01-05')
+
+    def tearDown(self):
+        """關閉連接池、清空快取並清除臨時檔案"""
+        ConnectionPool.close_all()
+        ReportCache.clear_all()
+        self.tmpdir.cleanup()
+
+    def _total(self):
+        rows = self.db.get_expense_summary_by_category('test_user', '2024-01-01', '2024-01-31')
+        return sum(row["total_amount"] for row in rows)
+
+    def test_repeated_reports_hit_cache(self):
+        """相同用戶與日期範圍的報表第二次應命中快取"""
+        self.assertEqual(self._total(), 100)
+        self.assertEqual(self._total(), 100)
+        status = self.db.report_cache.status()
+        self.assertEqual(status["hits"], 1)
+        self.assertEqual(status["misses"], 1)
+
+    def test_cached_result_is_a_copy(self):
+        """呼叫端修改返回結果不影響快取內容"""
+        rows = self.db.get_daily_summary('test_user', '2024-01-01', '2024-01-31')
+        rows[0]["total_expense"] = 0
+        rows = self.db.get_daily_summary('test_user', '2024-01-01', '2024-01-31')
+        self.assertEqual(rows[0]["total_expense"], 100)
+
+    def test_writes_invalidate_only_that_user(self):
+        """交易變動後該用戶的快取失效，其他用戶不受影響"""
+        self.db.create_user('other_user', '其他用戶')
+        self._total()
+        self.db.get_daily_summary('other_user', '2024-01-01', '2024-01-31')
+
+        transaction_id = self.db.add_transaction('test_user', self.account_id, 1, 'expense', 50, '晚餐', '2024-01-06')
+        self.assertEqual(self._total(), 150)
+
+        self.db.update_transaction(transaction_id, 'test_user', 'expense', 70, '2024-01-06', 1, self.account_id, '晚餐')
+        self.assertEqual(self._total(), 170)
+
+        self.db.delete_transaction(transaction_id, 'test_user')
+        self.assertEqual(self._total(), 100)
+
+        self.db.get_daily_summary('other_user', '2024-01-01', '2024-01-31')
+        self.assertEqual(self.db.report_cache.status()["hits"], 1)
+
+    def test_write_from_another_process_invalidates(self):
+        """其他進程直接寫入資料庫時，透過版本號讓快取失效"""
+        self._total()
+        # 以獨立連接模擬 cron 進程的寫入
+        conn = self.db.get_connection()
+        conn.execute(
+            "INSERT INTO transactions (user_id, account_id, category_id, type, amount, date) "
+            "VALUES ('test_user', ?, 1, 'expense', 25, '2024-01-07')",
+            (self.account_id,)
+        )
+        conn.commit()
+        conn.close()
+        self.assertEqual(self._total(), 125)
+
+    def _execute(self, sql, params=()):
+        # 以獨立連接直接寫入分類資料表
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.execute(sql, params)
+            conn.commit()
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def _summary_names(self, user_id):
+        rows = self.db.get_expense_summary_by_category(user_id, '2024-01-01', '2024-01-31')
+        return [row["category_name"] for row in rows]
+
+    def test_user_category_insert_and_delete_invalidate(self):
+        """用戶分類新增與刪除會遞增該用戶的版本號"""
+        self.db.create_user('other_user', '其他用戶')
+        version = self.db.get_report_version('test_user')
+        other_version = self.db.get_report_version('other_user')
+
+        category_id = self.db.add_category('test_user', '點心', 'expense')
+        self.assertGreater(self.db.get_report_version('test_user'), version)
+        version = self.db.get_report_version('test_user')
+
+        self._execute("DELETE FROM categories WHERE category_id = ?", (category_id,))
+        self.assertGreater(self.db.get_report_version('test_user'), version)
+        self.assertEqual(self.db.get_report_version('other_user'), other_version)
+
+    def test_shared_category_insert_invalidates_every_user(self):
+        """新增共用預設分類會遞增每位用戶的版本號"""
+        versions = {user_id: self.db.get_report_version(user_id) for user_id in ('test_user', 'new_user')}
+        self._execute("INSERT INTO categories (user_id, name, type, is_default) VALUES (NULL, '寵物', 'expense', 1)")
+        for user_id, version in versions.items():
+            self.assertGreater(self.db.get_report_version(user_id), version)
+
+    def test_shared_category_delete_invalidates_every_user(self):
+        """刪除共用預設分類會讓每位用戶的快取報表失效"""
+        self.db.create_user('other_user', '其他用戶')
+        self.db.add_transaction('other_user', self.account_id, 1, 'expense', 30, '咖啡', '2024-01-05')
+        self.assertEqual(self._summary_names('test_user'), ['飲食'])
+        self.assertEqual(self._summary_names('other_user'), ['飲食'])
+
+        self._execute("DELETE FROM categories WHERE category_id = 1")
+        self.assertEqual(self._summary_names('test_user'), [])
+        self.assertEqual(self._summary_names('other_user'), [])
+        self.assertEqual(self.db.report_cache.status()["hits"], 0)
+
+    def test_shared_category_rename_invalidates_every_user(self):
+        """共用預設分類改名後每位用戶的報表都顯示新名稱"""
+        self.db.create_user('other_user', '其他用戶')
+        self.db.add_transaction('other_user', self.account_id, 1, 'expense', 30, '咖啡', '2024-01-05')
+        self.assertEqual(self._summary_names('test_user'), ['飲食'])
+        self.assertEqual(self._summary_names('other_user'), ['飲食'])
+
+        self._execute("UPDATE categories SET name = '餐飲' WHERE category_id = 1")
+        self.assertEqual(self._summary_names('test_user'), ['餐飲'])
+        self.assertEqual(self._summary_names('other_user'), ['餐飲'])
+        self.assertEqual(self.db.report_cache.status()["hits"], 0)
+
+    def test_session_bypasses_cache(self):
+        """工作單元中的報表不寫入快取，避免快取到之後被回滾的資料"""
+        with self.assertRaises(RuntimeError):
+            with self.db.session():
+                self.db.add_transaction('test_user', self.account_id, 1, 'expense', 999, '回滾', '2024-01-08')
+                self.assertEqual(self._total(), 1099)
+                raise RuntimeError("回滾")
+        self.assertEqual(self._total(), 100)
+
+    def test_lru_eviction_and_memory_bound(self):
+        """超過筆數或記憶體上限時淘汰最久未使用的項目"""
+        cache = ReportCache(max_entries=2, max_bytes=10 ** 6, ttl=60)
+        cache.put(('u', 'a', (), ()), 0, [{"x": 1}])
+        cache.put(('u', 'b', (), ()), 0, [{"x": 2}])
+        cache.get(('u', 'a', (), ()), 0)
+        cache.put(('u', 'c', (), ()), 0, [{"x": 3}])
+        self.assertFalse(cache.get(('u', 'b', (), ()), 0)[0])
+        self.assertTrue(cache.get(('u', 'a', (), ()), 0)[0])
+        self.assertEqual(cache.status()["evictions"], 1)
+
+        small = ReportCache(max_entries=100, max_bytes=2000, ttl=60)
+        for i in range(20):
+            small.put(('u', 'k', (i,), ()), 0, [{"value": "x" * 100}])
+        self.assertLessEqual(small.status()["bytes"], 2000)
+        self.assertGreater(small.status()["evictions"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+import sys
+import os
+import random
+import logging
+import tempfile
+import unittest
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection import ConnectionPool
+from database.db_utils import DatabaseUtils
+from tests.db_helpers import create_test_database
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class TestTransactionRollups(unittest.TestCase):
+    """測試交易彙總表的增量維護"""
+
+    def setUp(self):
+        """建立臨時資料庫"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = create_test_database(self.tmpdir.name)
+        self.db = DatabaseUtils(self.db_path, pool_size=1)
+        self.db.create_user('test_user', '測試用戶')
+        self.account_id = self.db.add_account('test_user', '現金', 0, True)
+
+    def tearDown(self):
+        """關閉連接池並清除臨時檔案"""
+        ConnectionPool.close_all()
+        self.tmpdir.cleanup()
+
+    def _random_writes(self, count=300):
+        rng = random.Random(7)
+        ids = []
+        for _ in range(count):
+            action = rng.random()
+            if action < 0.6 or not ids:
+                ids.append(self.db.add_transaction(
+                    'test_user', self.account_id, rng.choice([1, 2, 9, None]),
+                    rng.choice(['income', 'expense']), round(rng.uniform(1, 500), 2), '測試',
+                    f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+                ))
+            elif action < 0.85:
+                self.db.update_transaction(
+                    rng.choice(ids), 'test_user', rng.choice(['income', 'expense']),
+                    round(rng.uniform(1, 500), 2), f"2024-{rng.randint(1, 12):02d}-01",
+                    rng.choice([1, 2, 9]), self.account_id, '修改'
+                )
+            else:
+                self.db.delete_transaction(ids.pop(rng.randrange(len(ids))), 'test_user')
+
+    def test_write_paths_keep_rollups_consistent(self):
+        """新增、修改、刪除交易後彙總表應與原始資料一致"""
+        self._random_writes()
+        # 直接以 SQL 寫入也會經由觸發器更新
+        self.db.execute_update(
+            "INSERT INTO transactions (user_id, type, amount, date) VALUES ('test_user', 'expense', 10, '2024-02-02')"
+        )
+        self.db.execute_update("UPDATE transactions SET amount = amount + 1 WHERE transaction_id % 5 = 0")
+        self.assertEqual(self.db.check_rollups(), [])
+
+    def test_summaries_match_raw_aggregation(self):
+        """報表摘要應與直接彙總交易的結果相同"""
+        self._random_writes()
+        expected = self.db.execute_query(
+            """
+            SELECT date,
+                   SUM(CASE WHEN type = 'income' THEN amount ELSE 0 END) as total_income,
+                   SUM(CASE WHEN type = 'expense' THEN amount ELSE 0 END) as total_expense
+            FROM transactions WHERE user_id = ? AND date BETWEEN ? AND ?
+            GROUP BY date ORDER BY date
+            """,
+            ('test_user', '2024-03-01', '2024-05-31')
+        )
+        actual = self.db.get_daily_summary('test_user', '2024-03-01', '2024-05-31')
+        self.assertEqual([row["date"] for row in actual], [row["date"] for row in expected])
+        for got, want in zip(actual, expected):
+            self.assertAlmostEqual(got["total_income"], want["total_income"], places=2)
+            self.assertAlmostEqual(got["total_expense"], want["total_expense"], places=2)
+
+        expenses = self.db.get_expense_summary_by_category('test_user', '2024-01-01', '2024-12-31')
+        raw_count = self.db.execute_query(
+            "SELECT COUNT(*) AS total FROM transactions WHERE user_id = ? AND type = 'expense' AND category_id IS NOT NULL",
+            ('test_user',)
+        )[0]["total"]
+        self.assertEqual(sum(row["transaction_count"] for row in expenses), raw_count)
+
+        months = self.db.get_monthly_summary('test_user', 2024)
+        self.assertTrue(all(len(row["month"]) == 2 for row in months))
+
+    def test_check_and_rebuild(self):
+        """檢查器應發現不一致，重建後恢復一致"""
+        self._random_writes(50)
+        self.db.execute_update("UPDATE transaction_daily_rollups SET total_amount = total_amount + 100")
+        self.assertTrue(self.db.check_rollups('test_user'))
+
+        self.db.rebuild_rollups('test_user')
+        self.assertEqual(self.db.check_rollups(), [])
+
+if __name__ == "__main__":
+    unittest.main()
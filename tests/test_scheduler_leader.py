@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import signal
+import logging
+import tempfile
+import unittest
+import multiprocessing
+from datetime import timedelta
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection import ConnectionPool
+from database.db_utils import DatabaseUtils
+from database.timeutil import local_now
+from database.report_cache import ReportCache
+from scheduler.leader import LeaderLease
+from tests.db_helpers import create_test_database
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+LEASE_TTL = 1.0
+
+
+class FileLineApi:
+    """把推送對象與進程 ID 寫入檔案的 LINE API 替身，供多個進程共用"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def record(self, kind, value):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(f"{kind}\t{os.getpid()}\t{value}\n")
+
+    def push_message_with_http_info(self, request, x_line_retry_key=None):
+        self.record('push', request.to)
+
+
+def run_scheduler_process(db_path, log_path):
+    """子進程：以短租約啟動排程器，直到被終止"""
+    from scheduler.reminder_scheduler import ReminderScheduler
+
+    os.environ['REMINDER_CLAIM_TIMEOUT'] = '2'
+    db = DatabaseUtils(db_path, pool_size=2)
+    api = FileLineApi(log_path)
+    lease = LeaderLease(db, ttl=LEASE_TTL, renew_interval=0.2)
+    scheduler = ReminderScheduler(api, db, poll_interval=0.1, lease=lease)
+    scheduler.start()
+    api.record('ready', lease.holder)
+    while True:
+        time.sleep(1)
+
+
+class TestSchedulerLeader(unittest.TestCase):
+    """測試多個排程器進程中只有租約持有者發送提醒"""
+
+    def setUp(self):
+        """建立臨時資料庫"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = create_test_database(self.tmpdir.name)
+        self.db = DatabaseUtils(self.db_path, pool_size=2)
+        self.processes = []
+
+    def tearDown(self):
+        """終止子進程、關閉連接池並清除臨時檔案"""
+        for process in self.processes:
+            if process.is_alive():
+                process.kill()
+            process.join(5)
+        ConnectionPool.close_all()
+        ReportCache.clear_all()
+        self.tmpdir.cleanup()
+
+    def test_lease_moves_after_expiry(self):
+        """租約未過期時其他持有者無法取得，過期後由待命者接手且 term 遞增"""
+        first = LeaderLease(self.db, holder='a', ttl=10, renew_interval=1)
+        second = LeaderLease(self.db, holder='b', ttl=10, renew_interval=1)
+
+        self.assertTrue(first.maintain(now=1000))
+        self.assertFalse(second.maintain(now=1001))
+        self.assertTrue(first.maintain(now=1005))
+        self.assertFalse(second.maintain(now=1012))
+
+        # a 停止續約，租約在 1015 到期
+        self.assertTrue(second.maintain(now=1016))
+        self.assertEqual((second.term, first.term), (2, 1))
+        self.assertFalse(first.maintain(now=1017))
+        self.assertEqual(first.stats["lost"], 1)
+
+        # 正常停止時釋放租約，不必等待到期
+        second.release()
+        self.assertTrue(first.maintain(now=1018))
+        self.assertEqual(self.db.get_lease('reminder_scheduler')["holder"], 'a')
+
+    def read_log(self, log_path, kind):
+        if not os.path.exists(log_path):
+            return []
+        with open(log_path, encoding='utf-8') as f:
+            rows = [line.rstrip('\n').split('\t') for line in f]
+        return [(int(pid), value) for row_kind, pid, value in rows if row_kind == kind]
+
+    def wait_for(self, condition, timeout):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if condition():
+                return True
+            time.sleep(0.05)
+        return False
+
+    def test_single_dispatcher_across_processes(self):
+        """三個進程共用資料庫：每個提醒只推送一次，領導者被終止後由另一個進程接手"""
+        log_path = os.path.join(self.tmpdir.name, 'pushes.log')
+        context = multiprocessing.get_context('spawn')
+        for _ in range(3):
+            process = context.Process(target=run_scheduler_process, args=(self.db_path, log_path), daemon=True)
+            process.start()
+            self.processes.append(process)
+        self.assertTrue(self.wait_for(lambda: len(self.read_log(log_path, 'ready')) == 3, 60))
+
+        now = local_now().replace(microsecond=0)
+        for offset, user_id in ((1, 'U1'), (4, 'U2'), (6, 'U3')):
+            self.db.create_user(user_id, user_id)
+            self.db.add_reminder(user_id, '開會', (now + timedelta(seconds=offset)).isoformat(), remind_before=0)
+
+        self.assertTrue(self.wait_for(lambda: self.read_log(log_path, 'push'), 10))
+        leader_pid = self.read_log(log_path, 'push')[0][0]
+        os.kill(leader_pid, signal.SIGKILL)
+
+        self.assertTrue(self.wait_for(lambda: len(self.read_log(log_path, 'push')) >= 3, 15))
+        time.sleep(1)
+        pushes = self.read_log(log_path, 'push')
+        self.assertEqual(sorted(user_id for _, user_id in pushes), ['U1', 'U2', 'U3'])
+        self.assertEqual(pushes[0], (leader_pid, 'U1'))
+        self.assertNotIn(leader_pid, {pid for pid, _ in pushes[1:]})
+
+        lease = self.db.get_lease('reminder_scheduler')
+        self.assertEqual(lease["term"], 2)
+        self.assertNotIn(f":{leader_pid}:", lease["holder"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+import sys
+import os
+import json
+import logging
+import tempfile
+import itertools
+import unittest
+from datetime import datetime
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parsers.text_parser import TextParser
+from parsers import batch
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'parser_corpus.txt')
+REFERENCE = datetime(2024, 3, 10, 12, 0, 0)
+
+
+class TestTextParserBatch(unittest.TestCase):
+    """測試批次解析 API 與命令列工具"""
+
+    @classmethod
+    def setUpClass(cls):
+        with open(CORPUS_PATH, 'r', encoding='utf-8') as f:
+            cls.corpus = [line.rstrip('\n') for line in f if line.strip()]
+
+    def test_parse_many_matches_parse_text(self):
+        """批次結果與逐筆 parse_text 相同，進程池不改變順序"""
+        parser = TextParser()
+        texts = [text for text in self.corpus if not text.startswith('#') and '提醒' not in text]
+        expected = [parser.parse_text(text) for text in texts]
+        self.assertEqual(parser.parse_many(texts), expected)
+        self.assertEqual(parser.parse_many(texts, processes=2, chunk_size=10), expected)
+
+    def test_parse_stream_is_lazy(self):
+        """parse_stream 逐段讀取輸入，無限長的輸入也能依序取得前幾筆結果"""
+        parser = TextParser()
+        texts = ["午餐 -120", "薪水 +30000", "查詢本月支出"]
+        expected = [parser.parse_text(text) for text in texts] * 10
+        stream = parser.parse_stream(itertools.cycle(texts), processes=2, chunk_size=4)
+        self.assertEqual(list(itertools.islice(stream, 30)), expected)
+        stream.close()
+
+    def test_relative_dates_use_message_time(self):
+        """歷史訊息的今天/昨天以訊息時間為基準"""
+        parser = TextParser()
+        results = parser.parse_many([("昨天 午餐 -120", REFERENCE), "午餐 -120"], now=datetime(2024, 1, 1))
+        self.assertEqual(results[0]["data"]["date"], "2024-03-09")
+        self.assertEqual(results[1]["data"]["date"], "2024-01-01")
+        # 區塊結束後恢復使用目前時間
+        self.assertEqual(parser.parse_text("午餐 -120")["data"]["date"], datetime.now().strftime('%Y-%m-%d'))
+
+    def test_cli_writes_jsonl(self):
+        """命令列工具讀取 JSONL 並輸出帶有 result 的 JSONL"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, 'history.jsonl')
+            output_path = os.path.join(tmpdir, 'parsed.jsonl')
+            with open(input_path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({"id": 1, "text": "昨天 午餐 -120", "timestamp": REFERENCE.isoformat()}) + '\n')
+                f.write('not json\n')
+                f.write(json.dumps({"id": 2, "text": "薪水 +30000", "timestamp": 1710072000000}) + '\n')
+
+            self.assertEqual(batch.main([input_path, '-o', output_path]), 0)
+            with open(output_path, 'r', encoding='utf-8') as f:
+                single = f.read()
+            self.assertEqual(batch.main([input_path, '-o', output_path, '--processes', '2', '--chunk-size', '1']), 0)
+            with open(output_path, 'r', encoding='utf-8') as f:
+                parallel = f.read()
+            rows = [json.loads(line) for line in parallel.splitlines()]
+
+        self.assertEqual(parallel, single)
+        self.assertEqual([row["id"] for row in rows], [1, 2])
+        self.assertEqual(rows[0]["result"]["data"]["date"], "2024-03-09")
+        self.assertEqual(rows[1]["result"]["data"]["transaction_type"], "income")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+import sys
+import os
+import json
+import random
+import logging
+import unittest
+from datetime import datetime
+from unittest import mock
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import parsers.text_parser as text_parser_module
+from parsers.keyword_matcher import KeywordMatcher
+from parsers.text_parser import TextParser
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+class FrozenDatetime(datetime):
+    """固定「現在」為 2024-05-15 10:30（星期三），讓相對日期的輸出可以比對"""
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2024, 5, 15, 10, 30, 0)
+
+
+class TestTextParserGolden(unittest.TestCase):
+    """以關鍵詞自動機改寫後，解析結果應與改寫前完全相同"""
+
+    def test_corpus_matches_golden_outputs(self):
+        """語料中每則訊息的解析結果與 parser_golden.json 相同"""
+        with open(os.path.join(DATA_DIR, 'parser_corpus.txt'), 'r', encoding='utf-8') as f:
+            corpus = [line.rstrip('\n') for line in f if line.strip()]
+        with open(os.path.join(DATA_DIR, 'parser_golden.json'), 'r', encoding='utf-8') as f:
+            golden = json.load(f)
+
+        parser = TextParser()
+        with mock.patch.object(text_parser_module, 'datetime', FrozenDatetime):
+            for text in corpus:
+                with self.subTest(text=text):
+                    self.assertEqual(parser.parse_text(text), golden[text])
+
+    def test_matcher_agrees_with_substring_scan(self):
+        """自動機的命中結果與逐一 any(keyword in text) 掃描相同"""
+        rng = random.Random(7)
+        alphabet = "早午晚餐飯花了收入卡ab"
+        for _ in range(300):
+            groups = {
+                f"group{g}": {
+                    f"label{i}": [
+                        "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4)))
+                        for _ in range(rng.randint(0, 3))
+                    ]
+                    for i in range(3)
+                }
+                for g in range(3)
+            }
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+            hits = KeywordMatcher(groups).scan(text)
+            for group, labels in groups.items():
+                expected = next((label for label, keywords in labels.items()
+                                 if any(keyword in text for keyword in keywords)), None)
+                self.assertEqual(hits.first(group), expected)
+                self.assertEqual(hits.any(group), expected is not None)
+
+if __name__ == "__main__":
+    unittest.main()
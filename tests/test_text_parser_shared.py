@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+import sys
+import os
+import logging
+import threading
+import unittest
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parsers.text_parser import TextParser
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class TestSharedTextParser(unittest.TestCase):
+    """測試進程共用的文字解析器"""
+
+    def test_shared_instance_across_threads(self):
+        """多個執行緒同時取得的共用實例應為同一個"""
+        TextParser._shared = None
+        instances = []
+        threads = [threading.Thread(target=lambda: instances.append(TextParser.shared())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(instance) for instance in instances}), 1)
+
+    def test_keyword_tables_are_read_only(self):
+        """關鍵詞表為唯讀，共用實例的解析結果與新實例相同"""
+        parser = TextParser.shared().warm_up()
+        with self.assertRaises(TypeError):
+            parser.expense_categories_mapping["飲食"] = ()
+        with self.assertRaises(AttributeError):
+            parser.expense_keywords.append("測試")
+
+        for text in ("午餐 -120", "薪水 +30000 <銀行>", "查詢本月支出"):
+            self.assertEqual(parser.parse_text(text), TextParser().parse_text(text))
+
+if __name__ == "__main__":
+    unittest.main()
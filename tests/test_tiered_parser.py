@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+import sys
+import os
+import logging
+import unittest
+from unittest import mock
+
+# 將項目根目錄添加到系統路徑中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parsers.ai_parser import AIParser
+
+# 設置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+AI_RESULT = {"type": "query", "data": {"query_type": "expense", "time_range": "day", "time_value": "current"}}
+
+
+class TestTieredParser(unittest.TestCase):
+    """測試規則解析信心足夠時不呼叫 AI 端點"""
+
+    def make_parser(self, **env):
+        with mock.patch.dict(os.environ, {'PARSE_CACHE_SIZE': '0', **env}):
+            parser = AIParser()
+        parser._call_cursor_api = mock.Mock(return_value=AI_RESULT)
+        return parser
+
+    def test_only_low_confidence_inputs_reach_ai(self):
+        """明確的記帳與帳戶指令由規則層回應，被誤判為記帳的查詢送到 AI"""
+        parser = self.make_parser()
+        self.assertEqual(parser.parse_text("晚餐 -250 [飲食] <現金>")["data"]["category"], "飲食")
+        self.assertEqual(parser.parse_text("新增帳戶 現金")["type"], "account_command")
+        self.assertEqual(parser.parse_text("#明天早上9點 開會")["type"], "reminder")
+        parser._call_cursor_api.assert_not_called()
+
+        self.assertEqual(parser.parse_text("查詢今天支出"), AI_RESULT)
+        self.assertEqual(parser.parse_text("4月1日 午餐 -130"), AI_RESULT)
+        self.assertEqual(parser._call_cursor_api.call_count, 2)
+
+        status = parser.tier_status()
+        self.assertEqual(status["counts"], {"cache": 0, "rules": 2, "quick": 1, "ai": 2, "fallback": 0})
+        self.assertEqual(status["share"]["ai"], 0.4)
+
+    def test_thresholds_from_environment(self):
+        """門檻設為 1.1 時所有輸入都送到 AI，個別類型的設定優先"""
+        parser = self.make_parser(AI_CONFIDENCE_THRESHOLD='1.1', AI_CONFIDENCE_THRESHOLD_ACCOUNT_COMMAND='0.5')
+        self.assertEqual(parser.thresholds["accounting"], 1.1)
+        self.assertEqual(parser.thresholds["account_command"], 0.5)
+
+        self.assertEqual(parser.parse_text("午餐 -120"), AI_RESULT)
+        self.assertEqual(parser.parse_text("新增帳戶 現金")["type"], "account_command")
+        self.assertEqual(parser._call_cursor_api.call_count, 1)
+
+    def test_later_tiers_skipped_after_accept(self):
+        """規則層的結果被採用時不執行快速匹配"""
+        parser = self.make_parser()
+        parser._try_quick_match = mock.Mock(return_value=None)
+        self.assertEqual(parser.parse_text("晚餐 -250 [飲食] <現金>")["type"], "accounting")
+        parser._try_quick_match.assert_not_called()
+
+        parser.parse_text("查詢今天支出")
+        parser._try_quick_match.assert_called_once_with("查詢今天支出")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,15 @@
 #!/usr/bin/env python
 import os
 import sys
+import io
+import csv
 import json
+import time
 import logging
+import threading
 from datetime import datetime, timedelta, date
 from functools import wraps
-from flask import Flask, request, abort, jsonify, render_template, send_from_directory, redirect, url_for, session
+from flask import Flask, request, abort, jsonify, render_template, send_from_directory, redirect, url_for, session, Response, stream_with_context
 
 # 將當前目錄加入到 Python 模塊搜索路徑
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -22,6 +26,7 @@ logger = logging.getLogger(__name__)
 try:
     # 直接使用絕對導入
     from database.db_utils import DatabaseUtils
+    from database.pagination import InvalidCursorError
     logger.info("成功導入 database.db_utils")
 except ImportError as e:
     logger.error(f"無法導入 database.db_utils: {str(e)}")
@@ -43,7 +48,7 @@ from linebot.v3.webhooks import (
 from linebot.v3.messaging import (
     Configuration, ApiClient, MessagingApi,
     TextMessage, FlexMessage, FlexContainer,
-    ReplyMessageRequest
+    ReplyMessageRequest, PushMessageRequest
 )
 
 from dotenv import load_dotenv
@@ -52,6 +57,8 @@ import sqlite3
 from handlers.message_handler import MessageHandler
 from scheduler.reminder_scheduler import ReminderScheduler
 from parsers.text_parser import TextParser
+from events.dispatcher import EventDispatcher, ReplyFallbackApi
+from events.dedup import EventDeduplicator
 import calendar
 import traceback
 
@@ -70,6 +77,17 @@ app = Flask(__name__,
 # 設置 session 密鑰
 app.secret_key = os.environ.get('SESSION_SECRET', os.urandom(24).hex())
 
+# 啟動耗時報告：各元件建立與初始化所花的毫秒數
+startup_timings = {}
+
+def timed_startup(name, factory):
+    """執行 factory 並記錄耗時於 startup_timings"""
+    started = time.perf_counter()
+    try:
+        return factory()
+    finally:
+        startup_timings[name] = round((time.perf_counter() - started) * 1000, 2)
+
 # 初始化 LINE API
 try:
     # 記錄環境變量狀態（不包含完整的敏感信息）
@@ -123,20 +141,58 @@ except Exception as e:
         logger.critical("在生產環境中無法連接LINE平台，應用將終止")
         raise
 
+# 初始化 webhook 事件派送器：async 模式下事件在背景執行緒處理，webhook 立即回應
+webhook_dispatch_mode = os.environ.get('WEBHOOK_DISPATCH', 'async').lower()
+event_dispatcher = EventDispatcher(
+    lambda event: dispatch_event(event),
+    workers=int(os.environ.get('WEBHOOK_WORKERS', 4)),
+    queue_size=int(os.environ.get('WEBHOOK_QUEUE_SIZE', 1000)),
+    reply_ttl=float(os.environ.get('WEBHOOK_REPLY_TTL', 50))
+)
+
+# 回覆令牌過期的事件改以推播回覆
+line_bot_api = ReplyFallbackApi(
+    line_bot_api,
+    event_dispatcher,
+    lambda target, messages: PushMessageRequest(to=target, messages=messages)
+)
+
 # 初始化資料庫工具
-db = DatabaseUtils()
+db = timed_startup('database', DatabaseUtils)
+
+# 初始化 webhook 事件去重（記憶體最近事件 + webhook_events 資料表）
+event_deduplicator = EventDeduplicator(
+    db,
+    ttl=int(os.environ.get('WEBHOOK_DEDUP_TTL', 86400)),
+    capacity=int(os.environ.get('WEBHOOK_DEDUP_CAPACITY', 10000))
+)
 
-# 初始化訊息處理器
-message_handler = MessageHandler(line_bot_api, db)
+# 初始化進程共用的文字解析器與訊息處理器（兩者皆無可變狀態，所有工作執行緒共用）
+text_parser = timed_startup('text_parser', lambda: TextParser.shared().warm_up())
+message_handler = timed_startup('message_handler', lambda: MessageHandler(line_bot_api, db))
 
 # 初始化提醒排程器
-reminder_scheduler = ReminderScheduler(line_bot_api, db)
+reminder_scheduler = timed_startup('reminder_scheduler', lambda: ReminderScheduler(line_bot_api, db))
 
 # 定義啟動時的初始化函數(替代 @app.before_first_request 裝飾器)
 def start_scheduler_and_setup():
     """服務啟動後，啟動提醒排程器"""
+    # 記錄資料庫實際生效的設定
+    try:
+        timed_startup('check_settings', db.check_settings)
+    except Exception as e:
+        logger.error(f"資料庫設定檢查失敗: {str(e)}")
+    
     logger.info("啟動提醒排程器...")
-    reminder_scheduler.start()
+    timed_startup('scheduler_start', reminder_scheduler.start)
+
+    if webhook_dispatch_mode == 'async':
+        event_dispatcher.start()
+        # 訊號處理函數只能在主執行緒註冊；停止時先排空佇列（fly.toml kill_timeout 為 5 秒）
+        if threading.current_thread() is threading.main_thread():
+            event_dispatcher.install_signal_handlers(
+                timeout=float(os.environ.get('WEBHOOK_DRAIN_TIMEOUT', 4))
+            )
     
     # 創建並註冊快速選單
     if not is_development:
@@ -151,6 +207,8 @@ def start_scheduler_and_setup():
             logger.error(f"創建快速選單時發生錯誤: {str(e)}")
     else:
         logger.info("開發環境中跳過創建快速選單")
+    
+    logger.info("啟動耗時 (ms): " + ", ".join(f"{name}={ms}" for name, ms in startup_timings.items()))
 
 # 在應用啟動時執行初始化
 with app.app_context():
@@ -274,11 +332,24 @@ def health_check():
             'token_length': len(os.environ.get('LINE_CHANNEL_ACCESS_TOKEN', '')),
             'webhook_url': os.environ.get('WEBHOOK_URL', 'not set')
         },
+        'report_cache': db.report_cache.status() if db.report_cache else None,
+        'parse_cache': text_parser.cache.status() if text_parser.cache else None,
+        'reminder_scheduler': reminder_scheduler.status(),
+        'webhook_queue': event_dispatcher.status() if webhook_dispatch_mode == 'async' else None,
+        'webhook_dedup': event_deduplicator.status(),
+        'startup_ms': startup_timings,
         'message': 'Kimibot is running!'
     }
     
     return jsonify(app_info), 200
 
+@app.after_request
+def wake_scheduler_on_reminder_change(response):
+    """網頁端新增、修改、刪除或完成提醒後通知排程器立即讀取變動記錄"""
+    if request.method != 'GET' and request.path.startswith('/api/reminders') and response.status_code < 400:
+        reminder_scheduler.wake()
+    return response
+
 # LINE Webhook 入口
 @app.route('/api/webhook', methods=['POST'])
 def webhook():
@@ -353,14 +424,35 @@ def webhook():
     
     # 正常環境處理 (或開發環境非測試請求)
     try:
-        # 驗證簽名
-        handler.handle(body, signature)
+        # 驗證簽名並解析事件
+        events = handler.parser.parse(body, signature)
     except InvalidSignatureError:
         logger.error('Invalid signature')
         abort(400)
     
+    for event in events:
+        # 在任何解析或資料庫操作之前略過 LINE 重送的重複事件
+        if not event_deduplicator.claim(event):
+            continue
+        
+        if webhook_dispatch_mode != 'async':
+            dispatch_event(event)
+        elif not event_dispatcher.submit(event):
+            # 佇列已滿或正在停止：在請求中直接處理，以拖慢回應作為背壓，不丟棄事件
+            logger.warning("事件佇列無法接收，改為同步處理")
+            dispatch_event(event)
+    
     return 'OK'
 
+def dispatch_event(event):
+    """依事件類型交給對應的處理函數（與 handler.add 註冊的處理函數一致）"""
+    if isinstance(event, MessageEvent) and isinstance(event.message, TextMessageContent):
+        handle_text_message(event)
+    elif isinstance(event, PostbackEvent):
+        handle_postback(event)
+    else:
+        logger.info(f"忽略未處理的事件類型: {getattr(event, 'type', type(event).__name__)}")
+
 # 處理文字訊息
 @handler.add(MessageEvent, message=TextMessageContent)
 def handle_text_message(event):
@@ -373,12 +465,8 @@ def handle_text_message(event):
         # 確保用戶存在
         user = ensure_user_exists(user_id)
         
-        # 使用 MessageHandler 處理文字訊息
-        message_handler = MessageHandler(line_bot_api, db)
-        
-        # 解析文字訊息
-        parser = TextParser()
-        result = parser.parse_text(text)
+        # 解析文字訊息（使用啟動時建立的共用解析器與處理器）
+        result = text_parser.parse_text(text)
         
         if result:
             result_type = result.get("type")
@@ -389,9 +477,10 @@ def handle_text_message(event):
             elif result_type == "reminder":
                 # 處理提醒
                 message_handler.handle_reminder(user_id, reply_token, result.get("data"))
+                reminder_scheduler.wake()
             elif result_type == "query":
                 # 處理查詢
-                message_handler.handle_query(reply_token, result.get("data"))
+                message_handler.handle_query(reply_token, result.get("data"), user_id)
             elif result_type == "account":
                 # 處理帳戶操作
                 message_handler.handle_account(user_id, reply_token, result.get("data"))
@@ -428,6 +517,9 @@ def handle_postback(event):
     try:
         # 使用訊息處理器處理 postback
         message_handler.handle_postback(event)
+        if 'reminder' in (event.postback.data or ''):
+            # 完成、刪除提醒後通知排程器立即更新排程
+            reminder_scheduler.wake()
         
         logger.info(f"已處理用戶 {user_id} 的 postback")
     except Exception as e:
@@ -654,8 +746,8 @@ def api_get_transactions():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     category_id = request.args.get('category_id')
-    page = int(request.args.get('page', 1))
-    limit = int(request.args.get('limit', 20))
+    cursor = request.args.get('cursor')
+    limit = min(max(int(request.args.get('limit', 20)), 1), 200)
     
     # 根據date_range計算日期範圍
     today = date.today()
@@ -685,56 +777,21 @@ def api_get_transactions():
             start_date = date(today.year, today.month, 1).isoformat()
             end_date = today.isoformat()
     
-    # 計算分頁
-    offset = (page - 1) * limit
-    
     # 創建資料庫查詢
     db = DatabaseUtils()
     
-    # 構建查詢條件
-    conditions = ["user_id = ?"]
-    params = [user_id]
-    
-    if transaction_type and transaction_type != 'all':
-        conditions.append("type = ?")
-        params.append(transaction_type)
-    
-    conditions.append("date BETWEEN ? AND ?")
-    params.extend([start_date, end_date])
-    
-    if category_id:
-        conditions.append("category_id = ?")
-        params.append(category_id)
-    
-    # 構建SQL查詢
-    query = f"""
-        SELECT t.*, c.name as category_name, c.icon as category_icon, a.name as account_name
-        FROM transactions t
-        LEFT JOIN categories c ON t.category_id = c.category_id
-        LEFT JOIN accounts a ON t.account_id = a.account_id
-        WHERE {" AND ".join(conditions)}
-        ORDER BY t.date DESC, t.transaction_id DESC
-        LIMIT ? OFFSET ?
-    """
-    
-    # 添加分頁參數
-    params.extend([limit, offset])
+    if transaction_type == 'all':
+        transaction_type = None
     
-    # 計算總記錄數
-    count_query = f"""
-        SELECT COUNT(*) as total
-        FROM transactions
-        WHERE {" AND ".join(conditions)}
-    """
-    
-    # 執行查詢
-    transactions = db.execute_query(query, tuple(params))
-    count_result = db.execute_query(count_query, tuple(params[:-2]), fetchall=False)
-    
-    total_records = count_result['total'] if count_result else 0
-    total_pages = (total_records + limit - 1) // limit
+    # keyset 分頁：依 (date, transaction_id) 由新到舊，以游標接續上一頁
+    try:
+        transactions, next_cursor = db.get_transactions_page(
+            user_id, start_date, end_date, transaction_type, category_id, limit, cursor
+        )
+    except InvalidCursorError as e:
+        return jsonify({"error": str(e)}), 400
     
-    # 格式化日期和金額
+    # 格式化日期
     for transaction in transactions:
         if 'date' in transaction:
             # 轉換日期格式為前端可用的格式
@@ -744,18 +801,24 @@ def api_get_transactions():
             except:
                 transaction['date_formatted'] = transaction['date']
     
+    pagination = {
+        "limit": limit,
+        "next_cursor": next_cursor,
+        "has_next": next_cursor is not None
+    }
+    
+    # 總筆數為選用項目，由日彙總表計算
+    if request.args.get('include_total') in ('1', 'true'):
+        total_records = db.count_transactions(user_id, start_date, end_date, transaction_type, category_id)
+        pagination["total_records"] = total_records
+        pagination["total_pages"] = (total_records + limit - 1) // limit
+    
     # 返回結果
     return jsonify({
         "transactions": transactions,
-        "pagination": {
-            "current_page": page,
-            "total_pages": total_pages,
-            "total_records": total_records,
-            "has_next": page < total_pages,
-            "has_prev": page > 1
-        },
+        "pagination": pagination,
         "filters": {
-            "type": transaction_type,
+            "type": transaction_type or 'all',
             "date_range": date_range,
             "start_date": start_date,
             "end_date": end_date,
@@ -763,6 +826,48 @@ def api_get_transactions():
         }
     })
 
+# 匯出交易記錄API
+@app.route('/api/transactions/export', methods=['GET'])
+@login_required
+def api_export_transactions():
+    """以 CSV 串流匯出用戶的交易記錄，記憶體用量不隨筆數增加"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"error": "未授權訪問"}), 401
+    
+    start_date = request.args.get('start_date', '1970-01-01')
+    end_date = request.args.get('end_date', date.today().isoformat())
+    
+    query = """
+        SELECT t.date, t.type, c.name as category_name, a.name as account_name, t.amount, t.description
+        FROM transactions t
+        LEFT JOIN categories c ON t.category_id = c.category_id
+        LEFT JOIN accounts a ON t.account_id = a.account_id
+        WHERE t.user_id = ? AND t.date BETWEEN ? AND ?
+        ORDER BY t.date DESC, t.transaction_id DESC
+    """
+    
+    db = DatabaseUtils()
+    
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['日期', '類型', '類別', '帳戶', '金額', '說明'])
+        for row in db.iter_query(query, (user_id, start_date, end_date), row_type='tuple'):
+            writer.writerow(row)
+            if buffer.tell() > 8192:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    filename = f"transactions_{start_date}_{end_date}.csv"
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
 # 刪除交易記錄API
 @app.route('/api/transactions/<int:transaction_id>', methods=['DELETE'])
 @login_required
@@ -773,31 +878,13 @@ def api_delete_transaction(transaction_id):
     if not user_id:
         return jsonify({"error": "未授權訪問"}), 401
     
-    # 檢查該交易是否屬於該用戶
+    # 刪除交易記錄並還原帳戶餘額（同一個交易內完成）
     db = DatabaseUtils()
-    transaction = db.execute_query(
-        "SELECT * FROM transactions WHERE transaction_id = ? AND user_id = ?", 
-        (transaction_id, user_id),
-        fetchall=False
-    )
+    transaction = db.delete_transaction(transaction_id, user_id)
     
     if not transaction:
         return jsonify({"error": "交易記錄不存在或無權刪除"}), 404
     
-    # 先記錄交易信息，以便更新帳戶餘額
-    account_id = transaction.get('account_id')
-    amount = transaction.get('amount', 0)
-    transaction_type = transaction.get('type')
-    
-    # 刪除交易記錄
-    db.execute_update("DELETE FROM transactions WHERE transaction_id = ?", (transaction_id,))
-    
-    # 更新帳戶餘額
-    if account_id and amount and transaction_type:
-        # 如果是收入，則減少餘額；如果是支出，則增加餘額
-        amount_change = -amount if transaction_type == 'income' else amount
-        db.update_account_balance(account_id, amount_change)
-    
     return jsonify({"success": True, "message": "交易記錄已刪除"})
 
 # 生成令牌
@@ -920,6 +1007,17 @@ def api_update_transaction(transaction_id):
     if not user_id:
         return jsonify({"error": "未授權訪問"}), 401
     
+    db = DatabaseUtils()
+    
+    # 先確認交易屬於此用戶：其他用戶的交易一律返回 404，不論請求數據是否有效
+    owned = db.execute_query(
+        "SELECT 1 FROM transactions WHERE transaction_id = ? AND user_id = ?",
+        (transaction_id, user_id),
+        fetchall=False
+    )
+    if not owned:
+        return jsonify({"error": "交易記錄不存在或無權修改"}), 404
+    
     # 獲取請求數據
     data = request.json
     
@@ -927,17 +1025,6 @@ def api_update_transaction(transaction_id):
     if not data:
         return jsonify({"error": "無效的請求數據"}), 400
     
-    # 檢查交易記錄是否存在且屬於該用戶
-    db = DatabaseUtils()
-    original_transaction = db.execute_query(
-        "SELECT * FROM transactions WHERE transaction_id = ? AND user_id = ?", 
-        (transaction_id, user_id),
-        fetchall=False
-    )
-    
-    if not original_transaction:
-        return jsonify({"error": "交易記錄不存在或無權修改"}), 404
-    
     # 獲取數據字段
     transaction_type = data.get('type')
     amount = data.get('amount')
@@ -953,34 +1040,15 @@ def api_update_transaction(transaction_id):
     if transaction_type not in ['expense', 'income']:
         return jsonify({"error": "無效的交易類型"}), 400
     
-    # 調整原帳戶餘額 (還原交易前的狀態)
-    original_account_id = original_transaction.get('account_id')
-    original_amount = original_transaction.get('amount', 0)
-    original_type = original_transaction.get('type')
-    
-    if original_account_id and original_amount and original_type:
-        # 如果原交易是支出，還原時增加餘額；如果是收入，還原時減少餘額
-        amount_change = original_amount if original_type == 'expense' else -original_amount
-        db.update_account_balance(original_account_id, amount_change)
-    
-    # 更新交易記錄
+    # 更新交易記錄：還原原帳戶餘額、更新記錄、套用新餘額在同一個交易內完成
     try:
-        update_query = """
-            UPDATE transactions 
-            SET type = ?, amount = ?, date = ?, category_id = ?, account_id = ?, description = ?
-            WHERE transaction_id = ? AND user_id = ?
-        """
-        
-        db.execute_update(
-            update_query, 
-            (transaction_type, amount, date_str, category_id, account_id, memo, transaction_id, user_id)
+        original_transaction = db.update_transaction(
+            transaction_id, user_id, transaction_type, amount,
+            date_str, category_id, account_id, memo
         )
         
-        # 更新新帳戶餘額
-        if account_id and amount:
-            # 如果是收入增加餘額，如果是支出減少餘額
-            amount_change = amount if transaction_type == 'income' else -amount
-            db.update_account_balance(account_id, amount_change)
+        if not original_transaction:
+            return jsonify({"error": "交易記錄不存在或無權修改"}), 404
         
         # 獲取更新後的交易記錄詳情
         updated_transaction = db.execute_query(
@@ -1312,11 +1380,15 @@ def api_add_reminder():
         reminder_id = db.execute_update(
             """
             INSERT INTO reminders 
-            (user_id, content, datetime, repeat_type, notify_before, status, created_at) 
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+            (user_id, title, due_date, remind_before, content, datetime, repeat_type, notify_before, status, created_at) 
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """,
             (
                 reminder_data['user_id'],
+                # LINE 端與排程器使用的欄位
+                reminder_data['content'],
+                reminder_data['datetime'],
+                reminder_data['notify_before'],
                 reminder_data['content'],
                 reminder_data['datetime'],
                 reminder_data['repeat_type'],